@@ -0,0 +1,376 @@
+"""
+Binary TimeSeries Container
+
+This module stores TimeSeries data in a compact binary file that can be opened with
+mmap, so a model run can read just the columns and time window it needs without
+parsing any text.
+
+File layout (all blocks start on an 8 byte boundary):
+1. 8 byte magic number b"INCATS01"
+2. Header length as an unsigned 64 bit integer (little endian)
+3. JSON header with the name, UUID, column names, metadata, location list,
+   row count, byte order and whether the timestamps are in ascending order
+4. Timestamp block: int64 seconds since 1970-01-01, one per row
+5. Location block: int32 location codes (indices into the header location list)
+6. One float64 block per data column, NaN marks a missing value
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from timeSeries import TimeSeries
+from columnarTimeSeries import ColumnarTimeSeries, to_epoch_seconds
+
+MAGIC = b"INCATS01"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+
+def _padding(length):
+    """Number of bytes needed to bring length up to the block alignment."""
+    return (-length) % ALIGNMENT
+
+
+def _header_bytes(name, uuid, columns, metadata, locations, row_count, time_sorted):
+    """
+    Build the magic number, header length and padded JSON header of a container.
+
+    Parameters:
+    name (str): Name of the TimeSeries
+    uuid (str): UUID of the TimeSeries
+    columns (list): All column names, timestamp and location first
+    metadata (dict): Metadata of the TimeSeries
+    locations (list): Location names, indexed by the location codes
+    row_count (int): Number of rows
+    time_sorted (bool): Whether the timestamps are in ascending order
+
+    Returns:
+    bytes: The start of the file, up to the timestamp block
+
+    Raises:
+    TypeError: If the metadata cannot be serialised to JSON
+    """
+    header = {
+        "version": FORMAT_VERSION,
+        "name": name,
+        "uuid": uuid,
+        "columns": columns,
+        "metadata": metadata,
+        "locations": locations,
+        "rowCount": row_count,
+        "byteOrder": sys.byteorder,
+        "timeSorted": time_sorted,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _padding(len(header_bytes))
+
+    return MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes
+
+
+def _write_header(binary_file, *header_fields):
+    """Write the header built by _header_bytes to a file positioned at the start."""
+    binary_file.write(_header_bytes(*header_fields))
+
+
+def save_timeseries_to_binary(ts, filename):
+    """
+    Save a TimeSeries object to a binary container file.
+
+    The file is written under a temporary name and moved into place when complete,
+    so a failed save never leaves a truncated container behind.
+
+    Parameters:
+    ts (TimeSeries): The TimeSeries object to save, row based or columnar
+    filename (str): Path to the output file
+
+    Returns:
+    str: Path to the created file
+    """
+    if not isinstance(ts, ColumnarTimeSeries):
+        ts = ColumnarTimeSeries.from_timeseries(ts)
+
+    times = ts.get_timestamp_array()
+    codes, locations = ts.get_location_codes()
+    data_columns = ts.columns[2:]
+
+    time_sorted = all(times[i] <= times[i + 1] for i in range(len(times) - 1))
+    header = _header_bytes(ts.name, ts.uuid, ts.columns, ts.metadata, locations, len(times), time_sorted)
+
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as binary_file:
+            binary_file.write(header)
+            times.tofile(binary_file)
+            codes.tofile(binary_file)
+            binary_file.write(b"\0" * _padding(codes.itemsize * len(codes)))
+            for col_name in data_columns:
+                ts.get_column_array(col_name).tofile(binary_file)
+        os.replace(temporary, filename)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+    return filename
+
+
+class BinaryTimeSeriesFile:
+    """
+    Read access to a binary TimeSeries container through a memory map.
+
+    Opening the file only parses the JSON header. Column, timestamp and location
+    blocks are exposed as zero copy memoryviews, one per block, and read() copies
+    just the requested columns and time window into a ColumnarTimeSeries.
+
+    Use as a context manager, or call close() when done. close() releases the
+    block views; slices or buffers the caller still holds of them keep the memory
+    map alive until they are dropped, the map is then unmapped with them.
+    """
+
+    def __init__(self, filename):
+        """
+        Open a binary TimeSeries container.
+
+        Parameters:
+        filename (str): Path to the file
+
+        Raises:
+        ValueError: If the file is not a binary TimeSeries container
+        """
+        self.filename = filename
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"'{filename}' is empty, not a binary TimeSeries file")
+        # Block offset -> (byte view, typed view), so repeated calls share one view
+        self._views = {}
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"'{filename}' is not a binary TimeSeries file")
+
+        header_start = len(MAGIC) + 8
+        (header_length,) = struct.unpack("<Q", self._map[len(MAGIC):header_start])
+        header = json.loads(self._map[header_start:header_start + header_length].decode("utf-8"))
+        if header["version"] > FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"'{filename}' uses format version {header['version']}, "
+                             f"only version {FORMAT_VERSION} or older can be read")
+
+        self.name = header["name"]
+        self.uuid = header["uuid"]
+        self.columns = header["columns"]
+        self.metadata = header["metadata"]
+        self.locations = header["locations"]
+        self.row_count = header["rowCount"]
+        self.time_sorted = header["timeSorted"]
+        self._swap_bytes = header["byteOrder"] != sys.byteorder
+
+        # Work out where each block starts
+        offset = header_start + header_length
+        self._time_offset = offset
+        offset += 8 * self.row_count
+        self._location_offset = offset
+        offset += 4 * self.row_count
+        offset += _padding(4 * self.row_count)
+        self._column_offsets = {}
+        for col_name in self.columns[2:]:
+            self._column_offsets[col_name] = offset
+            offset += 8 * self.row_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the block views and close the memory map and file."""
+        for views in self._views.values():
+            for view in views:
+                if not isinstance(view, memoryview):
+                    continue
+                try:
+                    view.release()
+                except BufferError:
+                    # Exported by the caller (e.g. numpy.frombuffer), freed once that is dropped
+                    pass
+        self._views = {}
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Slices of the views are still held, the map is unmapped when they go
+                pass
+            self._map = None
+        self._file.close()
+
+    def _view(self, offset, item_size, type_code):
+        """Return a memoryview of one block, or an array copy when the byte order differs."""
+        if offset in self._views:
+            return self._views[offset][-1]
+        if self._map is None:
+            raise ValueError(f"'{self.filename}' is closed")
+        block = memoryview(self._map)[offset:offset + item_size * self.row_count]
+        if self._swap_bytes:
+            values = array(type_code)
+            values.frombytes(block)
+            block.release()
+            values.byteswap()
+            self._views[offset] = (values,)
+            return values
+        view = block.cast(type_code)
+        self._views[offset] = (block, view)
+        return view
+
+    def timestamps(self):
+        """
+        Get the timestamp block.
+
+        Returns:
+        memoryview: int64 seconds since the epoch, one per row
+        """
+        return self._view(self._time_offset, 8, 'q')
+
+    def location_codes(self):
+        """
+        Get the location block, codes index into self.locations.
+
+        Returns:
+        memoryview: int32 location codes, one per row
+        """
+        return self._view(self._location_offset, 4, 'i')
+
+    def column(self, column_name):
+        """
+        Get the block of one data column.
+
+        Parameters:
+        column_name (str): The name of the column
+
+        Returns:
+        memoryview: float64 values, one per row, NaN for missing values
+        """
+        if column_name not in self._column_offsets:
+            raise ValueError(f"Column '{column_name}' not found")
+        return self._view(self._column_offsets[column_name], 8, 'd')
+
+    def row_range(self, start_time=None, end_time=None):
+        """
+        Find the rows inside a time window (both ends included).
+
+        Parameters:
+        start_time (datetime, optional): The start of the window
+        end_time (datetime, optional): The end of the window
+
+        Returns:
+        range or list: Row offsets of the rows inside the window
+        """
+        times = self.timestamps()
+        start = to_epoch_seconds(start_time) if start_time is not None else None
+        end = to_epoch_seconds(end_time) if end_time is not None else None
+
+        if self.time_sorted:
+            lower = bisect_left(times, start) if start is not None else 0
+            upper = bisect_right(times, end) if end is not None else len(times)
+            return range(lower, upper)
+
+        return [i for i in range(len(times))
+                if (start is None or times[i] >= start) and (end is None or times[i] <= end)]
+
+    def read(self, columns=None, start_time=None, end_time=None, locations=None):
+        """
+        Copy a selection of the file into a ColumnarTimeSeries.
+
+        Parameters:
+        columns (list, optional): Data columns to read, defaults to all columns
+        start_time (datetime, optional): Only read rows at or after this time
+        end_time (datetime, optional): Only read rows at or before this time
+        locations (list, optional): Only read rows for these locations
+
+        Returns:
+        ColumnarTimeSeries: The selected data with the file's name, UUID and metadata
+        """
+        if columns is None:
+            columns = self.columns[2:]
+        for col_name in columns:
+            if col_name not in self._column_offsets:
+                raise ValueError(f"Column '{col_name}' not found")
+
+        rows = self.row_range(start_time, end_time)
+        codes = self.location_codes()
+        if locations is not None:
+            wanted = {code for code, location in enumerate(self.locations) if location in locations}
+            rows = [i for i in rows if codes[i] in wanted]
+
+        def take(block, type_code):
+            # Contiguous selections are copied in one step
+            if isinstance(rows, range):
+                part = block[rows.start:rows.stop]
+                if isinstance(part, array):
+                    return part
+                values = array(type_code)
+                values.frombytes(part.cast('B'))
+                return values
+            return array(type_code, [block[i] for i in rows])
+
+        ts = ColumnarTimeSeries.from_arrays(
+            take(self.timestamps(), 'q'),
+            take(codes, 'i'),
+            self.locations,
+            {col_name: take(self.column(col_name), 'd') for col_name in columns},
+            name=self.name
+        )
+        ts.uuid = self.uuid
+        ts.columns[0] = self.columns[0]
+        ts.columns[1] = self.columns[1]
+        ts.metadata = dict(self.metadata)
+        return ts
+
+
+def load_timeseries_from_binary(filename, columns=None, start_time=None, end_time=None, locations=None):
+    """
+    Load a binary TimeSeries container, optionally just some columns and a time window.
+
+    Parameters:
+    filename (str): Path to the binary file
+    columns (list, optional): Data columns to read, defaults to all columns
+    start_time (datetime, optional): Only read rows at or after this time
+    end_time (datetime, optional): Only read rows at or before this time
+    locations (list, optional): Only read rows for these locations
+
+    Returns:
+    ColumnarTimeSeries: The loaded time series
+    """
+    with BinaryTimeSeriesFile(filename) as binary_file:
+        return binary_file.read(columns, start_time, end_time, locations)
+
+
+# Example usage:
+if __name__ == "__main__":
+    import datetime
+
+    ts = TimeSeries("binary_example")
+    start = datetime.datetime(2020, 1, 1)
+    ts.add_rows(
+        [start + datetime.timedelta(hours=i) for i in range(48)],
+        "site_1",
+        {"air_temperature": [float(i % 24) for i in range(48)], "precipitation": [None] * 48}
+    )
+    save_timeseries_to_binary(ts, "binary_example.tsb")
+
+    # Read one column for the second day only
+    subset = load_timeseries_from_binary(
+        "binary_example.tsb",
+        columns=["air_temperature"],
+        start_time=start + datetime.timedelta(days=1),
+        end_time=start + datetime.timedelta(days=2)
+    )
+    print(subset)
+    print(subset.data[:3])
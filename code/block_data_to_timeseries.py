@@ -12,6 +12,81 @@ import argparse
 from timeSeries import TimeSeries
 
 
+def _block_rows(lines, log):
+    """
+    Walk the lines of a block-structured file after the block count line.
+    
+    Args:
+        lines (iterable): Lines of the file
+        log (callable): Function to log messages
+    
+    Yields:
+        tuple: (block_id, None) at the start of each block, then (block_id, data_row)
+               for every data row of the block. Data rows before the first block ID
+               belong to the first block
+    """
+    current_block_id = None
+    leading_rows = []
+    
+    for line in lines:
+        line = line.strip()
+        
+        if not line:
+            continue
+            
+        # Split the line by tabs or spaces
+        parts = line.split()
+        
+        # A single column is the ID of the block the following rows belong to
+        if len(parts) == 1:
+            current_block_id = parts[0]
+            log(f"Found block ID: {current_block_id}")
+            yield current_block_id, None
+            for data_row in leading_rows:
+                yield current_block_id, data_row
+            leading_rows = []
+        # Otherwise it's a data row
+        else:
+            # Convert all parts to float if possible
+            try:
+                data_row = [float(part) for part in parts]
+            except ValueError:
+                log(f"Warning: Could not parse line as data: {line}")
+                continue
+            if current_block_id is not None:
+                yield current_block_id, data_row
+            else:
+                leading_rows.append(data_row)
+
+    if leading_rows:
+        log(f"Warning: {len(leading_rows)} data rows without a block ID were skipped")
+
+
+def iter_block_rows(file_path, logger=None):
+    """
+    Read a block-structured file one data row at a time.
+    
+    Args:
+        file_path (str): Path to the input file
+        logger (callable, optional): Function to log messages
+    
+    Yields:
+        tuple: (block_id, data_row) for every data row, in file order
+    """
+    def log(message):
+        if logger:
+            logger(message)
+        else:
+            print(message)
+    
+    with open(file_path, 'r') as f:
+        # Skip the number of blocks
+        f.readline()
+        for block_id, data_row in _block_rows(f, log):
+            if data_row is not None:
+                yield block_id, data_row
+
+
 def parse_block_file(file_path, logger=None):
     """
     Parse a block-structured file and extract block IDs and data rows.
@@ -36,42 +111,13 @@ def parse_block_file(file_path, logger=None):
         num_blocks = int(f.readline().strip())
         log(f"Found {num_blocks} blocks defined in file")
         
+        # Group the data rows by block
         blocks = []
-        current_block_id = None
-        current_block_data = []
-        
-        for line in f:
-            line = line.strip()
-            
-            if not line:
-                continue
-                
-            # Split the line by tabs or spaces
-            parts = line.split()
-            
-            # If we have a block ID (only one column) and we've already seen a block before,
-            # store the previous block and start a new one
-            if len(parts) == 1 and current_block_id is not None:
-                blocks.append((current_block_id, current_block_data))
-                current_block_data = []
-                current_block_id = parts[0]
-                log(f"Found block ID: {current_block_id}")
-            # If we have a block ID and this is the first block
-            elif len(parts) == 1:
-                current_block_id = parts[0]
-                log(f"Found block ID: {current_block_id}")
-            # Otherwise it's a data row
+        for block_id, data_row in _block_rows(f, log):
+            if data_row is None:
+                blocks.append((block_id, []))
             else:
-                # Convert all parts to float if possible
-                try:
-                    data_row = [float(part) for part in parts]
-                    current_block_data.append(data_row)
-                except ValueError:
-                    log(f"Warning: Could not parse line as data: {line}")
-        
-        # Don't forget to add the last block
-        if current_block_id is not None:
-            blocks.append((current_block_id, current_block_data))
+                blocks[-1][1].append(data_row)
     
     log(f"File parsing complete. Found {len(blocks)} blocks.")
     
@@ -169,22 +215,22 @@ def convert_blocks_to_timeseries(
     for column_name in column_names:
         ts.add_column(column_name)
     
-    # Process each block
-    current_time = start_datetime
-    
+    # Process each block, time runs on across blocks and the block_id is used as the location
+    step = datetime.timedelta(seconds=timestep_seconds)
+    timestamps = []
+    locations = []
+    rows = []
     for block_id, block_data in blocks:
         for data_row in block_data:
-            # Create a dictionary of values with corresponding column names
-            values_dict = {}
-            for i, value in enumerate(data_row):
-                if i < len(column_names):
-                    values_dict[column_names[i]] = value
-            
-            # Add data point to TimeSeries using the block_id as the location
-            ts.add_data(current_time, block_id, values_dict)
-            
-            # Increment time for next data point
-            current_time += datetime.timedelta(seconds=timestep_seconds)
+            timestamps.append(start_datetime + len(timestamps) * step)
+            locations.append(block_id)
+            rows.append(data_row)
+    
+    # Add all rows to the TimeSeries in one block
+    columns = {}
+    for i, column_name in enumerate(column_names):
+        columns[column_name] = [data_row[i] if i < len(data_row) else None for data_row in rows]
+    ts.add_rows(timestamps, locations, columns)
     
     # Save the TimeSeries to CSV and JSON files
     csv_path, json_path = ts.save_to_files(output_base_name)
@@ -0,0 +1,222 @@
+"""
+Bucket Flow Routing
+
+BucketRouting moves water between the buckets of every land cover type of a
+subcatchment at once, working on the flat waterDepth array of a BucketState.
+Each step:
+1. The water input (rainfall plus snow melt) is added to the surficial buckets
+2. Every bucket drains part of its freely draining water, the water above the
+   tightly and loosely bound depths. A linear reservoir with characteristic time
+   constant T (in time steps) loses 1 - exp(-1 / T) of it per step
+3. The drained water is redistributed by the flow matrix of the land cover type:
+   row i gives the fractions of the water draining from bucket i that go to the
+   other buckets, the diagonal element the fraction that goes to the stream
+
+The flow matrices are turned into one transfer operator over the whole state
+vector when the routing is built: the off diagonal elements of all land cover
+types as (source, target, fraction) triples and the diagonal as a stream
+fraction per bucket. Fractions are scaled by the relativeAreaIndex of source and
+target, so water depths are in mm over the bucket's share of the land cover
+area and storage in mm over the land cover area is sum(waterDepth * relativeAreaIndex).
+
+With NumPy the step is a handful of vector operations over zero copy views of
+the state arrays, without it a loop over the buckets and the non zero elements.
+"""
+
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class BucketRouting:
+    """Precomputed flow matrix routing over a BucketState."""
+
+    def __init__(self, bucketState, flowMatrices, useNumpy=None, tolerance=1.0e-6):
+        """
+        Build the transfer operator.
+
+        Parameters:
+        bucketState (BucketState): State of the buckets to route
+        flowMatrices (list): SquareMatrix flow matrix of each land cover type, in state order
+        useNumpy (bool, optional): Use NumPy, defaults to whether it is installed
+        tolerance (float): Allowed mass balance error, in mm over the land cover area
+
+        Raises:
+        ValueError: If a flow matrix does not match the buckets or does not conserve water
+        ImportError: If useNumpy is True and NumPy is not installed
+        """
+        if useNumpy and np is None:
+            raise ImportError("NumPy is required for useNumpy=True")
+        self.useNumpy = np is not None if useNumpy is None else useNumpy
+        self.tolerance = tolerance
+        self.state = bucketState
+        bucketCount = bucketState.bucketCount
+        size = bucketState.landCoverCount * bucketCount
+        if len(flowMatrices) != bucketState.landCoverCount:
+            raise ValueError(f"Expected {bucketState.landCoverCount} flow matrices, got {len(flowMatrices)}")
+
+        area = bucketState.relativeAreaIndex
+        self.drainFraction = array('d', bytes(8 * size))
+        self.boundWaterDepth = array('d', bytes(8 * size))
+        self.streamFraction = array('d', bytes(8 * size))
+        self.sources = array('i')
+        self.targets = array('i')
+        self.fractions = array('d')
+        for position, matrix in enumerate(flowMatrices):
+            if matrix.size != bucketCount:
+                raise ValueError(f"Flow matrix of land cover type {position} is {matrix.size} x {matrix.size}, "
+                                 f"expected {bucketCount} x {bucketCount}")
+            matrix.validateFlowMatrix(tolerance)
+            first = position * bucketCount
+            for i in range(bucketCount):
+                source = first + i
+                timeConstant = bucketState.characteristicTimeConstant[source]
+                self.drainFraction[source] = 1.0 - math.exp(-1.0 / timeConstant) if timeConstant > 0 else 1.0
+                self.boundWaterDepth[source] = (bucketState.tightlyBoundWaterDepth[source]
+                                                + bucketState.looselyBoundWaterDepth[source])
+                self.streamFraction[source] = matrix[i, i] * area[source]
+                for j in range(bucketCount):
+                    if j != i and matrix[i, j]:
+                        self.sources.append(source)
+                        self.targets.append(first + j)
+                        self.fractions.append(matrix[i, j] * area[source] / area[first + j])
+
+        #water input goes to the surficial buckets, split by area when there are several
+        self.inputFraction = array('d', bytes(8 * size))
+        for position in range(bucketState.landCoverCount):
+            offsets = [bucketState.offset(position, b) for b in range(bucketCount) if bucketState.surficial[b]]
+            if not offsets:
+                raise ValueError("At least one bucket must be surficial to receive the water input")
+            for offset in offsets:
+                self.inputFraction[offset] = 1.0 / (area[offset] * len(offsets))
+
+        self.drained = array('d', bytes(8 * size))
+        self.massBalanceError = 0.0
+        if self.useNumpy:
+            self._numpyOperator()
+
+    def _numpyOperator(self):
+        """NumPy copies of the operator and views of the state arrays."""
+        self.npDrainFraction = np.array(self.drainFraction)
+        self.npBoundWaterDepth = np.array(self.boundWaterDepth)
+        self.npStreamFraction = np.array(self.streamFraction)
+        self.npInputFraction = np.array(self.inputFraction)
+        self.npSources = np.array(self.sources, dtype=np.intp)
+        self.npTargets = np.array(self.targets, dtype=np.intp)
+        self.npFractions = np.array(self.fractions)
+        #views share memory with the state arrays, which are never resized
+        self.npWaterDepth = np.frombuffer(self.state.waterDepth, dtype=np.float64)
+        self.npArea = np.frombuffer(self.state.relativeAreaIndex, dtype=np.float64)
+
+    def __getstate__(self):
+        #NumPy views of the state cannot be pickled, rebuild them after unpickling
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('np')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.useNumpy:
+            self._numpyOperator()
+
+    def storage(self):
+        """Water stored in the buckets of each land cover type, mm over the land cover area."""
+        bucketCount = self.state.bucketCount
+        waterDepth = self.state.waterDepth
+        area = self.state.relativeAreaIndex
+        return [sum(waterDepth[i] * area[i] for i in range(first, first + bucketCount))
+                for first in range(0, len(waterDepth), bucketCount)]
+
+    def step(self, waterInput):
+        """
+        Route one time step.
+
+        Parameters:
+        waterInput (sequence of float): Water input of each land cover type, mm over its area
+
+        Returns:
+        list: Water reaching the stream from each land cover type, mm over its area
+        """
+        bucketCount = self.state.bucketCount
+        if self.useNumpy:
+            waterDepth = self.npWaterDepth
+            waterDepth += np.repeat(np.asarray(waterInput, dtype=np.float64), bucketCount) * self.npInputFraction
+            drained = np.maximum(waterDepth - self.npBoundWaterDepth, 0.0) * self.npDrainFraction
+            waterDepth -= drained
+            np.add.at(waterDepth, self.npTargets, drained[self.npSources] * self.npFractions)
+            return np.add.reduceat(drained * self.npStreamFraction, np.arange(0, len(drained), bucketCount)).tolist()
+
+        waterDepth = self.state.waterDepth
+        drained = self.drained
+        inputFraction = self.inputFraction
+        bound = self.boundWaterDepth
+        drainFraction = self.drainFraction
+        streamFraction = self.streamFraction
+        toStream = []
+        for position, value in enumerate(waterInput):
+            first = position * bucketCount
+            stream = 0.0
+            for i in range(first, first + bucketCount):
+                depth = waterDepth[i] + value * inputFraction[i]
+                free = depth - bound[i]
+                drain = free * drainFraction[i] if free > 0.0 else 0.0
+                drained[i] = drain
+                waterDepth[i] = depth - drain
+                stream += drain * streamFraction[i]
+            toStream.append(stream)
+        for source, target, fraction in zip(self.sources, self.targets, self.fractions):
+            waterDepth[target] += drained[source] * fraction
+        return toStream
+
+    def route(self, waterInputs):
+        """
+        Route a series of time steps and check the mass balance.
+
+        Parameters:
+        waterInputs (list): Water input series of each land cover type, mm over its area
+
+        Returns:
+        list: Series of water reaching the stream from each land cover type, as array('d')
+
+        Raises:
+        ValueError: If the change in storage of a land cover type differs from its
+                    water input minus the water reaching the stream by more than the tolerance
+        """
+        landCoverCount = self.state.landCoverCount
+        stepCount = len(waterInputs[0]) if waterInputs else 0
+        toStream = [array('d', bytes(8 * stepCount)) for _ in range(landCoverCount)]
+        before = self.storage()
+        for k in range(stepCount):
+            stream = self.step([series[k] for series in waterInputs])
+            for position in range(landCoverCount):
+                toStream[position][k] = stream[position]
+        self.checkMassBalance(before, [sum(series) for series in waterInputs],
+                              [sum(series) for series in toStream])
+        return toStream
+
+    def checkMassBalance(self, before, inputs, outputs):
+        """
+        Compare the change in storage of each land cover type with its inputs and outputs.
+
+        Parameters:
+        before (list): Storage of each land cover type at the start, from storage()
+        inputs (list): Total water input of each land cover type
+        outputs (list): Total water leaving each land cover type
+
+        Returns:
+        float: The largest absolute error, also kept in massBalanceError
+
+        Raises:
+        ValueError: If the error exceeds the tolerance
+        """
+        after = self.storage()
+        errors = [abs(a - b - i + o) for a, b, i, o in zip(after, before, inputs, outputs)]
+        self.massBalanceError = max(errors, default=0.0)
+        scale = max([1.0] + [abs(value) for value in before + list(inputs)])
+        if self.massBalanceError > self.tolerance * scale:
+            position = errors.index(self.massBalanceError)
+            raise ValueError(f"Bucket routing mass balance error of {self.massBalanceError} mm "
+                             f"in land cover type {position}")
+        return self.massBalanceError
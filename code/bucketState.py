@@ -0,0 +1,135 @@
+"""
+Array Backed Bucket State
+
+BucketState holds the parameters and state of every bucket of every land cover
+type of a subcatchment as a struct of arrays: one array('d') per field, with
+bucket b of land cover type l at offset l * bucketCount + b. Bucket and
+LandCoverType objects are thin views over it, so the time loop can work on the
+flat arrays of a whole subcatchment at once while the object API keeps working.
+"""
+
+from array import array
+
+
+class BucketState:
+    """Parameters and state of all buckets of all land cover types in a subcatchment."""
+
+    # Fields read from the landCover.bucket section of the parameter set
+    PARAMETER_FIELDS = (
+        'characteristicTimeConstant',
+        'freelyDrainingWaterDepth',
+        'looselyBoundWaterDepth',
+        'tightlyBoundWaterDepth',
+        'relativeAreaIndex',
+        'relativeETIndex',
+        'ETScalingExponent',
+        'soilTemperatureEffectiveDepth',
+    )
+    # Fields that change during a run
+    STATE_FIELDS = (
+        'waterDepth',
+        'soilTemperature',
+        'potentialEvapotranspiration',
+        'actualEvapotranspiration',
+    )
+    FIELDS = PARAMETER_FIELDS + ('maximumWaterDepth',) + STATE_FIELDS
+
+    __slots__ = ('landCoverCount', 'bucketCount', 'names', 'surficial') + FIELDS
+
+    def __init__(self, landCoverCount, bucketCount):
+        """
+        Create a zero filled state.
+
+        Parameters:
+        landCoverCount (int): Number of land cover types
+        bucketCount (int): Number of buckets per land cover type
+        """
+        self.landCoverCount = landCoverCount
+        self.bucketCount = bucketCount
+        self.names = [''] * bucketCount
+        self.surficial = [False] * bucketCount
+        size = landCoverCount * bucketCount
+        for field in self.FIELDS:
+            setattr(self, field, array('d', bytes(8 * size)))
+
+    @classmethod
+    def fromParameters(cls, pars, landCoverIndices=None):
+        """
+        Read the bucket parameters and initial state of a parameter set.
+
+        Parameters:
+        pars (ParameterSet): The parameter set
+        landCoverIndices (list, optional): Land cover types to include, defaults to all
+
+        Returns:
+        BucketState: The state, land cover types in the order of landCoverIndices
+        """
+        compiled = pars.compiled()
+        if landCoverIndices is None:
+            landCoverIndices = range(compiled.landCoverCount)
+        landCoverIndices = list(landCoverIndices)
+        state = cls(len(landCoverIndices), compiled.bucketCount)
+        state.names = compiled.bucketNames[:compiled.bucketCount]
+        state.surficial = list(compiled.surficial)
+
+        #the compiled parameters are already scaled to the model time step, copy the rows of each land cover type
+        for field in cls.PARAMETER_FIELDS + ('maximumWaterDepth',):
+            setattr(state, field, compiled.bucketSlice(field, landCoverIndices))
+        state.waterDepth = compiled.bucketSlice('initialWaterDepth', landCoverIndices)
+        state.soilTemperature = compiled.bucketSlice('initialSoilTemperature', landCoverIndices)
+        return state
+
+    def offset(self, landCoverPosition, bucketIndex):
+        """Offset of a bucket in the field arrays."""
+        return landCoverPosition * self.bucketCount + bucketIndex
+
+    def landCoverOffsets(self, landCoverPosition):
+        """Offsets of the buckets of one land cover type, top bucket first."""
+        first = landCoverPosition * self.bucketCount
+        return range(first, first + self.bucketCount)
+
+    def evapotranspire(self, offsets=None):
+        """
+        Take actual evapotranspiration out of the buckets.
+
+        Actual evapotranspiration equals the potential rate while there is freely
+        draining water, limited to the freely draining depth. Below that the rate
+        is scaled by ((waterDepth - tightlyBound) / looselyBound) ** ETScalingExponent,
+        and there is none when only tightly bound water is left.
+
+        Parameters:
+        offsets (iterable of int, optional): Buckets to update, defaults to all
+        """
+        if offsets is None:
+            offsets = range(len(self.waterDepth))
+        waterDepth = self.waterDepth
+        tight = self.tightlyBoundWaterDepth
+        loose = self.looselyBoundWaterDepth
+        potential = self.potentialEvapotranspiration
+        actual = self.actualEvapotranspiration
+        exponent = self.ETScalingExponent
+        for i in offsets:
+            depth = waterDepth[i]
+            boundWaterDepth = tight[i] + loose[i]
+            if depth > boundWaterDepth:
+                evapotranspiration = min(potential[i], depth - boundWaterDepth)
+            elif depth > tight[i]:
+                evapotranspiration = ((depth - tight[i]) / loose[i]) ** exponent[i] * potential[i]
+            else:
+                evapotranspiration = 0.0
+            actual[i] = evapotranspiration
+            waterDepth[i] = depth - evapotranspiration
+
+    def totalWaterDepth(self, landCoverPosition):
+        """Sum of the water depths of the buckets of one land cover type."""
+        return sum(self.waterDepth[i] for i in self.landCoverOffsets(landCoverPosition))
+
+
+def stateField(field):
+    """Property reading and writing one BucketState field at the offset of a view."""
+    def getter(self):
+        return getattr(self.state, field)[self.offset]
+
+    def setter(self, value):
+        getattr(self.state, field)[self.offset] = value
+    return property(getter, setter, doc=f"{field} of the bucket, stored in the shared BucketState")
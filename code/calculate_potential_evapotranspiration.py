@@ -1,9 +1,16 @@
-import datetime
 import math
 import timeSeries
+from columnarTimeSeries import ColumnarTimeSeries
+
+# NumPy is optional, the PET formulas fall back to the standard library without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def calculate_pet(solar_ts, temp_ts, method="priestley-taylor", solar_column="solar_radiation", 
-                 temp_column="air_temperature", jh_offset=3.0, scaling_factor=1.0):
+                 temp_column="air_temperature", jh_offset=3.0, scaling_factor=1.0,
+                 use_numpy=None, timeseries_class=timeSeries.TimeSeries):
     """
     Calculate Potential Evapotranspiration (PET) using either the Priestley-Taylor method
     or the Jensen-Haise McGuinness method with customizable parameters.
@@ -16,6 +23,13 @@ def calculate_pet(solar_ts, temp_ts, method="priestley-taylor", solar_column="so
     temp_column (str): Name of the column containing temperature values (°C)
     jh_offset (float): Temperature offset parameter for Jensen-Haise McGuinness formula (default 3.0)
     scaling_factor (float): Empirical scaling factor to apply to all PET values (default 1.0)
+    use_numpy (bool): Use NumPy for the PET formulas, defaults to True when NumPy is installed
+    timeseries_class (type): TimeSeries class of the output (default TimeSeries)
+    
+    Output rows follow the rows of the solar series. When both series have the same
+    timestamps and locations in the same order, temperatures are read by position;
+    otherwise each solar row is matched to the temperature at the same timestamp and
+    location with a sorted merge per location.
     
     Returns:
     TimeSeries: A new time series object with PET values (mm/day)
@@ -29,14 +43,12 @@ def calculate_pet(solar_ts, temp_ts, method="priestley-taylor", solar_column="so
     method_name = "Priestley Taylor" if method.lower() == "priestley-taylor" else "Jensen-Haise McGuinness"
     
     # Create a new TimeSeries object for the output
-    output_ts = timeSeries.TimeSeries()
+    output_ts = timeseries_class()
     
     # Get latitude from solar time series metadata
     if "latitude" not in solar_ts.metadata:
         raise ValueError("Latitude not found in solar radiation time series metadata")
     
-    latitude_deg = solar_ts.metadata["latitude"]
-    
     # Copy metadata from input solar timeseries
     for key, value in solar_ts.metadata.items():
         output_ts.add_metadata(key, value)
@@ -51,100 +63,134 @@ def calculate_pet(solar_ts, temp_ts, method="priestley-taylor", solar_column="so
     if method.lower() == "jensen-haise":
         output_ts.add_metadata("offset", jh_offset)
     
-    # Get indices for required columns in solar time series
-    try:
-        timestamp_idx_solar = solar_ts.columns.index("timestamp")
-        location_idx_solar = solar_ts.columns.index("location")
-        solar_idx = solar_ts.columns.index(solar_column)
-    except ValueError as e:
-        raise ValueError(f"Required column not found in solar time series: {e}")
-    
-    # Get indices for required columns in temperature time series
-    try:
-        timestamp_idx_temp = temp_ts.columns.index("timestamp")
-        location_idx_temp = temp_ts.columns.index("location")
-        temp_idx = temp_ts.columns.index(temp_column)
-    except ValueError as e:
-        raise ValueError(f"Required column not found in temperature time series: {e}")
-    
-    # Create a lookup dictionary for temperature data for easy matching
-    temp_lookup = {}
-    for row in temp_ts.data:
-        timestamp = row[timestamp_idx_temp]
-        location = row[location_idx_temp]
-        temperature = row[temp_idx]
+    # Check that the value columns are present
+    if solar_column not in solar_ts.columns[2:]:
+        raise ValueError(f"Required column not found in solar time series: '{solar_column}' is not in list")
+    if temp_column not in temp_ts.columns[2:]:
+        raise ValueError(f"Required column not found in temperature time series: '{temp_column}' is not in list")
+    
+    # Line the temperatures up with the solar rows
+    solar_values = solar_ts._column_values(solar_column)
+    if _keys_aligned(solar_ts, temp_ts):
+        temperatures = temp_ts._column_values(temp_column)
+    else:
+        temperatures = _merge_column(solar_ts, temp_ts, temp_column)
+    
+    # Calculate PET for all rows at once, rows missing either input give None
+    pet_values = _pet_values(solar_values, temperatures, method.lower(), jh_offset, scaling_factor, use_numpy)
+    
+    # Add data to output timeseries in one block, a columnar output gets an array('d') column with NaN for None
+    if isinstance(solar_ts, ColumnarTimeSeries) and isinstance(output_ts, ColumnarTimeSeries):
+        codes, locations = solar_ts.get_location_codes()
+        columnar_ts = timeseries_class.from_arrays(
+            solar_ts.get_timestamp_array()[:], codes[:], locations,
+            {"pet_mm_day": ColumnarTimeSeries._to_float_array(pet_values)})
+        columnar_ts.uuid = output_ts.uuid
+        columnar_ts.columns[0] = output_ts.columns[0]
+        columnar_ts.metadata = output_ts.metadata
+        return columnar_ts
+    
+    keys = list(solar_ts._iter_keys())
+    output_ts.add_rows([key[0] for key in keys], [key[1] for key in keys], {"pet_mm_day": pet_values})
+    
+    return output_ts
+
+
+def _keys_aligned(first_ts, second_ts):
+    """
+    Check whether two time series have the same (timestamp, location) keys in the same row order.
+    
+    Columnar series are compared on their integer timestamp and location code buffers.
+    """
+    if first_ts.row_count() != second_ts.row_count():
+        return False
+    if isinstance(first_ts, ColumnarTimeSeries) and isinstance(second_ts, ColumnarTimeSeries):
+        first_codes, first_locations = first_ts.get_location_codes()
+        second_codes, second_locations = second_ts.get_location_codes()
+        if first_locations == second_locations:
+            return first_ts.get_timestamp_array() == second_ts.get_timestamp_array() and first_codes == second_codes
+    return all(first == second for first, second in zip(first_ts._iter_keys(), second_ts._iter_keys()))
+
+
+def _merge_column(target_ts, source_ts, column_name):
+    """
+    Look up a column of source_ts for every row of target_ts by timestamp and location.
+    
+    Both series are walked in timestamp order one location at a time using their
+    sorted indexes. When source_ts has several rows with the same key the last one wins.
+    
+    Returns:
+    list: One value per target row, None where source_ts has no matching row
+    """
+    source_values = source_ts._column_values(column_name)
+    target_times = [key[0] for key in target_ts._iter_keys()]
+    source_times = [key[0] for key in source_ts._iter_keys()]
+    matched = [None] * len(target_times)
+    
+    source_locations = set(source_ts.get_locations())
+    for location in target_ts.get_locations():
+        if location not in source_locations:
+            continue
+        target_offsets = target_ts.get_sorted_offsets(location)
+        source_offsets = source_ts.get_sorted_offsets(location)
+        j = 0
+        for i in target_offsets:
+            timestamp = target_times[i]
+            while j < len(source_offsets) and source_times[source_offsets[j]] < timestamp:
+                j += 1
+            # Move to the last source row with this timestamp
+            k = j
+            while k < len(source_offsets) and source_times[source_offsets[k]] == timestamp:
+                k += 1
+            if k > j:
+                matched[i] = source_values[source_offsets[k - 1]]
+    
+    return matched
+
+
+def _pet_values(solar_values, temperatures, method, jh_offset, scaling_factor, use_numpy):
+    """
+    Calculate PET (mm/day) for aligned solar radiation (W/m²) and temperature (°C) values.
+    
+    Returns:
+    list: PET for each row, None where either input is missing (None or NaN)
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise ImportError("use_numpy=True needs NumPy, which is not installed")
+    
+    if use_numpy:
+        rs = np.array([np.nan if value is None else value for value in solar_values], dtype=float) * 0.0864
+        temperature = np.array([np.nan if value is None else value for value in temperatures], dtype=float)
+        if method == "priestley-taylor":
+            delta = 4098 * (0.6108 * np.exp((17.27 * temperature) / (temperature + 237.3))) / ((temperature + 237.3) ** 2)
+            pet = 1.26 * (delta / (delta + 0.067)) * (0.77 * rs * 0.408)
+        else:
+            pet = rs * 0.025 * (temperature + jh_offset)
+        pet *= scaling_factor
+        return [None if value != value else value for value in pet.tolist()]
+    
+    pet_values = []
+    exp = math.exp
+    for solar_radiation, temperature in zip(solar_values, temperatures):
+        # x != x is True for NaN
+        if solar_radiation is None or temperature is None or solar_radiation != solar_radiation or temperature != temperature:
+            pet_values.append(None)
+            continue
         
-        # Create a unique key from timestamp and location
-        key = (timestamp, location)
-        temp_lookup[key] = temperature
-    
-    # Process each data point from solar radiation time series
-    for row in solar_ts.data:
-        timestamp = row[timestamp_idx_solar]
-        location = row[location_idx_solar]
-        solar_radiation = row[solar_idx]
+        # Convert solar radiation from W/m² to MJ/m²/day
+        rs = solar_radiation * 0.0864
         
-        # Create key to look up corresponding temperature
-        key = (timestamp, location)
-        temperature = temp_lookup.get(key)
+        if method == "priestley-taylor":
+            # Net radiation (Rn), saturation vapour pressure slope (Delta) in kPa/°C and
+            # psychrometric constant (gamma = 0.067 kPa/°C); 0.408 converts MJ/m²/day to mm/day
+            rn = 0.77 * rs
+            delta = 4098 * (0.6108 * exp((17.27 * temperature) / (temperature + 237.3))) / ((temperature + 237.3) ** 2)
+            pet = 1.26 * (delta / (delta + 0.067)) * (rn * 0.408)
+        else:  # Jensen-Haise McGuinness, PET = Rs * Ct * (T + offset) with Ct = 0.025
+            pet = rs * 0.025 * (temperature + jh_offset)
         
-        # Calculate PET if both solar radiation and temperature are available
-        if solar_radiation is not None and temperature is not None:
-            # Calculate day of year (DOY)
-            doy = timestamp.timetuple().tm_yday
-            
-            # Convert latitude to radians
-            lat_rad = math.radians(latitude_deg)
-            
-            # Calculate solar declination (radians)
-            solar_declination = 0.409 * math.sin(2 * math.pi * doy / 365 - 1.39)
-            
-            # Calculate sunset hour angle (radians)
-            sunset_angle = math.acos(-math.tan(lat_rad) * math.tan(solar_declination))
-            
-            # Calculate extraterrestrial radiation (Ra) in MJ/m²/day
-            dr = 1 + 0.033 * math.cos(2 * math.pi * doy / 365)  # inverse relative distance Earth-Sun
-            ra = 24 * 60 / math.pi * 0.0820 * dr * (
-                sunset_angle * math.sin(lat_rad) * math.sin(solar_declination) +
-                math.cos(lat_rad) * math.cos(solar_declination) * math.sin(sunset_angle)
-            )
-            
-            # Convert solar radiation from W/m² to MJ/m²/day
-            rs = solar_radiation * 0.0864
-            
-            # Calculate PET based on selected method
-            if method.lower() == "priestley-taylor":
-                # Calculate net radiation (Rn) - simplified approach
-                rn = 0.77 * rs
-                
-                # Calculate saturation vapor pressure slope (Delta) in kPa/°C
-                delta = 4098 * (0.6108 * math.exp((17.27 * temperature) / (temperature + 237.3))) / ((temperature + 237.3) ** 2)
-                
-                # Calculate psychrometric constant (gamma) in kPa/°C
-                gamma = 0.067
-                
-                # Calculate PET using Priestley-Taylor equation (mm/day)
-                alpha_pt = 1.26  # Priestley-Taylor coefficient
-                pet = alpha_pt * (delta / (delta + gamma)) * (rn * 0.408)  # 0.408 converts MJ/m²/day to mm/day
-                
-            else:  # Jensen-Haise McGuinness
-                # Constants for Jensen-Haise McGuinness
-                ct = 0.025  # Temperature coefficient
-                
-                # Convert temperature to Celsius if not already
-                temp_c = temperature
-                
-                # Calculate PET using Jensen-Haise McGuinness equation with user-specified offset (mm/day)
-                # PET = Rs * Ct * (T + offset)
-                pet = rs * ct * (temp_c + jh_offset)
-            
-            # Apply the scaling factor
-            pet *= scaling_factor
-                
-            # Add data to output timeseries
-            output_ts.add_data(timestamp, location, {"pet_mm_day": pet})
-        else:
-            # Handle missing data
-            output_ts.add_data(timestamp, location, {"pet_mm_day": None})
+        pet_values.append(pet * scaling_factor)
     
-    return output_ts
\ No newline at end of file
+    return pet_values
@@ -1,3 +1,85 @@
+import datetime
+from array import array
+from timeSeries import TimeSeries
+from columnarTimeSeries import ColumnarTimeSeries
+
+# NumPy is optional, the kernel falls back to the standard library without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def snow_hydrology_kernel(
+    temperature,
+    precipitation,
+    initial_snow_depth=0.0,
+    melt_temperature=0.0,
+    rainfall_temperature=0.0,
+    snowfall_multiplier=1.0,
+    rainfall_multiplier=1.0,
+    melt_rate=3.0,
+    use_numpy=None
+):
+    """
+    Calculate rainfall, snowfall, snow depth and snow melt for one snowpack.
+    
+    The rain/snow partition and the melt potential are computed for all time steps
+    at once, only the snow depth recurrence runs step by step.
+    
+    Parameters:
+    -----------
+    temperature : sequence of float
+        Air temperature at each time step, in time order, no missing values
+    precipitation : sequence of float
+        Precipitation at each time step
+    initial_snow_depth : float, default=0.0
+        Snow depth before the first time step
+    melt_temperature, rainfall_temperature, snowfall_multiplier,
+    rainfall_multiplier, melt_rate : float
+        As for calculate_snow_hydrology
+    use_numpy : bool, optional
+        Use NumPy for the vectorised steps, defaults to True when NumPy is installed
+    
+    Returns:
+    --------
+    tuple
+        (rainfall, snowfall, snow_depth, snow_melt, final_snow_depth), the first four
+        are array('d') with one value per time step, snow_depth is the depth at the
+        start of the step
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise ImportError("use_numpy=True needs NumPy, which is not installed")
+    
+    if use_numpy:
+        T = np.asarray(temperature, dtype=float)
+        P = np.asarray(precipitation, dtype=float)
+        is_rain = T >= rainfall_temperature
+        rainfall = np.where(is_rain, rainfall_multiplier * P, 0.0).tolist()
+        snowfall = np.where(is_rain, 0.0, snowfall_multiplier * P).tolist()
+        melt_potential = (np.maximum(T - melt_temperature, 0.0) * melt_rate).tolist()
+    else:
+        rainfall = [rainfall_multiplier * p if t >= rainfall_temperature else 0.0
+                    for t, p in zip(temperature, precipitation)]
+        snowfall = [0.0 if t >= rainfall_temperature else snowfall_multiplier * p
+                    for t, p in zip(temperature, precipitation)]
+        melt_potential = [max(t - melt_temperature, 0.0) * melt_rate for t in temperature]
+    
+    # Snow depth recurrence, each step depends on the one before
+    snow_depth = array('d', bytes(8 * len(snowfall)))
+    snow_melt = array('d', bytes(8 * len(snowfall)))
+    depth = initial_snow_depth
+    for i, (fall, potential) in enumerate(zip(snowfall, melt_potential)):
+        melt = depth if depth < potential else potential
+        snow_depth[i] = depth
+        snow_melt[i] = melt
+        depth = depth + fall - melt
+    
+    return array('d', rainfall), array('d', snowfall), snow_depth, snow_melt, depth
+
+
 def calculate_snow_hydrology(
     input_timeseries,
     initial_snow_depth=0.0,
@@ -6,17 +88,25 @@ def calculate_snow_hydrology(
     snowfall_multiplier=1.0,
     rainfall_multiplier=1.0,
     melt_rate=3.0,
-    output_name=None
+    output_name=None,
+    use_numpy=None,
+    timeseries_class=TimeSeries
 ):
     """
     Calculate rainfall, snowfall, snow depth, and snow melt from temperature and precipitation data.
     
+    Each location has its own snowpack. Rows with a missing temperature or
+    precipitation value are skipped. Output rows are in timestamp order, rows with
+    equal timestamps keep their input order, as in get_sorted_data.
+    
     Parameters:
     -----------
     input_timeseries : TimeSeries
         A TimeSeries object containing 'air_temperature' and 'precipitation' columns
-    initial_snow_depth : float, default=0.0
-        Initial snow depth at time t=0
+    initial_snow_depth : float or dict, default=0.0
+        Initial snow depth at time t=0, either one value for all locations or a
+        dictionary of values by location (e.g. 'final_snow_depth' from the metadata
+        of the previous chunk's output)
     melt_temperature : float, default=0.0
         Temperature threshold for snow melt to occur (°C)
     rainfall_temperature : float, default=0.0
@@ -29,25 +119,90 @@ def calculate_snow_hydrology(
         Rate of snow melt per degree above melt temperature
     output_name : str, optional
         Name for output TimeSeries object (defaults to input name with "_hydrology" appended)
-        
+    use_numpy : bool, optional
+        Use NumPy for the vectorised steps, defaults to True when NumPy is installed
+    timeseries_class : type, default=TimeSeries
+        TimeSeries class of the output, e.g. ColumnarTimeSeries
+    
     Returns:
     --------
     TimeSeries
-        A TimeSeries object containing 'rainfall', 'snowfall', 'snow_depth', and 'snow_melt' columns
+        A TimeSeries object containing 'rainfall', 'snowfall', 'snow_depth', and 'snow_melt'
+        columns, with the snow depth after the last step of each location stored in the
+        'final_snow_depth' metadata entry
     
     Raises:
     -------
     ValueError
         If input_timeseries doesn't contain required columns
     """
-    from collections import defaultdict
-    
     # Verify input TimeSeries has required columns
     required_columns = ['air_temperature', 'precipitation']
     for col in required_columns:
         if col not in input_timeseries.columns:
             raise ValueError(f"Input TimeSeries must contain '{col}' column")
     
+    # Work on the column buffers, missing values are None (TimeSeries) or NaN (ColumnarTimeSeries)
+    temperatures = input_timeseries._column_values('air_temperature')
+    precipitations = input_timeseries._column_values('precipitation')
+    
+    # Columnar input and output keep the integer timestamps and location codes as they are
+    columnar = isinstance(input_timeseries, ColumnarTimeSeries) and issubclass(timeseries_class, ColumnarTimeSeries)
+    if columnar:
+        epoch_times = input_timeseries.get_timestamp_array()
+        timestamps = array('q')
+        locations = array('i')
+    else:
+        keys = list(input_timeseries._iter_keys())
+        timestamps = []
+        locations = []
+    
+    # Output rows in timestamp order; x == x is False for NaN
+    order = [i for i in input_timeseries.get_sorted_offsets()
+             if temperatures[i] is not None and precipitations[i] is not None
+             and temperatures[i] == temperatures[i] and precipitations[i] == precipitations[i]]
+    position = {offset: k for k, offset in enumerate(order)}
+    results = {column: array('d', bytes(8 * len(order)))
+               for column in ('rainfall', 'snowfall', 'snow_depth', 'snow_melt')}
+    final_snow_depth = {}
+    
+    # Run one snowpack per location, in time order, and put its rows in place
+    location_names = input_timeseries.get_locations()
+    location_codes = {}
+    for location_code, location in enumerate(location_names):
+        location_codes[location] = location_code
+        offsets = [i for i in input_timeseries.get_sorted_offsets(location) if i in position]
+        if isinstance(initial_snow_depth, dict):
+            start_depth = initial_snow_depth.get(location, 0.0)
+        else:
+            start_depth = initial_snow_depth
+        
+        rainfall, snowfall, snow_depth, snow_melt, final_snow_depth[location] = snow_hydrology_kernel(
+            [temperatures[i] for i in offsets],
+            [precipitations[i] for i in offsets],
+            start_depth,
+            melt_temperature,
+            rainfall_temperature,
+            snowfall_multiplier,
+            rainfall_multiplier,
+            melt_rate,
+            use_numpy
+        )
+        
+        for column, values in (('rainfall', rainfall), ('snowfall', snowfall),
+                               ('snow_depth', snow_depth), ('snow_melt', snow_melt)):
+            buffer = results[column]
+            for offset, value in zip(offsets, values):
+                buffer[position[offset]] = value
+    
+    if columnar:
+        timestamps.extend(epoch_times[i] for i in order)
+        input_codes, input_locations = input_timeseries.get_location_codes()
+        locations.extend(location_codes[input_locations[input_codes[i]]] for i in order)
+    else:
+        timestamps.extend(keys[i][0] for i in order)
+        locations.extend(keys[i][1] for i in order)
+    
     # Create output TimeSeries
     if output_name is None:
         if input_timeseries.name:
@@ -55,7 +210,12 @@ def calculate_snow_hydrology(
         else:
             output_name = "hydrology_results"
     
-    output_ts = TimeSeries(output_name)
+    # Add data to output TimeSeries in one block
+    if columnar:
+        output_ts = timeseries_class.from_arrays(timestamps, locations, location_names, results, name=output_name)
+    else:
+        output_ts = timeseries_class(output_name)
+        output_ts.add_rows(timestamps, locations, results)
     
     # Add metadata
     model_parameters = {
@@ -70,79 +230,9 @@ def calculate_snow_hydrology(
     for key, value in model_parameters.items():
         output_ts.add_metadata(key, value)
     
-    # Get indices for required columns
-    temp_idx = input_timeseries.get_column_index('air_temperature')
-    precip_idx = input_timeseries.get_column_index('precipitation')
-    timestamp_idx = input_timeseries.get_column_index('timestamp')
-    location_idx = input_timeseries.get_column_index('location')
-    
-    # Sort input data by timestamp to ensure proper time sequencing
-    sorted_data = sorted(input_timeseries.data, key=lambda row: row[timestamp_idx])
-    
-    # Initialize results storage
-    results = defaultdict(list)
-    current_snow_depth = initial_snow_depth
-    
-    # Process each time step
-    for i, row in enumerate(sorted_data):
-        timestamp = row[timestamp_idx]
-        location = row[location_idx]
-        temperature = row[temp_idx]
-        precipitation = row[precip_idx]
-        
-        # Skip if any required data is None
-        if temperature is None or precipitation is None:
-            continue
-            
-        # Calculate rainfall
-        if temperature >= rainfall_temperature:
-            rainfall = rainfall_multiplier * precipitation
-        else:
-            rainfall = 0.0
-            
-        # Calculate snowfall
-        if temperature < rainfall_temperature:
-            snowfall = snowfall_multiplier * precipitation
-        else:
-            snowfall = 0.0
-            
-        # Calculate snow melt
-        melt_potential = max((temperature - melt_temperature), 0.0) * melt_rate
-        snow_melt = min(current_snow_depth, melt_potential)
-        
-        # Update snow depth for next iteration
-        new_snow_depth = current_snow_depth + snowfall - snow_melt
-        
-        # Add calculated values to results
-        results['timestamp'].append(timestamp)
-        results['location'].append(location)
-        results['rainfall'].append(rainfall)
-        results['snowfall'].append(snowfall)
-        results['snow_depth'].append(current_snow_depth)  # Current snow depth (before update)
-        results['snow_melt'].append(snow_melt)
-        
-        # Update current snow depth for next time step
-        current_snow_depth = new_snow_depth
-    
-    # Add data to output TimeSeries
-    for i in range(len(results['timestamp'])):
-        # Create a dictionary of values for the current row
-        values = {
-            'rainfall': results['rainfall'][i],
-            'snowfall': results['snowfall'][i],
-            'snow_depth': results['snow_depth'][i],
-            'snow_melt': results['snow_melt'][i]
-        }
-        
-        # Add data to output TimeSeries
-        output_ts.add_data(
-            timestamp=results['timestamp'][i],
-            location=results['location'][i],
-            values=values
-        )
-    
     # Add source information to metadata
+    output_ts.add_metadata('final_snow_depth', final_snow_depth)
     output_ts.add_metadata('source_timeseries', input_timeseries.name if input_timeseries.name else 'unnamed')
     output_ts.add_metadata('creation_datetime', datetime.datetime.now().isoformat())
     
-    return output_ts
\ No newline at end of file
+    return output_ts
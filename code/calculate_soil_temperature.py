@@ -1,5 +1,6 @@
 import datetime
 import math
+from array import array
 from timeSeries import TimeSeries
 
 def simulate_soil_temperature(
@@ -15,6 +16,7 @@ def simulate_soil_temperature(
 ):
     """
     Simulate soil temperature based on air temperature and snow depth.
+    Each location keeps its own soil temperature.
     
     Parameters:
     -----------
@@ -47,12 +49,133 @@ def simulate_soil_temperature(
     ValueError
         If input_timeseries doesn't contain required columns
     """
+    parameter_set = {'C_s': C_s, 'K_t': K_t, 'C_ice': C_ice, 'f_s': f_s, 'Z_s': Z_s, 'T_ice': T_ice}
+    output_ts = simulate_soil_temperature_batch(
+        input_timeseries,
+        parameter_sets={'soil_T': parameter_set},
+        T_0=T_0,
+        output_name=output_name,
+        column_prefix=None
+    )
+    
+    # Same metadata as before: the input's, each simulation parameter, then the source
+    batch_metadata = output_ts.metadata
+    output_ts.metadata = {'uuid': output_ts.uuid}
+    for key, value in input_timeseries.metadata.items():
+        output_ts.add_metadata(key, value)
+    output_ts.add_metadata('T_0', T_0)
+    for key, value in parameter_set.items():
+        output_ts.add_metadata(key, value)
+    for key in ('source_timeseries', 'simulation_datetime'):
+        output_ts.add_metadata(key, batch_metadata[key])
+    
+    return output_ts
+
+
+def soil_temperature_parameter_sets(parameters):
+    """
+    Read the soil temperature parameters of every land cover type from a parameter set.
+    
+    Parameters:
+    -----------
+    parameters : ParameterSet or dict
+        Parameter set with the per land cover lists under
+        landCover/general/soilTemperatureModel and the names under landCover/general/name
+        (SimpleParSet.json) or landCover/identifier/name (parameterSet.json)
+        
+    Returns:
+    --------
+    dict
+        Land cover name -> {'C_s': ..., 'K_t': ..., 'C_ice': ..., 'f_s': ...}
+    
+    Raises:
+    -------
+    ValueError
+        If the land cover names or soil temperature parameters are not in either layout
+    """
+    parameters = getattr(parameters, 'parameters', parameters)
+    landCover = parameters.get('landCover', {})
+    general = landCover.get('general', {})
+    for section in (general, landCover.get('identifier', {})):
+        if 'name' in section:
+            names = section['name']
+            break
+    else:
+        raise ValueError("Unsupported parameter set layout: land cover names are in neither "
+                         "landCover/general/name nor landCover/identifier/name")
+    if 'soilTemperatureModel' not in general:
+        raise ValueError("Unsupported parameter set layout: no landCover/general/soilTemperatureModel section")
+    model = general['soilTemperatureModel']
+    return {
+        name: {key: values[i] for key, values in model.items()}
+        for i, name in enumerate(names)
+    }
+
+
+def simulate_soil_temperature_batch(
+    input_timeseries,
+    parameter_sets=None,
+    T_0=5.0,
+    Z_s=0.5,
+    T_ice=0.0,
+    output_name=None,
+    column_prefix='soil_T',
+    timeseries_class=TimeSeries
+):
+    """
+    Simulate soil temperature for every location and parameter set in one pass.
+    
+    Each location has its own soil temperature state, started at T_0 (a value or a
+    dictionary with an entry for every location). The snow damping and freeze/thaw coefficients are
+    computed once per parameter set for all rows, after which each parameter set
+    advances all locations together through the rows in timestamp order. Rows with
+    a missing air temperature or snow depth are skipped.
+    
+    Parameters:
+    -----------
+    input_timeseries : TimeSeries
+        A TimeSeries object containing 'air_T' and 'snow_depth' columns
+    parameter_sets : dict, optional
+        Name -> {'C_s', 'K_t', 'C_ice', 'f_s'} and optionally 'Z_s' and 'T_ice', for
+        example from soil_temperature_parameter_sets. Defaults to a single set with the
+        default values of simulate_soil_temperature
+    T_0 : float or dict, default=5.0
+        Initial soil temperature (°C), one value or a dictionary by location that
+        must cover every location of input_timeseries
+    Z_s : float, default=0.5
+        Soil depth (m) for parameter sets that do not set it
+    T_ice : float, default=0.0
+        Critical ice temperature (°C) for parameter sets that do not set it
+    output_name : str, optional
+        Name for output TimeSeries object (defaults to input name with "_soil_temp" appended)
+    column_prefix : str, optional
+        Output columns are named '<column_prefix>_<set name>', or just the set
+        name when column_prefix is None
+    timeseries_class : type, default=TimeSeries
+        TimeSeries class of the output
+        
+    Returns:
+    --------
+    TimeSeries
+        A multi-location TimeSeries with one soil temperature column per parameter set,
+        the final temperature of each location and set is stored in the
+        'final_soil_T' metadata entry
+    
+    Raises:
+    -------
+    ValueError
+        If input_timeseries doesn't contain required columns, or T_0 is a
+        dictionary without an entry for one of its locations
+    """
     # Verify input TimeSeries has required columns
     required_columns = ['air_T', 'snow_depth']
     for col in required_columns:
         if col not in input_timeseries.columns:
             raise ValueError(f"Input TimeSeries must contain '{col}' column")
     
+    if parameter_sets is None:
+        parameter_sets = {'default': {'C_s': 1.3e06, 'K_t': 0.63, 'C_ice': 9.3e06, 'f_s': -3.3}}
+    
     # Create output TimeSeries
     if output_name is None:
         if input_timeseries.name:
@@ -60,72 +183,73 @@ def simulate_soil_temperature(
         else:
             output_name = "soil_temperature_results"
     
-    output_ts = TimeSeries(output_name)
-    
-    # Add simulation parameters to metadata
-    model_parameters = {
-        'T_0': T_0,
-        'C_s': C_s,
-        'K_t': K_t,
-        'C_ice': C_ice,
-        'f_s': f_s,
-        'Z_s': Z_s,
-        'T_ice': T_ice
-    }
+    output_ts = timeseries_class(output_name)
     
     # Copy all metadata from input TimeSeries
     for key, value in input_timeseries.metadata.items():
         output_ts.add_metadata(key, value)
     
-    # Add new simulation parameters to metadata
-    for key, value in model_parameters.items():
-        output_ts.add_metadata(key, value)
-    
-    # Get indices for required columns
-    air_T_idx = input_timeseries.get_column_index('air_T')
-    snow_depth_idx = input_timeseries.get_column_index('snow_depth')
-    timestamp_idx = input_timeseries.get_column_index('timestamp')
-    location_idx = input_timeseries.get_column_index('location')
+    # Add simulation parameters to metadata
+    output_ts.add_metadata('T_0', T_0)
+    output_ts.add_metadata('parameter_sets', parameter_sets)
     
-    # Sort input data by timestamp to ensure proper time sequencing
-    sorted_data = sorted(input_timeseries.data, key=lambda row: row[timestamp_idx])
+    # Rows in timestamp order that have both inputs, x == x is False for NaN
+    air_T = input_timeseries._column_values('air_T')
+    snow_depth = input_timeseries._column_values('snow_depth')
+    offsets = [i for i in input_timeseries.get_sorted_offsets()
+               if air_T[i] is not None and snow_depth[i] is not None
+               and air_T[i] == air_T[i] and snow_depth[i] == snow_depth[i]]
+    keys = list(input_timeseries._iter_keys())
+    timestamps = [keys[i][0] for i in offsets]
+    locations = [keys[i][1] for i in offsets]
     
-    # Initialize soil temperature
-    current_soil_T = T_0
+    # Encode the locations so the state of all locations is one list
+    location_names = input_timeseries.get_locations()
+    location_codes = {location: code for code, location in enumerate(location_names)}
+    if isinstance(T_0, dict):
+        missing = [str(location) for location in location_names if location not in T_0]
+        if missing:
+            raise ValueError(f"T_0 has no initial soil temperature for location(s): {', '.join(missing)}")
+        initial_soil_T = [T_0[location] for location in location_names]
+    else:
+        initial_soil_T = [T_0] * len(location_names)
+    codes = [location_codes[location] for location in locations]
+    row_air_T = [air_T[i] for i in offsets]
+    row_snow_depth = [snow_depth[i] for i in offsets]
     
-    # Process each time step
-    for i, row in enumerate(sorted_data):
-        timestamp = row[timestamp_idx]
-        location = row[location_idx]
-        air_T = row[air_T_idx]
-        snow_depth = row[snow_depth_idx]
-        
-        # Skip if any required data is None
-        if air_T is None or snow_depth is None:
-            continue
+    results = {}
+    final_soil_T = {location: {} for location in location_names}
+    for set_name, parameter_set in parameter_sets.items():
+        set_Z_s = parameter_set.get('Z_s', Z_s)
+        set_T_ice = parameter_set.get('T_ice', T_ice)
+        f_s = parameter_set['f_s']
         
-        # Calculate delta_T based on current soil temperature
-        snow_effect = math.exp(f_s * snow_depth)
+        # Freeze/thaw coefficients and snow damping, computed once for all rows
+        thawed = parameter_set['K_t'] / (parameter_set['C_s'] * set_Z_s**2)
+        frozen = parameter_set['K_t'] / ((parameter_set['C_s'] + parameter_set['C_ice']) * set_Z_s**2)
+        snow_effect = [math.exp(f_s * depth) for depth in row_snow_depth]
         
-        if current_soil_T >= T_ice:
-            # Above freezing case
-            delta_T = snow_effect * (K_t / (C_s * (Z_s**2))) * (air_T - current_soil_T)
-        else:
-            # Below freezing case with ice effect
-            delta_T = snow_effect * (K_t / ((C_s + C_ice) * (Z_s**2))) * (air_T - current_soil_T)
-        
-        # Update soil temperature for this time step
-        current_soil_T = current_soil_T + delta_T
+        # Advance every location's soil temperature through the rows
+        state = list(initial_soil_T)
+        soil_T = array('d', bytes(8 * len(offsets)))
+        for i, (code, air, damping) in enumerate(zip(codes, row_air_T, snow_effect)):
+            current_soil_T = state[code]
+            coefficient = thawed if current_soil_T >= set_T_ice else frozen
+            current_soil_T = current_soil_T + damping * coefficient * (air - current_soil_T)
+            state[code] = current_soil_T
+            soil_T[i] = current_soil_T
         
-        # Add calculated soil temperature to output TimeSeries
-        output_ts.add_data(
-            timestamp=timestamp,
-            location=location,
-            values={'soil_T': current_soil_T}
-        )
+        column_name = f"{column_prefix}_{set_name}" if column_prefix else set_name
+        results[column_name] = soil_T
+        for location, value in zip(location_names, state):
+            final_soil_T[location][set_name] = value
+    
+    # Add all rows to the output TimeSeries in one block
+    output_ts.add_rows(timestamps, locations, results)
     
     # Add source information to metadata
+    output_ts.add_metadata('final_soil_T', final_soil_T)
     output_ts.add_metadata('source_timeseries', input_timeseries.name if input_timeseries.name else 'unnamed')
     output_ts.add_metadata('simulation_datetime', datetime.datetime.now().isoformat())
     
-    return output_ts
\ No newline at end of file
+    return output_ts
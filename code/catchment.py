@@ -1,21 +1,20 @@
 from subcatchment import Subcatchment
 from reach import Reach
+from reachNetwork import ReachNetwork
 from chemical import Chemical
 
 class Catchment:
     """First attempt at creating a catchment representation in INCA/PERSiST"""
   
-    def solveSubcatchments(self, subcatchmentIndex):
-        """stub to solve inputs and outputs from subcatchments"""
+    def solveSubcatchments(self, subcatchmentIndex, drivingData):
+        """solve a single subcatchment in this process and return its output arrays,
+        Model.run solves all of them in worker processes through subcatchmentSolver"""
 
-        self.subcatchments[subcatchmentIndex].solve()
-        subcatchmentExportsToReach = []
-        
-        return subcatchmentExportsToReach
+        return self.subcatchments[subcatchmentIndex].solve(drivingData)
 
     def __init__(self,pars):
 
-        subcatchmentCount=pars.parameters["subcatchment"]["general"]["name"].__len__()
+        subcatchmentCount=pars.compiled().subcatchmentCount
         
         self.name=pars.parameters["general"]["name"]
 
@@ -24,6 +23,11 @@ class Catchment:
         for i in range(subcatchmentCount):
             self.subcatchments.append(Subcatchment(pars,i))
             self.reaches.append(Reach(pars,i))
+
+        #routing graph from the reach outflows, upstream reaches come first in reachNetwork.order
+        self.reachNetwork = ReachNetwork.from_reaches(self.reaches)
+        for reach, inflows in zip(self.reaches, self.reachNetwork.inflows):
+            reach.inflows = list(inflows)
         
         self.hasChemicals=False #flag variable to simplify decision making
         Chemical.addChemicals(self,pars)
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+Model State Checkpoints
+
+A checkpoint holds the full state of a catchment at the end of a time step: the
+water depth, soil temperature and evapotranspiration of every bucket, the snow
+depth of every land cover type of every subcatchment, and the flow and volume of
+every reach. Model.run writes checkpoints at a configurable interval and can
+resume from one, so a long run survives a crash and a spin-up period can be
+reused by other scenarios instead of being recomputed.
+
+File layout (all blocks start on an 8 byte boundary):
+1. 8 byte magic number b"INCACP01"
+2. Header length as an unsigned 64 bit integer (little endian)
+3. JSON header with the time of the checkpoint (seconds since 1970-01-01), the
+   subcatchment, land cover, bucket and reach names, the state blocks as
+   [name, value count] pairs, byte order and any user metadata
+4. The values of all blocks, one float64 array in header order
+
+Restoring checks the names against the catchment, so a checkpoint cannot be
+loaded into a model with a different structure. Parameters are not stored,
+a checkpoint can be restored into a model with other parameter values.
+"""
+
+import json
+import os
+import struct
+import sys
+from array import array
+
+from bucketState import BucketState
+
+MAGIC = b"INCACP01"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+
+def _padding(length):
+    """Number of bytes needed to bring length up to the block alignment."""
+    return (-length) % ALIGNMENT
+
+
+def _structure(catchment):
+    """Names describing the structure of a catchment, used to check a checkpoint fits it."""
+    subcatchment = catchment.subcatchments[0] if catchment.subcatchments else None
+    return {
+        "subcatchments": [subcatchment.name for subcatchment in catchment.subcatchments],
+        "landCovers": [landCover.name for landCover in subcatchment.landCoverTypes] if subcatchment else [],
+        "buckets": list(subcatchment.bucketState.names) if subcatchment else [],
+        "reaches": [reach.name for reach in catchment.reaches],
+    }
+
+
+def capture_state(catchment):
+    """
+    Collect the state of a catchment.
+
+    Parameters:
+    catchment (Catchment): The catchment
+
+    Returns:
+    tuple: (blocks, values) where blocks is a list of [name, value count] pairs and
+           values an array('d') holding the blocks one after another
+    """
+    blocks = []
+    values = array('d')
+    for i, subcatchment in enumerate(catchment.subcatchments):
+        for field in BucketState.STATE_FIELDS:
+            data = getattr(subcatchment.bucketState, field)
+            blocks.append([f"subcatchment[{i}].bucket.{field}", len(data)])
+            values.extend(data)
+        blocks.append([f"subcatchment[{i}].landCover.snowDepth", len(subcatchment.landCoverTypes)])
+        values.extend(landCover.snowDepth for landCover in subcatchment.landCoverTypes)
+    for field in ("Flow", "volume"):
+        blocks.append([f"reach.{field}", len(catchment.reaches)])
+        values.extend(getattr(reach, field) for reach in catchment.reaches)
+    return blocks, values
+
+
+def restore_state(catchment, blocks, values):
+    """
+    Write a captured state back into a catchment.
+
+    Parameters:
+    catchment (Catchment): The catchment, with the structure the state was captured from
+    blocks (list): [name, value count] pairs, see capture_state
+    values (sequence of float): The values of the blocks
+
+    Raises:
+    ValueError: If the blocks do not match the catchment
+    """
+    expected, _ = capture_state(catchment)
+    if [list(block) for block in blocks] != expected:
+        raise ValueError("The checkpoint state does not match the catchment")
+    position = 0
+    for i, subcatchment in enumerate(catchment.subcatchments):
+        for field in BucketState.STATE_FIELDS:
+            data = getattr(subcatchment.bucketState, field)
+            # in place, the buckets and the routing are views of these arrays
+            data[:] = array('d', values[position:position + len(data)])
+            position += len(data)
+        for landCover in subcatchment.landCoverTypes:
+            landCover.snowDepth = values[position]
+            position += 1
+    for field in ("Flow", "volume"):
+        for reach in catchment.reaches:
+            setattr(reach, field, values[position])
+            position += 1
+
+
+def save_checkpoint(filename, catchment, time, metadata=None):
+    """
+    Save the state of a catchment to a checkpoint file.
+
+    The file is written under a temporary name and then renamed, so a crash while
+    writing never leaves a damaged checkpoint behind.
+
+    Parameters:
+    filename (str): Path to the checkpoint file
+    catchment (Catchment): The catchment
+    time (int): Seconds since 1970-01-01 of the last time step included in the state
+    metadata (dict, optional): Extra JSON serialisable information to store
+
+    Returns:
+    str: Path to the created file
+    """
+    blocks, values = capture_state(catchment)
+    header = {
+        "version": FORMAT_VERSION,
+        "time": int(time),
+        "structure": _structure(catchment),
+        "blocks": blocks,
+        "byteOrder": sys.byteorder,
+        "metadata": metadata or {},
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _padding(len(header_bytes))
+
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as checkpoint_file:
+            checkpoint_file.write(MAGIC)
+            checkpoint_file.write(struct.pack("<Q", len(header_bytes)))
+            checkpoint_file.write(header_bytes)
+            values.tofile(checkpoint_file)
+        os.replace(temporary, filename)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return filename
+
+
+class Checkpoint:
+    """
+    A checkpoint read from a file.
+
+    Attributes:
+    time (int): Seconds since 1970-01-01 of the last time step included in the state
+    structure (dict): Subcatchment, land cover, bucket and reach names
+    blocks (list): [name, value count] pairs
+    values (array): The state values
+    metadata (dict): Extra information stored with the checkpoint
+    """
+
+    def __init__(self, filename):
+        """
+        Read a checkpoint file.
+
+        Parameters:
+        filename (str): Path to the file
+
+        Raises:
+        ValueError: If the file is not a checkpoint file or is incomplete
+        """
+        self.filename = filename
+        with open(filename, "rb") as checkpoint_file:
+            content = checkpoint_file.read()
+        if content[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{filename}' is not a checkpoint file")
+        header_start = len(MAGIC) + 8
+        (header_length,) = struct.unpack("<Q", content[len(MAGIC):header_start])
+        header = json.loads(content[header_start:header_start + header_length].decode("utf-8"))
+        if header["version"] > FORMAT_VERSION:
+            raise ValueError(f"'{filename}' uses format version {header['version']}, "
+                             f"only version {FORMAT_VERSION} or older can be read")
+
+        self.time = header["time"]
+        self.structure = header["structure"]
+        self.blocks = header["blocks"]
+        self.metadata = header["metadata"]
+        self.values = array('d')
+        data = content[header_start + header_length:]
+        if len(data) != 8 * sum(count for _, count in self.blocks):
+            raise ValueError(f"'{filename}' is incomplete")
+        self.values.frombytes(data)
+        if header["byteOrder"] != sys.byteorder:
+            self.values.byteswap()
+
+    def restore(self, catchment):
+        """
+        Write the state into a catchment.
+
+        Parameters:
+        catchment (Catchment): A catchment with the same subcatchments, land cover
+                               types, buckets and reaches
+
+        Raises:
+        ValueError: If the catchment has a different structure
+        """
+        structure = _structure(catchment)
+        for part, names in structure.items():
+            if names != self.structure[part]:
+                raise ValueError(f"Checkpoint '{self.filename}' has {part} {self.structure[part]}, "
+                                 f"the catchment has {names}")
+        restore_state(catchment, self.blocks, self.values)
+
+
+def load_checkpoint(filename):
+    """
+    Read a checkpoint file.
+
+    Parameters:
+    filename (str): Path to the file
+
+    Returns:
+    Checkpoint: The checkpoint
+    """
+    return Checkpoint(filename)
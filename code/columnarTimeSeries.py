@@ -0,0 +1,467 @@
+import datetime
+from array import array
+
+from timeSeries import TimeSeries
+
+# Reference point for the integer timestamp buffer
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_SECOND = datetime.timedelta(seconds=1)
+
+# Value stored in the column buffers for missing data
+MISSING = float("nan")
+
+
+def to_epoch_seconds(timestamp):
+    """
+    Convert a datetime to whole seconds since 1970-01-01 00:00:00.
+
+    Naive datetimes are taken as they are, timezone aware datetimes are
+    converted to UTC first. Sub-second precision is dropped.
+
+    Parameters:
+    timestamp (datetime): The timestamp to convert
+
+    Returns:
+    int: Seconds since the epoch
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // ONE_SECOND
+
+
+def from_epoch_seconds(seconds):
+    """
+    Convert seconds since 1970-01-01 00:00:00 back to a (naive) datetime.
+
+    Parameters:
+    seconds (int): Seconds since the epoch
+
+    Returns:
+    datetime: The corresponding timestamp
+    """
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+class ColumnarTimeSeries(TimeSeries):
+    """
+    A TimeSeries that stores its data in typed column buffers instead of a list of rows.
+
+    Storage layout:
+    1. Timestamps are held as int64 seconds since the epoch in an array('q')
+    2. Locations are dictionary encoded, each row stores a small integer code in an array('i')
+    3. Every data column is an array('d') where missing values are stored as NaN
+
+    The row based API of TimeSeries (add_data, data, get_data_by_location,
+    get_data_by_timerange, to_dict, save_to_files and merge) keeps working, rows are
+    built on demand and missing values are returned as None. Rows returned by the
+    data property are copies, changing them does not change the stored values.
+    Only numeric values can be stored. The timestamp and location indexes of
+    TimeSeries are kept as integer arrays over the encoded keys.
+    """
+
+    def __init__(self, name=None):
+        """
+        Initialize an empty ColumnarTimeSeries object.
+
+        Parameters:
+        name (str, optional): Name of the TimeSeries object
+        """
+        self._clear_buffers()
+        super().__init__(name)
+
+    def _clear_buffers(self):
+        """Reset the timestamp, location and value buffers to empty."""
+        self._times = array('q')
+        self._location_codes = array('i')
+        self._location_names = []
+        self._location_lookup = {}
+        self._values = {}
+
+    def _encode_location(self, location):
+        """Return the integer code for a location, registering it if it is new."""
+        code = self._location_lookup.get(location)
+        if code is None:
+            code = len(self._location_names)
+            self._location_lookup[location] = code
+            self._location_names.append(location)
+        return code
+
+    def _buffer(self, column_name):
+        """
+        Return the value buffer for a data column.
+
+        A NaN filled buffer is created when the column has been added to
+        self.columns directly rather than through add_column.
+        """
+        buffer = self._values.get(column_name)
+        if buffer is None:
+            buffer = array('d', [MISSING]) * len(self._times)
+            self._values[column_name] = buffer
+        return buffer
+
+    @staticmethod
+    def _to_float(value):
+        """Convert a value for storage, None becomes NaN."""
+        if value is None:
+            return MISSING
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise TypeError(f"ColumnarTimeSeries can only store numeric values, got {value!r}")
+
+    @classmethod
+    def _to_float_array(cls, values):
+        """Convert a sequence of values to an array('d'), None becomes NaN."""
+        try:
+            # Fast path for sequences that hold only numbers
+            return array('d', values)
+        except TypeError:
+            return array('d', [cls._to_float(value) for value in values])
+
+    @property
+    def data(self):
+        """
+        The data as a list of rows [timestamp, location, value1, value2, ...].
+
+        The rows are built from the column buffers each time the property is read.
+        """
+        return list(self._iter_rows())
+
+    @data.setter
+    def data(self, rows):
+        """Replace the stored data with a list of rows in the TimeSeries layout."""
+        self._clear_buffers()
+        self.invalidate_indexes()
+        columns = getattr(self, "columns", None)
+        if columns is None:
+            return
+        buffers = [self._buffer(col) for col in columns[2:]]
+        for row in rows:
+            self._times.append(to_epoch_seconds(row[0]))
+            self._location_codes.append(self._encode_location(row[1]))
+            for i, buffer in enumerate(buffers):
+                buffer.append(self._to_float(row[i + 2]) if i + 2 < len(row) else MISSING)
+
+    def _iter_rows(self, offsets=None):
+        """
+        Build data rows from the column buffers.
+
+        Parameters:
+        offsets (iterable of int, optional): Row offsets to build, defaults to all rows
+        """
+        names = self._location_names
+        times = self._times
+        codes = self._location_codes
+        buffers = [self._buffer(col) for col in self.columns[2:]]
+        if offsets is None:
+            offsets = range(len(times))
+        for i in offsets:
+            row = [from_epoch_seconds(times[i]), names[codes[i]]]
+            for buffer in buffers:
+                value = buffer[i]
+                row.append(None if value != value else value)
+            yield row
+
+    def row_count(self):
+        """
+        Get the number of data rows in the time series.
+
+        Returns:
+        int: The number of rows
+        """
+        return len(self._times)
+
+    def add_column(self, column_name):
+        """
+        Add a new column to the data structure, existing rows are filled with NaN.
+
+        Parameters:
+        column_name (str): The name of the new column
+        """
+        if column_name not in self.columns:
+            self.columns.append(column_name)
+            self._buffer(column_name)
+
+    def add_data(self, timestamp, location, values):
+        """
+        Add a new row of data to the time series.
+
+        Parameters:
+        timestamp (datetime): The timestamp for the data point
+        location (str): The location identifier
+        values (list or dict): The numeric values to add
+        """
+        if not isinstance(timestamp, datetime.datetime):
+            raise TypeError("timestamp must be a datetime object")
+
+        if isinstance(values, dict):
+            # Ensure all columns exist
+            for col_name in values.keys():
+                if col_name not in self.columns:
+                    self.add_column(col_name)
+            row_values = [values.get(col_name) for col_name in self.columns[2:]]
+        elif isinstance(values, list):
+            # Add new columns if needed
+            for i in range(len(values)):
+                col_name = f"value{i+1}"
+                if col_name not in self.columns:
+                    self.add_column(col_name)
+            row_values = values + [None] * (len(self.columns) - 2 - len(values))
+        else:
+            raise TypeError("values must be a list or dictionary")
+
+        # Convert everything before appending so a bad value does not leave a ragged row
+        converted = [self._to_float(value) for value in row_values]
+        self._times.append(to_epoch_seconds(timestamp))
+        self._location_codes.append(self._encode_location(location))
+        for col_name, value in zip(self.columns[2:], converted):
+            self._buffer(col_name).append(value)
+
+        # Keep the indexes current if they were current before this row
+        offset = len(self._times) - 1
+        if self._indexed_rows == offset:
+            self._index_row(offset, self._times[offset], self._location_codes[offset])
+
+    def add_rows(self, timestamps, locations, columns):
+        """
+        Add a block of rows to the time series in one call.
+
+        The block is validated and converted once and appended to the column
+        buffers in bulk, which makes this much faster than calling add_data for
+        every row when loading large files.
+
+        Parameters:
+        timestamps (sequence of datetime): The timestamp of each row
+        locations: A single location identifier used for every row, or a
+                   sequence with one location identifier per row
+        columns (dict): Column name -> sequence of numeric values, one per row.
+                        Columns that do not exist yet are added, existing columns
+                        not in the mapping are filled with NaN
+        """
+        row_count, locations = self._validate_block(timestamps, locations, columns)
+
+        # Convert everything before appending so a bad value does not leave ragged buffers
+        converted = {col_name: self._to_float_array(values) for col_name, values in columns.items()}
+        try:
+            times = array('q', [(timestamp - EPOCH) // ONE_SECOND for timestamp in timestamps])
+        except TypeError:
+            # Timezone aware timestamps need converting to UTC first
+            times = array('q', [to_epoch_seconds(timestamp) for timestamp in timestamps])
+        encode = self._encode_location
+        codes = array('i', [encode(location) for location in locations])
+
+        for col_name in columns.keys():
+            if col_name not in self.columns:
+                self.add_column(col_name)
+
+        # The indexes pick up the new rows lazily on the next query
+        self._times.extend(times)
+        self._location_codes.extend(codes)
+        for col_name in self.columns[2:]:
+            values = converted.get(col_name)
+            if values is None:
+                values = array('d', [MISSING]) * row_count
+            self._buffer(col_name).extend(values)
+
+    def extend_columns(self, columns):
+        """
+        Set whole data columns for the rows already in the time series.
+
+        Parameters:
+        columns (dict): Column name -> sequence of numeric values with one value per
+                        existing row. Columns that do not exist yet are added,
+                        existing columns are overwritten
+        """
+        row_count = self.row_count()
+        converted = {}
+        for col_name, values in columns.items():
+            if len(values) != row_count:
+                raise ValueError(f"Expected {row_count} values for column '{col_name}', got {len(values)}")
+            converted[col_name] = self._to_float_array(values)
+
+        for col_name, values in converted.items():
+            if col_name not in self.columns:
+                self.columns.append(col_name)
+            self._values[col_name] = values
+
+    def _new_index_buffer(self):
+        """Return an empty container for index keys or row offsets."""
+        return array('q')
+
+    def _key_getters(self):
+        """Return two callables mapping a row offset to its timestamp key and its location key."""
+        return self._times.__getitem__, self._location_codes.__getitem__
+
+    def _time_key(self, timestamp):
+        """Convert a timestamp to the key used in the timestamp index."""
+        return to_epoch_seconds(timestamp)
+
+    def _location_key(self, location):
+        """Convert a location to the key used in the location index."""
+        return self._location_lookup.get(location)
+
+    def _rows_at(self, offsets):
+        """Return the data rows at the given row offsets."""
+        return list(self._iter_rows(offsets))
+
+    def get_locations(self):
+        """
+        Get the distinct location identifiers in order of first appearance.
+
+        Returns:
+        list: The location identifiers
+        """
+        return list(self._location_names)
+
+    def _iter_keys(self):
+        """Iterate over the (timestamp, location) key of every row."""
+        # Rows at different locations share their timestamp objects
+        timestamps = {}
+        names = self._location_names
+        for seconds, code in zip(self._times, self._location_codes):
+            timestamp = timestamps.get(seconds)
+            if timestamp is None:
+                timestamp = from_epoch_seconds(seconds)
+                timestamps[seconds] = timestamp
+            yield timestamp, names[code]
+
+    def _column_values(self, column_name):
+        """Return an indexable sequence of the values of one data column, NaN marks missing values."""
+        return self._buffer(column_name)
+
+    def get_column_array(self, column_name):
+        """
+        Get the value buffer of a data column, missing values are NaN.
+
+        Parameters:
+        column_name (str): The name of the column
+
+        Returns:
+        array: The array('d') holding the column values (not a copy)
+        """
+        if column_name not in self.columns[2:]:
+            raise ValueError(f"Column '{column_name}' not found")
+        return self._buffer(column_name)
+
+    def get_timestamp_array(self):
+        """
+        Get the timestamp buffer.
+
+        Returns:
+        array: The array('q') of seconds since the epoch (not a copy)
+        """
+        return self._times
+
+    def get_location_codes(self):
+        """
+        Get the dictionary encoded locations.
+
+        Returns:
+        tuple: (codes, locations) where codes is the array('i') of per row codes
+               and locations is the list mapping a code to its location identifier
+        """
+        return self._location_codes, self._location_names
+
+    def to_dict(self):
+        """
+        Convert the data to a dictionary format.
+
+        Returns:
+        dict: A dictionary where keys are column names and values are lists of column values
+        """
+        names = self._location_names
+        result = {
+            self.columns[0]: [from_epoch_seconds(t) for t in self._times],
+            self.columns[1]: [names[code] for code in self._location_codes],
+        }
+        for col_name in self.columns[2:]:
+            result[col_name] = [None if v != v else v for v in self._buffer(col_name)]
+        return result
+
+    @classmethod
+    def from_arrays(cls, times, location_codes, locations, values, name=None):
+        """
+        Create a ColumnarTimeSeries around existing buffers without copying them.
+
+        Parameters:
+        times (array): array('q') of seconds since the epoch, one per row
+        location_codes (array): array('i') of location codes, one per row
+        locations (list): Location identifier for each location code
+        values (dict): Column name -> array('d') with one value per row, NaN for missing
+        name (str, optional): Name of the TimeSeries object
+
+        Returns:
+        ColumnarTimeSeries: The new time series
+        """
+        row_count = len(times)
+        if len(location_codes) != row_count:
+            raise ValueError(f"Expected {row_count} location codes, got {len(location_codes)}")
+        for col_name, buffer in values.items():
+            if len(buffer) != row_count:
+                raise ValueError(f"Expected {row_count} values for column '{col_name}', got {len(buffer)}")
+
+        result = cls(name)
+        result._times = times
+        result._location_codes = location_codes
+        result._location_names = list(locations)
+        result._location_lookup = {location: code for code, location in enumerate(result._location_names)}
+        result._values = dict(values)
+        result.columns.extend(values.keys())
+        return result
+
+    @classmethod
+    def _merge_buffer(cls, row_count):
+        """Return a NaN filled array('d') of row_count values for merge_many to fill."""
+        return array('d', [MISSING]) * row_count
+
+    @classmethod
+    def _from_merged(cls, name, keys, buffers):
+        """Create the result of merge_many around the buffers it filled, without copying them."""
+        times = array('q', [to_epoch_seconds(key[0]) for key in keys])
+        locations = []
+        lookup = {}
+        location_codes = array('i')
+        for _, location in keys:
+            code = lookup.get(location)
+            if code is None:
+                code = len(locations)
+                lookup[location] = code
+                locations.append(location)
+            location_codes.append(code)
+        return cls.from_arrays(times, location_codes, locations, buffers, name=name)
+
+    @classmethod
+    def from_timeseries(cls, ts):
+        """
+        Create a ColumnarTimeSeries holding the same data as a row based TimeSeries.
+
+        The name, UUID, column names and metadata are carried over unchanged.
+
+        Parameters:
+        ts (TimeSeries): The TimeSeries to convert
+
+        Returns:
+        ColumnarTimeSeries: The converted time series
+        """
+        result = cls(ts.name)
+        result.uuid = ts.uuid
+        result.columns = list(ts.columns)
+        result.metadata = dict(ts.metadata)
+        result.data = ts._iter_rows()
+        return result
+
+    def to_timeseries(self):
+        """
+        Convert to a row based TimeSeries.
+
+        The name, UUID, column names and metadata are carried over unchanged.
+
+        Returns:
+        TimeSeries: The converted time series
+        """
+        result = TimeSeries(self.name)
+        result.uuid = self.uuid
+        result.columns = list(self.columns)
+        result.metadata = dict(self.metadata)
+        result.data = self.data
+        return result
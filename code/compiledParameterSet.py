@@ -0,0 +1,167 @@
+"""
+Compiled Parameter Set
+
+CompiledParameterSet flattens the nested dictionaries of a ParameterSet once
+into typed arrays, so building a model reads parameters by integer offset rather
+than walking pars.parameters['landCover']['bucket'][b]['hydrology'][...] for
+every value of every object. Rate parameters are scaled to the model time step
+when compiling, and land cover parameters that are combined with a subcatchment
+parameter (snowfall and snowmelt temperatures, rainfall and snowfall
+multipliers) are combined once.
+
+Layout, with one array('d') per field:
+- bucket fields at offset landCover * bucketCount + bucket (bucketOffset)
+- land cover fields at offset subcatchment * landCoverCount + landCover (landCoverOffset)
+- subcatchment fields at the subcatchment index
+- reach fields at the reach index
+The bucket parameters of the parameter set do not vary between subcatchments,
+so the bucket fields are stored once and shared by all subcatchments.
+"""
+
+from array import array
+
+from squareMatrix import SquareMatrix
+
+
+class CompiledParameterSet:
+    """Flat, time step scaled parameter arrays of a ParameterSet."""
+
+    # Bucket fields read from landCover.bucket[b].hydrology
+    BUCKET_HYDROLOGY_FIELDS = (
+        'characteristicTimeConstant',
+        'freelyDrainingWaterDepth',
+        'looselyBoundWaterDepth',
+        'tightlyBoundWaterDepth',
+        'initialWaterDepth',
+        'relativeETIndex',
+        'ETScalingExponent',
+    )
+    # Bucket fields read from landCover.bucket[b].general
+    BUCKET_GENERAL_FIELDS = (
+        'relativeAreaIndex',
+        'soilTemperatureEffectiveDepth',
+    )
+    BUCKET_FIELDS = BUCKET_HYDROLOGY_FIELDS + BUCKET_GENERAL_FIELDS + ('initialSoilTemperature', 'maximumWaterDepth')
+    LAND_COVER_FIELDS = (
+        'percentCover',
+        'snowmeltRate',
+        'snowDepth',
+        'snowmeltTemperature',
+        'snowfallTemperature',
+        'snowfallMultiplier',
+        'rainfallMultiplier',
+    )
+    SUBCATCHMENT_FIELDS = ('area', 'latitudeAtOutflow', 'longitudeAtOutflow')
+    REACH_FIELDS = ('length', 'widthAtBottom', 'slope', 'initialFlow')
+    MANNING_FIELDS = ('a', 'b', 'c', 'f', 'n')
+
+    def __init__(self, pars):
+        """
+        Compile a parameter set.
+
+        Parameters:
+        pars (ParameterSet): The parameter set
+
+        Raises:
+        ValueError: If a flow matrix does not match the buckets or does not conserve water
+        """
+        parameters = pars.parameters
+        general = parameters['general']
+        landCover = parameters['landCover']
+        subcatchment = parameters['subcatchment']
+        reach = parameters['reach']
+
+        self.timeStep = general['timeStep']
+        #rates are given per day in the parameter set
+        self.daysPerStep = self.timeStep / 86400.0
+
+        self.bucketNames = list(parameters['bucket']['general']['name'])
+        self.landCoverNames = list(landCover['general']['name'])
+        self.subcatchmentNames = list(subcatchment['general']['name'])
+        self.reachNames = list(reach['general']['name'])
+        self.bucketCount = len(landCover['bucket'])
+        self.landCoverCount = len(self.landCoverNames)
+        self.subcatchmentCount = len(self.subcatchmentNames)
+        self.reachCount = len(self.reachNames)
+
+        # Buckets
+        bucketCount = self.bucketCount
+        self.surficial = [bucket['general']['surficial'] for bucket in landCover['bucket']]
+        self.bucket = {field: array('d', bytes(8 * self.landCoverCount * bucketCount)) for field in self.BUCKET_FIELDS}
+        for b, bucket in enumerate(landCover['bucket']):
+            sections = [(field, bucket['hydrology'][field]) for field in self.BUCKET_HYDROLOGY_FIELDS]
+            sections += [(field, bucket['general'][field]) for field in self.BUCKET_GENERAL_FIELDS]
+            for field, values in sections:
+                self.bucket[field][b::bucketCount] = array('d', values[:self.landCoverCount])
+            self.bucket['initialSoilTemperature'][b::bucketCount] = \
+                array('d', [bucket['general']['initialSoilTemperature']]) * self.landCoverCount
+        timeConstant = self.bucket['characteristicTimeConstant']
+        for i in range(len(timeConstant)):
+            timeConstant[i] /= self.daysPerStep
+            self.bucket['maximumWaterDepth'][i] = (self.bucket['freelyDrainingWaterDepth'][i]
+                                                   + self.bucket['looselyBoundWaterDepth'][i]
+                                                   + self.bucket['tightlyBoundWaterDepth'][i])
+
+        self.flowMatrices = []
+        for l, rows in enumerate(landCover['hydrology']['flowMatrix'][:self.landCoverCount]):
+            matrix = SquareMatrix.fromRows(rows)
+            if matrix.size != bucketCount:
+                raise ValueError(f"Flow matrix of land cover type {self.landCoverNames[l]} is {matrix.size} x "
+                                 f"{matrix.size}, expected {bucketCount} x {bucketCount}")
+            matrix.validateFlowMatrix()
+            self.flowMatrices.append(matrix)
+
+        # Land cover types in each subcatchment
+        hydrology = landCover['hydrology']
+        scHydrology = subcatchment['hydrology']
+        self.landCover = {field: array('d') for field in self.LAND_COVER_FIELDS}
+        for s in range(self.subcatchmentCount):
+            for l in range(self.landCoverCount):
+                self.landCover['percentCover'].append(subcatchment['general']['landCoverPercent'][s][l])
+                self.landCover['snowmeltRate'].append(hydrology['snowmeltRate'][l] / self.daysPerStep)
+                self.landCover['snowDepth'].append(hydrology['snowDepth'][l])
+                #temperatures are the sum, multipliers the product of the land cover and subcatchment values
+                self.landCover['snowmeltTemperature'].append(hydrology['snowmeltTemperature'][l]
+                                                             + scHydrology['snowmeltTemperature'][s])
+                self.landCover['snowfallTemperature'].append(hydrology['snowfallTemperature'][l]
+                                                             + scHydrology['snowfallTemperature'][s])
+                self.landCover['snowfallMultiplier'].append(hydrology['snowfallMultiplier'][l]
+                                                            * scHydrology['snowfallMultiplier'][s])
+                self.landCover['rainfallMultiplier'].append(hydrology['rainfallMultiplier'][l]
+                                                            * scHydrology['rainfallMultiplier'][s])
+
+        self.subcatchment = {field: array('d', subcatchment['general'][field]) for field in self.SUBCATCHMENT_FIELDS}
+
+        # Reaches
+        self.reach = {field: array('d', reach['general'][field]) for field in self.REACH_FIELDS[:-1]}
+        self.reach['initialFlow'] = array('d', reach['hydrology']['initialFlow'])
+        self.manning = {field: array('d', reach['hydrology']['Manning'][field]) for field in self.MANNING_FIELDS}
+        self.outflows = list(reach['general']['outflow'])
+        self.hasAbstraction = list(reach['hydrology']['hasAbstraction'])
+        self.hasEffluent = list(reach['hydrology']['hasEffluent'])
+
+    def bucketOffset(self, landCoverIndex, bucketIndex):
+        """Offset of a bucket in the bucket arrays."""
+        return landCoverIndex * self.bucketCount + bucketIndex
+
+    def landCoverOffset(self, subcatchmentIndex, landCoverIndex):
+        """Offset of a land cover type of a subcatchment in the land cover arrays."""
+        return subcatchmentIndex * self.landCoverCount + landCoverIndex
+
+    def bucketSlice(self, field, landCoverIndices):
+        """
+        Values of a bucket field for some land cover types, all buckets of each in order.
+
+        Parameters:
+        field (str): One of BUCKET_FIELDS
+        landCoverIndices (iterable of int): Land cover types to include
+
+        Returns:
+        array: array('d') with bucketCount values per land cover type
+        """
+        values = self.bucket[field]
+        result = array('d')
+        for l in landCoverIndices:
+            first = l * self.bucketCount
+            result.extend(values[first:first + self.bucketCount])
+        return result
@@ -3,6 +3,25 @@ import sys
 from datetime import datetime, timedelta
 from timeSeries import TimeSeries
 
+def iter_dat_values(input_file):
+    """
+    Read a DAT file one line at a time.
+    
+    Parameters:
+    - input_file: Path to the input DAT file
+    
+    Yields:
+    - list: The float values of each data line, empty lines and comments are skipped
+    """
+    with open(input_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):  # Skip empty lines and comments
+                values = [float(val.strip()) for val in line.split()]
+                if values:
+                    yield values
+
+
 def convert_dat_to_timeseries(input_file, output_base_name, start_date_str, date_format, time_increment_str, column_names_str, location_id="default"):
     """
     Convert a DAT file to TimeSeries format and save it as CSV and JSON.
@@ -30,18 +49,8 @@ def convert_dat_to_timeseries(input_file, output_base_name, start_date_str, date
         else:
             column_names = []
         
-        # Read the input DAT file
-        with open(input_file, 'r') as f:
-            lines = f.readlines()
-        
-        # Clean and process the data
-        data_values = []
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('#'):  # Skip empty lines and comments
-                values = [float(val.strip()) for val in line.split()]
-                if values:
-                    data_values.append(values)
+        # Read and clean the input DAT file
+        data_values = list(iter_dat_values(input_file))
         
         # Create a TimeSeries object
         ts = TimeSeries(name=output_base_name)
@@ -61,20 +70,14 @@ def convert_dat_to_timeseries(input_file, output_base_name, start_date_str, date
         for col_name in column_names:
             ts.add_column(col_name)
         
-        # Add data to TimeSeries
-        current_time = start_date
-        for values in data_values:
-            # Create a dictionary of values with corresponding column names
-            values_dict = {}
-            for i, value in enumerate(values):
-                if i < len(column_names):
-                    values_dict[column_names[i]] = value
-            
-            # Add data point to TimeSeries
-            ts.add_data(current_time, location_id, values_dict)
-            
-            # Increment time for next data point
-            current_time += timedelta(seconds=time_increment)
+        # Add data to TimeSeries in one block, rows with fewer values than
+        # column names are padded with None
+        step = timedelta(seconds=time_increment)
+        timestamps = [start_date + i * step for i in range(len(data_values))]
+        columns = {}
+        for i, col_name in enumerate(column_names):
+            columns[col_name] = [values[i] if i < len(values) else None for values in data_values]
+        ts.add_rows(timestamps, location_id, columns)
         
         # Save the TimeSeries to CSV and JSON files
         csv_path, json_path = ts.save_to_files(output_base_name)
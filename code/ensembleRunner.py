@@ -0,0 +1,319 @@
+"""
+Ensemble / Monte Carlo Runner
+
+Runs many members of a model, each with its own perturbed copy of a base
+parameter set, and keeps only a few summary values per member, so an ensemble
+of thousands of members needs little more memory than a single run.
+
+The perturbation spec maps parameter names to distributions:
+
+    {"snowmeltRate": {"distribution": "uniform", "low": 1.0, "high": 3.0},
+     "characteristicTimeConstant": {"distribution": "lognormal", "mu": 0.0,
+                                    "sigma": 0.3, "relative": True}}
+
+A name matches every parameter with that key (characteristicTimeConstant is in
+every bucket) or, to pick one, a dotted path such as
+"landCover.bucket[1].hydrology.characteristicTimeConstant". One value is drawn
+per member and name. It replaces every value of the matched parameters, or with
+"relative": True multiplies them, which keeps the differences between land
+cover types. A name found in more than one section (snowmeltTemperature is in
+landCover.hydrology and subcatchment.hydrology, which the model adds together)
+must be relative or a dotted path, as the same absolute value in both would be
+counted twice. Distributions:
+- 'uniform': low, high
+- 'normal': mean, sd
+- 'lognormal': mu, sigma (of the underlying normal distribution)
+- 'choice': values
+Samples are drawn in the parent from a seeded random.Random, so an ensemble is
+reproducible whatever the number of workers. Every member's parameter set is
+validated (check_parameters) before any member runs, so a draw outside the
+valid range, e.g. a negative time constant from a normal distribution, stops
+the ensemble instead of running silently.
+
+Members run in worker processes. The driving data is cut into subcatchment
+slices once and copied into shared memory (sharedArrays), and each worker
+attaches zero copy views of it when it starts and receives the base parameters
+once; a member task only carries its sampled values. Each member is solved
+serially inside its worker.
+
+Summaries are (column, statistic) pairs, e.g. ("reachFlow", "mean"), computed
+for every subcatchment over the whole run. The column is one of the model
+outputs (see output_columns) and the statistic is one of STATISTICS or a module
+level function taking the output array and returning a value.
+"""
+
+import copy
+import math
+import os
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from catchment import Catchment
+from model import solveCatchment
+from parameterSet import ParameterSet
+from parameterSetValidation import check_parameters
+from sharedArrays import attach_slices, share_slices
+from subcatchmentSolver import driving_data_slices
+
+DISTRIBUTIONS = ("uniform", "normal", "lognormal", "choice")
+# Outputs of every subcatchment (solveCatchment), plus a snowDepth_<land cover> column per land cover type
+OUTPUT_COLUMNS = ("waterInput", "runoff", "lateralInflow", "reachFlow")
+STATISTICS = {
+    "mean": lambda values: sum(values) / len(values) if len(values) else math.nan,
+    "sum": sum,
+    "min": lambda values: min(values, default=math.nan),
+    "max": lambda values: max(values, default=math.nan),
+    "last": lambda values: values[-1] if len(values) else math.nan,
+}
+
+_PATH_PART = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+
+def _format_path(keys):
+    """Dotted path of a parameter, list indexes in brackets."""
+    path = ""
+    for key in keys:
+        path += f"[{key}]" if isinstance(key, int) else (f".{key}" if path else key)
+    return path
+
+
+def parameter_paths(parameters, name):
+    """
+    Find the parameters matching a name.
+
+    Parameters:
+    parameters (dict): The parameters of a ParameterSet
+    name (str): A parameter key, matching every parameter with that key, or a dotted path
+
+    Returns:
+    list: Key tuples of the matching parameters, in the order they appear
+
+    Raises:
+    ValueError: If nothing matches or a match is not numeric
+    """
+    if "." in name or "[" in name:
+        keys = tuple(int(index) if index else key for key, index in _PATH_PART.findall(name))
+        matches = [keys]
+    else:
+        matches = []
+
+        def walk(node, keys):
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if key == name:
+                        matches.append(keys + (key,))
+                    else:
+                        walk(value, keys + (key,))
+            elif isinstance(node, list) and node and all(isinstance(item, dict) for item in node):
+                for i, item in enumerate(node):
+                    walk(item, keys + (i,))
+        walk(parameters, ())
+
+    if not matches:
+        raise ValueError(f"No parameter named '{name}'")
+    for keys in matches:
+        try:
+            value = _get(parameters, keys)
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f"No parameter at '{name}'") from None
+        values = value if isinstance(value, list) else [value]
+        if not all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in values):
+            raise ValueError(f"Parameter '{_format_path(keys)}' is not numeric")
+    return matches
+
+
+def _sections(matches):
+    """Dotted paths of the sections holding the matched parameters, ignoring list indexes."""
+    sections = []
+    for keys in matches:
+        section = _format_path([key for key in keys[:-1] if not isinstance(key, int)])
+        if section not in sections:
+            sections.append(section)
+    return sections
+
+
+def _get(parameters, keys):
+    node = parameters
+    for key in keys:
+        node = node[key]
+    return node
+
+
+def _draw(rng, name, spec):
+    """Draw one value from a distribution spec."""
+    distribution = spec.get("distribution", "uniform")
+    if distribution == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if distribution == "normal":
+        return rng.gauss(spec["mean"], spec["sd"])
+    if distribution == "lognormal":
+        return rng.lognormvariate(spec["mu"], spec["sigma"])
+    if distribution == "choice":
+        return rng.choice(spec["values"])
+    raise ValueError(f"Unknown distribution '{distribution}' for '{name}'. "
+                     f"Valid options are: {', '.join(DISTRIBUTIONS)}")
+
+
+def sample_perturbations(perturbations, members, seed=None):
+    """
+    Draw the perturbed values of every member.
+
+    Parameters:
+    perturbations (dict): {parameter name: distribution spec}, see the module docstring
+    members (int): Number of members
+    seed (int, optional): Seed of the random number generator
+
+    Returns:
+    list: One {parameter name: value} dictionary per member
+    """
+    rng = random.Random(seed)
+    return [{name: _draw(rng, name, spec) for name, spec in perturbations.items()} for _ in range(members)]
+
+
+def perturb_parameters(parameters, perturbations, sample):
+    """
+    Apply one member's values to a copy of the parameters.
+
+    Parameters:
+    parameters (dict): Base parameters, not changed
+    perturbations (dict): {parameter name: distribution spec}, for the relative flags
+    sample (dict): {parameter name: value} of the member
+
+    Returns:
+    dict: The perturbed parameters
+    """
+    perturbed = copy.deepcopy(parameters)
+    for name, value in sample.items():
+        relative = perturbations[name].get("relative", False)
+        for keys in parameter_paths(perturbed, name):
+            parent = _get(perturbed, keys[:-1])
+            current = parent[keys[-1]]
+            if isinstance(current, list):
+                parent[keys[-1]] = [item * value if relative else value for item in current]
+            else:
+                parent[keys[-1]] = current * value if relative else value
+    return perturbed
+
+
+def output_columns(pars):
+    """
+    List the output columns of a run that can be summarised.
+
+    Parameters:
+    pars (ParameterSet): The parameter set of the run
+
+    Returns:
+    list: OUTPUT_COLUMNS followed by snowDepth_<land cover> for every land cover type
+    """
+    return list(OUTPUT_COLUMNS) + ["snowDepth_" + name for name in pars.compiled().landCoverNames]
+
+
+def summarise(outputs, names, summaries):
+    """
+    Reduce the outputs of a run to the selected summary values.
+
+    Parameters:
+    outputs (list): Output arrays of each subcatchment, as returned by solveCatchment
+    names (list): Subcatchment names
+    summaries (list): (column, statistic) pairs
+
+    Returns:
+    dict: {subcatchment name: {"column_statistic": value}}
+    """
+    result = {}
+    for name, output in zip(names, outputs):
+        values = {}
+        for column, statistic in summaries:
+            function = STATISTICS[statistic] if isinstance(statistic, str) else statistic
+            label = statistic if isinstance(statistic, str) else statistic.__name__
+            values[f"{column}_{label}"] = function(output[column])
+        result[name] = values
+    return result
+
+
+# Read-only data of a worker process, set once by _init_worker
+_shared = {}
+
+
+def _init_worker(parameters, perturbations, slices, summaries):
+    """Worker initializer, keeps the data shared by all members of the ensemble. slices is
+    either the driving data slices or the handle of the slices in shared memory"""
+    if not isinstance(slices, list):
+        slices = attach_slices(slices)
+    _shared.update(parameters=parameters, perturbations=perturbations, slices=slices, summaries=summaries)
+
+
+def _run_member(task):
+    """Worker entry point, runs one member and returns its summaries."""
+    member, sample = task
+    pars = ParameterSet.__new__(ParameterSet)
+    pars.fileName = None
+    pars.parameters = perturb_parameters(_shared["parameters"], _shared["perturbations"], sample)
+    pars.compile()
+    catchment = Catchment(pars)
+    outputs = solveCatchment(catchment, _shared["slices"], pars.parameters["general"]["timeStep"], serial=True)
+    names = [subcatchment.name for subcatchment in catchment.subcatchments]
+    return {"member": member, "parameters": sample, "summaries": summarise(outputs, names, _shared["summaries"])}
+
+
+def run_ensemble(pars, driving_data, perturbations, members, summaries, seed=None, workers=None,
+                 serial=False):
+    """
+    Run an ensemble of perturbed parameter sets.
+
+    Parameters:
+    pars (ParameterSet): Base parameter set
+    driving_data (TimeSeries): Driving data, see driving_data_slices
+    perturbations (dict): {parameter name: distribution spec}, see the module docstring
+    members (int): Number of members
+    summaries (list): (column, statistic) pairs to keep for every subcatchment
+    seed (int, optional): Seed of the random number generator
+    workers (int, optional): Number of worker processes, defaults to the number of CPUs
+    serial (bool): Run the members in the calling process instead
+
+    Returns:
+    list: One {"member": index, "parameters": {name: value}, "summaries": {...}}
+          dictionary per member, in member order
+
+    Raises:
+    ValueError: If a perturbed parameter, a summary column or statistic is unknown, an
+                absolute perturbation matches parameters in several sections or
+                the parameter set of a member is invalid
+    """
+    for name, spec in perturbations.items():
+        sections = _sections(parameter_paths(pars.parameters, name))
+        if len(sections) > 1 and not spec.get("relative", False):
+            raise ValueError(f"'{name}' matches parameters in {', '.join(sections)}. Use a dotted path "
+                             f"or \"relative\": True")
+        if spec.get("distribution", "uniform") not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution '{spec['distribution']}' for '{name}'. "
+                             f"Valid options are: {', '.join(DISTRIBUTIONS)}")
+    columns = output_columns(pars)
+    for column, statistic in summaries:
+        if column not in columns:
+            raise ValueError(f"Unknown output column '{column}'. Valid options are: {', '.join(columns)}")
+        if isinstance(statistic, str) and statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic '{statistic}'. Valid options are: {', '.join(STATISTICS)}")
+
+    names = pars.compiled().subcatchmentNames
+    _, slices = driving_data_slices(driving_data, names)
+    tasks = list(enumerate(sample_perturbations(perturbations, members, seed)))
+    for member, sample in tasks:
+        check_parameters(perturb_parameters(pars.parameters, perturbations, sample),
+                         f"parameter set of member {member} ({sample})")
+
+    if serial or workers == 1 or members < 2:
+        _init_worker(pars.parameters, perturbations, slices, list(summaries))
+        try:
+            return [_run_member(task) for task in tasks]
+        finally:
+            _shared.clear()
+
+    shared, handle = share_slices(slices)
+    initargs = (pars.parameters, perturbations, handle, list(summaries))
+    chunksize = max(1, members // (4 * (workers or os.cpu_count() or 1)))
+    # the shared memory is released whether the pool finishes or breaks
+    with shared, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        # map returns the results in member order
+        return list(executor.map(_run_member, tasks, chunksize=chunksize))
@@ -1,63 +1,82 @@
-from squareMatrix import SquareMatrix
+from array import array
+
 from bucket import Bucket
+from bucketState import BucketState
 from chemical import Chemical
 
 class LandCoverType:
-    """A first attempt at writing land cover type code suitable for use in INCA or PERSiST"""
+    """A first attempt at writing land cover type code suitable for use in INCA or PERSiST.
+    The buckets are views of a BucketState, normally shared by all land cover types of a subcatchment"""
+
+    def solve(self, precipitation, temperature):
+        """Run the snowpack over a driving data series, returns a dictionary of rainfall, snow melt,
+        snow depth and water input (rainfall plus snow melt) arrays with one value per time step"""
+        stepCount = len(precipitation)
+        outputs = {}
+        for name in ('rainfall', 'snowMelt', 'snowDepth', 'waterInput'):
+            outputs[name] = array('d', bytes(8 * stepCount))
 
-    def solve():
-        pass
+        for i, (P, T) in enumerate(zip(precipitation, temperature)):
+            self.updateSnowpack(P, T)
+            rainfall = self.rainfallMultiplier * P if T > self.snowfallTemperature else 0.0
+            outputs['rainfall'][i] = rainfall
+            outputs['snowMelt'][i] = self.snowmeltDepth
+            outputs['snowDepth'][i] = self.snowDepth
+            outputs['waterInput'][i] = rainfall + self.snowmeltDepth
+        return outputs
 
     def updateSnowpack(self, P, T):
+        self.snowmeltDepth=0.0
         if(T<=self.snowfallTemperature):
             self.snowDepth += self.snowfallMultiplier*P
         if(T>self.snowmeltTemperature):
             melt=min(self.snowmeltRate*(T-self.snowmeltTemperature), self.snowDepth)
             self.snowDepth -= melt
+            self.snowmeltDepth=melt
+
+    def totalWaterDepth(self):
+        """sum of the water depths of the buckets"""
+        return self.bucketState.totalWaterDepth(self.landCoverPosition)
 
-    def __init__(self,pars,subCatchmentIndex,landCoverIndex):
+    def __init__(self,pars,subCatchmentIndex,landCoverIndex,bucketState=None):
 
-        bucketCount=pars.parameters['landCover']['bucket'].__len__()
-        
-        externalTimeStep=pars.parameters['general']['timeStep']
-        daysPerStep=externalTimeStep/86400.0
+        #flat parameter arrays, already scaled to the model time step
+        compiled=pars.compiled()
+        bucketCount=compiled.bucketCount
+        offset=compiled.landCoverOffset(subCatchmentIndex,landCoverIndex)
+        landCover=compiled.landCover
 
-        self.name=pars.parameters['landCover']['general']['name'][landCoverIndex]
+        self.name=compiled.landCoverNames[landCoverIndex]
 
-        self.percentCover=pars.parameters['subcatchment']['general']['landCoverPercent'][subCatchmentIndex][landCoverIndex]
-        
-        self.flowRouting = SquareMatrix(bucketCount)
+        self.percentCover=landCover['percentCover'][offset]
 
-        #create the buckets
+        #create the buckets as views of the shared state, this land cover type's buckets are at bucketOffsets
+        if bucketState is None:
+            bucketState = BucketState.fromParameters(pars, [landCoverIndex])
+            self.landCoverPosition = 0
+        else:
+            self.landCoverPosition = landCoverIndex
+        self.bucketState = bucketState
+        self.bucketOffsets = bucketState.landCoverOffsets(self.landCoverPosition)
         self.buckets = []
         for i in range(bucketCount):
-            self.buckets.append(Bucket(pars,landCoverIndex,i))
+            self.buckets.append(Bucket(pars,landCoverIndex,i,bucketState,self.landCoverPosition))
 
-        #create the flow matrix (square matrix)
-        self.flowMatrix = []
-        for i in range(bucketCount):
-            self.flowMatrix.append(pars.parameters['landCover']['hydrology']['flowMatrix'][i])
+        #the flow matrix (square matrix), row i holds the fractions of the water draining from bucket i
+        #going to the other buckets, the diagonal the fraction going to the stream. Validated when compiled
+        self.flowMatrix = compiled.flowMatrices[landCoverIndex]
 
-        self.snowmeltRate = pars.parameters['landCover']['hydrology']['snowmeltRate'][landCoverIndex] / daysPerStep
+        self.snowmeltRate = landCover['snowmeltRate'][offset]
         self.snowmeltDepth=0.0
-        self.snowDepth=pars.parameters['landCover']['hydrology']['snowDepth'][landCoverIndex]
-
-        #snowmelt temperature is the sum of the landscape type and subcatchment snowmelt temperatures
-        self.snowmeltTemperature = pars.parameters['landCover']['hydrology']['snowmeltTemperature'][landCoverIndex]
-        self.snowmeltTemperature += pars.parameters['subcatchment']['hydrology']['snowmeltTemperature'][subCatchmentIndex]
-
-        #snowmelt temperature is the sum of the landscape type and subcatchment snowfall temperatures
-        self.snowfallTemperature = pars.parameters['landCover']['hydrology']['snowfallTemperature'][landCoverIndex] 
-        self.snowfallTemperature += pars.parameters['subcatchment']['hydrology']['snowfallTemperature'][subCatchmentIndex]
-  
-        #snowfall multiplier is the product of the landscape type and subcatchment snowfall multiplier
-        self.snowfallMultiplier = pars.parameters['landCover']['hydrology']['snowfallMultiplier'][landCoverIndex] 
-        self.snowfallMultiplier *= pars.parameters['subcatchment']['hydrology']['snowfallMultiplier'][subCatchmentIndex] 
-        
-        #rainfall multiplier is the product of the landscape type and subcatchment rainfall multiplier      
-        self.rainfallMultiplier=pars.parameters['landCover']['hydrology']['rainfallMultiplier'][landCoverIndex] 
-        self.rainfallMultiplier *= pars.parameters['subcatchment']['hydrology']['rainfallMultiplier'][subCatchmentIndex] 
-              
+        self.snowDepth=landCover['snowDepth'][offset]
+
+        #snowmelt and snowfall temperatures are the sum of the landscape type and subcatchment temperatures,
+        #rainfall and snowfall multipliers the product of the landscape type and subcatchment multipliers
+        self.snowmeltTemperature = landCover['snowmeltTemperature'][offset]
+        self.snowfallTemperature = landCover['snowfallTemperature'][offset]
+        self.snowfallMultiplier = landCover['snowfallMultiplier'][offset]
+        self.rainfallMultiplier = landCover['rainfallMultiplier'][offset]
+
         self.hasChemicals=False #flag variable to simplify decision making
         Chemical.addChemicals(self,pars)
 
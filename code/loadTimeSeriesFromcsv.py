@@ -1,6 +1,7 @@
 import csv
 import datetime
 import re
+from itertools import islice, zip_longest
 
 # Import the TimeSeries class
 # Assuming the TimeSeries class is defined in a file named 'time_series.py'
@@ -8,7 +9,7 @@ from timeSeries import TimeSeries
 
 def load_timeseries_from_csv(csv_filename, timestamp_format="%Y-%m-%d %H:%M:%S", 
                            timestamp_col=0, location_col=1, header=True, 
-                           metadata_rows=0):
+                           metadata_rows=0, timeseries_class=TimeSeries):
     """
     Load data from a CSV file into a TimeSeries object.
     If hours, minutes, and seconds are not specified in the timestamp,
@@ -22,12 +23,14 @@ def load_timeseries_from_csv(csv_filename, timestamp_format="%Y-%m-%d %H:%M:%S",
     header (bool): Whether the CSV file has a header row
     metadata_rows (int): Number of rows at the beginning of the file containing metadata
                          in the format "key,value"
+    timeseries_class (type): TimeSeries class to populate, e.g. ColumnarTimeSeries for
+                             large numeric files (default is TimeSeries)
     
     Returns:
     TimeSeries: A populated TimeSeries object
     """
     # Create an empty TimeSeries object
-    ts = TimeSeries()
+    ts = timeseries_class()
     
     # Open and read the CSV file
     with open(csv_filename, 'r', newline='') as csv_file:
@@ -126,6 +129,358 @@ def load_timeseries_from_csv(csv_filename, timestamp_format="%Y-%m-%d %H:%M:%S",
     return ts
 
 
+# Matches ISO 8601 dates with an optional time part, which datetime.fromisoformat parses directly
+ISO_TIMESTAMP_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$')
+
+# Date only formats tried when sniffing, in order of preference
+DATE_ONLY_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%m-%d-%Y", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d"]
+
+# Number of rows load_timeseries_from_csv_fast reads and converts together
+CSV_BATCH_ROWS = 10000
+
+
+def _build_timestamp_parser(samples, timestamp_format):
+    """
+    Choose a timestamp parser once from a sample of timestamp strings.
+    
+    ISO timestamps (with or without a time part) are handed to datetime.fromisoformat.
+    Otherwise the formats that parse the samples are tried in turn: timestamp_format
+    first, then its date part, then the common date only formats. Ambiguous day/month
+    orders are settled by the whole sample rather than row by row.
+    
+    Parameters:
+    samples (list): Stripped timestamp strings from the start of the file
+    timestamp_format (str): Format string for timestamps that include a time
+    
+    Returns:
+    tuple: (parse, swapped) where parse is a function converting a stripped timestamp
+           string to a datetime, raising ValueError for strings it cannot parse, and
+           swapped lists the chosen formats with day and month exchanged, for
+           _check_day_month_order
+    """
+    if samples and all(ISO_TIMESTAMP_PATTERN.match(sample) for sample in samples):
+        return datetime.datetime.fromisoformat, []
+    
+    def parses(fmt, sample):
+        try:
+            datetime.datetime.strptime(sample, fmt)
+            return True
+        except ValueError:
+            return False
+    
+    candidates = [timestamp_format, timestamp_format.split(' ')[0]] + DATE_ONLY_FORMATS
+    formats = []
+    unparsed = list(samples)
+    for fmt in candidates:
+        if fmt in formats:
+            continue
+        # A format is kept if it parses every sample it could apply to, so that a
+        # day first sample rules out month first formats for the whole file
+        matched = [sample for sample in unparsed if parses(fmt, sample)]
+        if matched and all(parses(fmt, sample) or not _same_shape(fmt, sample) for sample in unparsed):
+            formats.append(fmt)
+            unparsed = [sample for sample in unparsed if sample not in matched]
+    if not formats:
+        formats = [timestamp_format]
+    swapped = [_swap_day_month(fmt) for fmt in formats if '%d' in fmt and '%m' in fmt]
+    swapped = [fmt for fmt in swapped if fmt not in formats]
+    
+    strptime = datetime.datetime.strptime
+    if len(formats) == 1:
+        return _build_fixed_width_parser(formats[0]), swapped
+    
+    def parse(value):
+        for fmt in formats:
+            try:
+                return strptime(value, fmt)
+            except ValueError:
+                pass
+        raise ValueError(f"time data '{value}' does not match any detected format")
+    return parse, swapped
+
+
+def _swap_day_month(fmt):
+    """Exchange the %d and %m directives of a strptime format."""
+    return fmt.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+
+
+def _check_day_month_order(timestamp_strings, swapped):
+    """
+    Raise if a timestamp the detected formats rejected parses with day and month exchanged.
+    
+    The day/month order is settled from the sample rows, so a later row in the other
+    order (e.g. 25/03/2020 after samples that all read as month first) would otherwise
+    be skipped as an invalid timestamp.
+    
+    Parameters:
+    timestamp_strings (iterable): Stripped timestamp strings that failed to parse
+    swapped (list): Formats with day and month exchanged, from _build_timestamp_parser
+    
+    Raises:
+    ValueError: If one of the strings parses with a swapped format
+    """
+    for value in timestamp_strings:
+        for fmt in swapped:
+            try:
+                datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            raise ValueError(f"Ambiguous day/month order: timestamp '{value}' matches '{fmt}' but the first rows "
+                             f"were read as '{_swap_day_month(fmt)}'. Pass timestamp_format to choose the order")
+
+
+# datetime() argument and field width of zero padded strptime directives
+FIXED_WIDTH_FIELDS = {"%Y": ("year", 4), "%m": ("month", 2), "%d": ("day", 2),
+                      "%H": ("hour", 2), "%M": ("minute", 2), "%S": ("second", 2)}
+DATETIME_ARGUMENTS = ("year", "month", "day", "hour", "minute", "second")
+
+
+def _build_fixed_width_parser(fmt):
+    """
+    Build a parser that slices zero padded numeric fields at fixed offsets.
+    
+    Only formats made of %Y %m %d %H %M %S and literal separators qualify. Fields
+    missing from the format take the strptime defaults (January 1st, 00:00:00).
+    Strings of a different length (e.g. without zero padding) or with wrong
+    separators are handed to strptime, as are all strings for any other format.
+    
+    Parameters:
+    fmt (str): strptime format string
+    
+    Returns:
+    callable: Function converting a timestamp string to a datetime
+    """
+    strptime = datetime.datetime.strptime
+    fields = []
+    literals = []
+    position = 0
+    for token in re.findall(r'%.|[^%]', fmt):
+        if token in FIXED_WIDTH_FIELDS:
+            argument, width = FIXED_WIDTH_FIELDS[token]
+            fields.append((argument, position, position + width))
+            position += width
+        elif token.startswith('%'):
+            return lambda value: strptime(value, fmt)
+        else:
+            literals.append((position, token))
+            position += 1
+    
+    total_width = position
+    arguments = [argument for argument, _, _ in fields]
+    if len(set(arguments)) != len(arguments) or "year" not in arguments:
+        return lambda value: strptime(value, fmt)
+    
+    new_datetime = datetime.datetime
+    fields.sort(key=lambda field: DATETIME_ARGUMENTS.index(field[0]))
+    if [argument for argument, _, _ in fields] == list(DATETIME_ARGUMENTS[:len(fields)]):
+        # Fields run from the year down without gaps, so they fill the leading
+        # positional arguments and the rest keep datetime's own defaults
+        slices = [(start, end) for _, start, end in fields]
+        defaults = [1, 1][:max(0, 3 - len(slices))]
+        
+        def parse(value):
+            if len(value) != total_width or any(value[i] != char for i, char in literals):
+                return strptime(value, fmt)
+            return new_datetime(*[int(value[start:end]) for start, end in slices], *defaults)
+    else:
+        # A field is skipped (e.g. %Y-%m-%d %M), so pass every field by name
+        defaults = {argument: 1 for argument in ("month", "day") if argument not in arguments}
+        
+        def parse(value):
+            if len(value) != total_width or any(value[i] != char for i, char in literals):
+                return strptime(value, fmt)
+            return new_datetime(**defaults, **{argument: int(value[start:end]) for argument, start, end in fields})
+    
+    return parse
+
+
+def _same_shape(fmt, sample):
+    """Check whether a sample has the same separators as a strptime format."""
+    return re.sub(r'%.', '', fmt) == re.sub(r'\d', '', sample)
+
+
+def load_timeseries_from_csv_fast(csv_filename, timestamp_format="%Y-%m-%d %H:%M:%S", 
+                                  timestamp_col=0, location_col=1, header=True, 
+                                  metadata_rows=0, timeseries_class=TimeSeries,
+                                  sample_rows=100, logger=None):
+    """
+    Load data from a CSV file into a TimeSeries object, optimised for large files.
+    
+    Takes the same arguments as load_timeseries_from_csv but works column-wise:
+    the timestamp format is detected once from the first sample_rows rows, then the
+    file is read in batches of CSV_BATCH_ROWS rows whose numeric columns are
+    converted in bulk and added to the TimeSeries with one add_rows call per batch.
+    Timestamps without a time part default to 00:00:00. Data columns keep their
+    header names (or value1, value2, ... without a header).
+    Rows with too few fields or an unparseable timestamp are skipped and reported
+    once at the end, their count is stored in the "skipped_rows" metadata entry.
+    
+    Parameters:
+    csv_filename (str): Path to the CSV file
+    timestamp_format (str): Format string for non-ISO timestamps with a time part
+    timestamp_col (int): Index of the timestamp column (default is 0)
+    location_col (int): Index of the location column (default is 1)
+    header (bool): Whether the CSV file has a header row
+    metadata_rows (int): Number of rows at the beginning of the file containing metadata
+                         in the format "key,value"
+    timeseries_class (type): TimeSeries class to populate (default is TimeSeries)
+    sample_rows (int): Number of rows used to detect the timestamp format
+    logger (callable, optional): Function to log messages, nothing is logged without one
+    
+    Returns:
+    TimeSeries: A populated TimeSeries object
+    
+    Raises:
+    ValueError: If a timestamp after the sample rows is in the other day/month order
+    """
+    ts = timeseries_class()
+    short_count = 0
+    bad_count = 0
+    
+    with open(csv_filename, 'r', newline='') as csv_file:
+        # Read metadata if specified
+        for _ in range(metadata_rows):
+            line = csv_file.readline().strip()
+            if ',' in line:
+                key, value = line.split(',', 1)
+                ts.add_metadata(key.strip(), value.strip())
+        
+        csv_reader = csv.reader(csv_file)
+        
+        columns = []
+        if header:
+            try:
+                columns = next(csv_reader)
+            except StopIteration:
+                raise ValueError("CSV file is empty or contains only metadata")
+            if len(columns) <= max(timestamp_col, location_col):
+                raise ValueError("CSV header does not have enough columns for timestamp and location")
+        
+        if header:
+            ts.columns = ["timestamp", "location"]
+        
+        # Choose the timestamp parser once from the first rows
+        rows = list(islice(csv_reader, max(CSV_BATCH_ROWS, sample_rows)))
+        min_length = max(timestamp_col, location_col) + 1
+        samples = [row[timestamp_col].strip() for row in rows[:sample_rows] if len(row) >= min_length]
+        parse, swapped = _build_timestamp_parser(samples, timestamp_format)
+        width = len(columns)
+        data_columns = _name_data_columns(columns, width, timestamp_col, location_col)
+        
+        # Convert batch by batch so only one batch of raw rows is held at a time
+        while True:
+            batch_width = max((len(row) for row in rows), default=0)
+            if batch_width > width:
+                # Rows wider than any before add unnamed columns, earlier rows get None
+                width = batch_width
+                data_columns = _name_data_columns(columns, width, timestamp_col, location_col)
+            timestamps, locations, values_by_column, batch_short, batch_bad = _convert_csv_rows(
+                rows, parse, data_columns, timestamp_col, location_col, swapped)
+            ts.add_rows(timestamps, locations, values_by_column)
+            short_count += batch_short
+            bad_count += batch_bad
+            rows = list(islice(csv_reader, CSV_BATCH_ROWS))
+            if not rows:
+                break
+    
+    skipped = short_count + bad_count
+    ts.add_metadata("skipped_rows", skipped)
+    if skipped and logger:
+        logger(f"Skipped {skipped} rows: {short_count} with too few fields, "
+            f"{bad_count} with invalid timestamps")
+    
+    return ts
+
+
+def _name_data_columns(columns, width, timestamp_col, location_col):
+    """
+    Pair the index of every data column with its name.
+    
+    Parameters:
+    columns (list): Header row, empty when the file has no header
+    width (int): Number of fields in the widest row
+    timestamp_col (int): Index of the timestamp column
+    location_col (int): Index of the location column
+    
+    Returns:
+    list: (index, name) tuples, unnamed columns are called value1, value2, ...
+    """
+    data_indices = [i for i in range(max(width, len(columns))) if i != timestamp_col and i != location_col]
+    return [(i, columns[i] if i < len(columns) else f"value{position + 1}")
+            for position, i in enumerate(data_indices)]
+
+
+def _convert_csv_rows(rows, parse, data_columns, timestamp_col, location_col, swapped=()):
+    """
+    Convert raw CSV rows into the column blocks taken by TimeSeries.add_rows.
+    
+    Rows with too few fields or an unparseable timestamp are dropped. Data values
+    that are not numeric become None.
+    
+    Parameters:
+    rows (list): Rows as returned by csv.reader
+    parse (callable): Timestamp parser from _build_timestamp_parser
+    data_columns (list): (index, name) tuples from _name_data_columns
+    timestamp_col (int): Index of the timestamp column
+    location_col (int): Index of the location column
+    swapped (list, optional): Formats with day and month exchanged, from
+                              _build_timestamp_parser
+    
+    Returns:
+    tuple: (timestamps, locations, values_by_column, short_count, bad_count)
+    
+    Raises:
+    ValueError: If an unparseable timestamp is in the other day/month order
+    """
+    # Drop rows without a timestamp and location
+    min_length = max(timestamp_col, location_col) + 1
+    short_rows = [i for i, row in enumerate(rows) if len(row) < min_length]
+    if short_rows:
+        short_set = set(short_rows)
+        rows = [row for i, row in enumerate(rows) if i not in short_set]
+    
+    # Parse all timestamps with the parser chosen up front
+    timestamp_strings = list(map(str.strip, (row[timestamp_col] for row in rows)))
+    try:
+        timestamps = list(map(parse, timestamp_strings))
+        bad_timestamps = []
+    except ValueError:
+        timestamps = []
+        bad_timestamps = []
+        for i, timestamp_str in enumerate(timestamp_strings):
+            try:
+                timestamps.append(parse(timestamp_str))
+            except ValueError:
+                timestamps.append(None)
+                bad_timestamps.append(i)
+        _check_day_month_order((timestamp_strings[i] for i in bad_timestamps), swapped)
+        bad_set = set(bad_timestamps)
+        rows = [row for i, row in enumerate(rows) if i not in bad_set]
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    
+    # Transpose the rows into columns in one step, short rows are padded with ''
+    raw_columns = list(zip_longest(*rows, fillvalue=''))
+    
+    # Convert each data column in bulk, falling back to value by value conversion
+    # (non-numeric values become None) only for columns that need it
+    values_by_column = {}
+    for i, col_name in data_columns:
+        raw = raw_columns[i] if i < len(raw_columns) else [''] * len(rows)
+        try:
+            values = list(map(float, raw))
+        except ValueError:
+            values = []
+            for value in raw:
+                try:
+                    values.append(float(value))
+                except ValueError:
+                    values.append(None)
+        values_by_column[col_name] = values
+    
+    locations = list(raw_columns[location_col]) if rows else []
+    return timestamps, locations, values_by_column, len(short_rows), len(bad_timestamps)
+
+
 def save_timeseries_to_csv(ts, csv_filename, timestamp_format="%Y-%m-%d %H:%M:%S", 
                          include_metadata=True):
     """
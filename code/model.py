@@ -1,29 +1,113 @@
-from concurrent.futures import ProcessPoolExecutor
+from array import array
+from bisect import bisect_right
 
 from catchment import Catchment
 from timeSeries import TimeSeries
+from columnarTimeSeries import ColumnarTimeSeries, from_epoch_seconds
 from parameterSet import ParameterSet
 from chemical import Chemical
+from subcatchmentSolver import driving_data_slices, solve_subcatchments
+from reachNetwork import solve_reach_network
+from checkpoint import load_checkpoint, save_checkpoint
+
+def solveCatchment(catchment, slices, timeStep, workers=None, serial=False, useThreads=False, sharedMemory=True):
+    """Solve the subcatchments of a catchment over their driving data slices (see driving_data_slices), then
+    route their runoff through the reach network. The catchment's subcatchments and reaches are replaced by
+    the solved objects holding the final state. sharedMemory hands the driving data to the worker processes in
+    shared memory rather than pickling it into every task. Returns the output arrays of each subcatchment"""
+    outputs, catchment.subcatchments = solve_subcatchments(
+        catchment.subcatchments, slices, workers=workers, serial=serial, shared_memory=sharedMemory)
+
+    #the runoff of each subcatchment drains into the reach with the same index, mm per step over km2 to m3/s
+    lateralInflows = []
+    for subcatchment, output in zip(catchment.subcatchments, outputs):
+        scale = subcatchment.area * 1000.0 / timeStep
+        output['lateralInflow'] = array('d', [value * scale for value in output['runoff']])
+        lateralInflows.append(output['lateralInflow'])
+
+    reachFlows, catchment.reaches = solve_reach_network(
+        catchment.reaches, lateralInflows, timeStep, catchment.reachNetwork,
+        workers=workers, serial=serial, use_threads=useThreads)
+    for output, reachFlow in zip(outputs, reachFlows):
+        output['reachFlow'] = reachFlow
+    return outputs
 
 class Model:
     """A first attempt at writing the code to run an INCA/PERSiST model"""
 
-    def run(self):
-        """Code stub to run a model"""
-         #there has to be a more elegant way to do this!
-        subcatchmentIDs = []
-        for k in range(self.catchment.subcatchments.__len__()):
-            subcatchmentIDs.append(k)
-        
-        with ProcessPoolExecutor() as executor:
-            executor.map(self.catchment.solveSubcatchments,subcatchmentIDs)
+    def run(self, workers=None, serial=False, useThreads=False, sharedMemory=True,
+            checkpointEvery=None, checkpointFile=None, restartFrom=None):
+        """Solve all subcatchments over the driving data, then route their runoff through the reach
+        network from upstream to downstream, in worker processes unless serial is True. workers sets
+        the number of processes (default is one per CPU), useThreads routes the reaches in threads
+        instead and sharedMemory=False pickles the driving data into every task instead of sharing it with the
+        workers through shared memory. The outputs are stored in self.results, a dictionary of ColumnarTimeSeries keyed by
+        subcatchment name, in subcatchment order.
+        With checkpointEvery and checkpointFile the run is solved in blocks of checkpointEvery time steps and the
+        state is saved to checkpointFile after each block (see checkpoint.py), a '{time}' in the file name is
+        replaced by the time of the checkpoint to keep every checkpoint rather than the latest. restartFrom is a
+        checkpoint file to start from: its state is restored and driving data up to its time is skipped.
+        Every run starts from a catchment freshly built from the parameter set, so running twice gives the same
+        results; self.catchment holds the final state of the last run"""
+        if checkpointEvery is not None and checkpointFile is None:
+            raise ValueError("checkpointEvery needs a checkpointFile")
+        #solveCatchment replaces the subcatchments and reaches by the solved ones, start from the initial state
+        self.catchment = Catchment(self.parameterSet)
+        names = [subcatchment.name for subcatchment in self.catchment.subcatchments]
+        times, slices = driving_data_slices(self.drivingData, names)
+
+        first = 0
+        if restartFrom is not None:
+            restart = load_checkpoint(restartFrom)
+            restart.restore(self.catchment)
+            first = bisect_right(times, restart.time)
+        blockSize = checkpointEvery if checkpointEvery else max(len(times) - first, 1)
+
+        timeStep = self.parameterSet.parameters['general']['timeStep']
+        outputs = None
+        for start in range(first, len(times), blockSize):
+            end = min(start + blockSize, len(times))
+            if start == 0 and end == len(times):
+                blockSlices = slices
+            else:
+                #slices shared by several subcatchments stay shared
+                blocks = {}
+                blockSlices = []
+                for data in slices:
+                    if id(data) not in blocks:
+                        blocks[id(data)] = {column: values[start:end] for column, values in data.items()}
+                    blockSlices.append(blocks[id(data)])
+            blockOutputs = solveCatchment(self.catchment, blockSlices, timeStep, workers=workers, serial=serial,
+                                          useThreads=useThreads, sharedMemory=sharedMemory)
+            if outputs is None:
+                outputs = blockOutputs
+            else:
+                for output, blockOutput in zip(outputs, blockOutputs):
+                    for column, values in blockOutput.items():
+                        output[column].extend(values)
+            if checkpointEvery:
+                time = times[end - 1]
+                save_checkpoint(checkpointFile.replace('{time}', from_epoch_seconds(time).strftime('%Y%m%dT%H%M%S')),
+                                self.catchment, time, {'parameterSet': self.parameterSet.parameters['general']['name']})
+
+        times = times[first:]
+        if outputs is None:
+            outputs = [{} for _ in names]
+        self.results = {}
+        for name, output in zip(names, outputs):
+            self.results[name] = ColumnarTimeSeries.from_arrays(
+                times[:], array('i', [0]) * len(times), [name], output, name=name)
+        return self.results
 
-    def __init__(self,jsonFile):
-        self.parameterSet=ParameterSet(jsonFile)
+    def __init__(self,jsonFile,drivingData=None):
+        #checked and compiled, or read from the snapshot of an earlier load of the same file
+        self.parameterSet=ParameterSet.load(jsonFile)
         self.parameterSet.printPars()
         
         self.catchment = Catchment(self.parameterSet)
-        self.drivingData=TimeSeries()
+        #driving data with 'precipitation' and 'air_temperature' columns, one location per subcatchment
+        self.drivingData=drivingData if drivingData is not None else TimeSeries()
+        self.results = {}
 
         self.hasChemicals=False #flag variable to simplify decision making
         Chemical.addChemicals(self,self.parameterSet) #not the most elegant but it reuses code
\ No newline at end of file
@@ -13,18 +13,43 @@ import argparse
 from collections import defaultdict
 from timeSeries import TimeSeries
 
+# Regular expressions for matching headers
+LOCATION_PATTERN = re.compile(r'^\*+\s*(.*?)\s*\*+')
+PARAMETER_PATTERN = re.compile(r'^-+\s*(.*?)\s*-+')
 
-def parse_obs_file(file_path, logger=None):
+
+def list_obs_parameters(file_path):
     """
-    Parse an OBS file and extract location, parameter, and data information.
+    List the parameters of an OBS file by reading only its header lines.
     
     Args:
         file_path (str): Path to the OBS file
-        logger (callable, optional): Function to log messages
     
     Returns:
-        dict: Dictionary where keys are parameters and values are lists of 
-              (location, date_time, value) tuples
+        list: Parameter names in order of first appearance
+    """
+    parameters = {}
+    with open(file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if LOCATION_PATTERN.match(line):
+                continue
+            parameter_match = PARAMETER_PATTERN.match(line)
+            if parameter_match:
+                parameters.setdefault(parameter_match.group(1))
+    return list(parameters)
+
+
+def iter_obs_records(file_path, logger=None):
+    """
+    Read an OBS file one observation at a time.
+    
+    Args:
+        file_path (str): Path to the OBS file
+        logger (callable, optional): Function to log messages
+    
+    Yields:
+        tuple: (location, parameter, date_time, value) for every data line
     """
     def log(message):
         if logger:
@@ -32,16 +57,9 @@ def parse_obs_file(file_path, logger=None):
         else:
             print(message)
     
-    parameter_data = defaultdict(list)
     current_location = None
     current_parameter = None
     
-    # Regular expressions for matching headers
-    location_pattern = re.compile(r'^\*+\s*(.*?)\s*\*+')
-    parameter_pattern = re.compile(r'^-+\s*(.*?)\s*-+')
-    
-    log(f"Reading file: {file_path}")
-    
     with open(file_path, 'r') as f:
         for line in f:
             line = line.strip()
@@ -50,14 +68,14 @@ def parse_obs_file(file_path, logger=None):
                 continue
                 
             # Check if this is a location header
-            location_match = location_pattern.match(line)
+            location_match = LOCATION_PATTERN.match(line)
             if location_match:
                 current_location = location_match.group(1)
                 log(f"Found location: {current_location}")
                 continue
                 
             # Check if this is a parameter header
-            parameter_match = parameter_pattern.match(line)
+            parameter_match = PARAMETER_PATTERN.match(line)
             if parameter_match:
                 current_parameter = parameter_match.group(1)
                 log(f"Found parameter: {current_parameter}")
@@ -108,8 +126,34 @@ def parse_obs_file(file_path, logger=None):
                         log(f"Warning: Non-numeric value '{value_str}' for parameter '{current_parameter}' - using as string")
                         value = value_str
                     
-                    # Store the data with parsed datetime object
-                    parameter_data[current_parameter].append((current_location, date_obj, value))
+                    yield current_location, current_parameter, date_obj, value
+
+
+def parse_obs_file(file_path, logger=None):
+    """
+    Parse an OBS file and extract location, parameter, and data information.
+    
+    Args:
+        file_path (str): Path to the OBS file
+        logger (callable, optional): Function to log messages
+    
+    Returns:
+        dict: Dictionary where keys are parameters and values are lists of 
+              (location, date_time, value) tuples
+    """
+    def log(message):
+        if logger:
+            logger(message)
+        else:
+            print(message)
+    
+    parameter_data = defaultdict(list)
+    
+    log(f"Reading file: {file_path}")
+    
+    for location, parameter, date_obj, value in iter_obs_records(file_path, logger):
+        # Store the data with parsed datetime object
+        parameter_data[parameter].append((location, date_obj, value))
     
     log(f"File parsing complete. Found {len(parameter_data)} parameters.")
     
@@ -161,9 +205,12 @@ def create_timeseries_objects(parameter_data, base_name, logger=None):
         # First, add the parameter as a column
         ts.add_column(safe_param_name)
         
-        # Add data points
-        for location, timestamp, value in data_points:
-            ts.add_data(timestamp, location, {safe_param_name: value})
+        # Add data points in one block
+        ts.add_rows(
+            [timestamp for _, timestamp, _ in data_points],
+            [location for location, _, _ in data_points],
+            {safe_param_name: [value for _, _, value in data_points]}
+        )
         
         log(f"Created TimeSeries '{ts_name}' with {len(data_points)} data points")
         timeseries_dict[parameter] = ts
@@ -308,8 +355,11 @@ def get_merged_timeseries(input_file, parameter=None, logger=None):
     # Add data points
     for param, data_points in parameter_data.items():
         safe_param_name = re.sub(r'[^a-zA-Z0-9_-]', '_', param)
-        for location, timestamp, value in data_points:
-            merged_ts.add_data(timestamp, location, {safe_param_name: value})
+        merged_ts.add_rows(
+            [timestamp for _, timestamp, _ in data_points],
+            [location for location, _, _ in data_points],
+            {safe_param_name: [value for _, _, value in data_points]}
+        )
     
     # Count total data points
     total_points = sum(len(data) for data in parameter_data.values())
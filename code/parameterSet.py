@@ -1,5 +1,30 @@
-from json import load,dump
+from json import load,loads,dump
+from hashlib import sha256
+import os
+import pickle
 from parameter import *
+import compiledParameterSet
+import parameterSetValidation
+from compiledParameterSet import CompiledParameterSet
+from parameterSetValidation import check_parameters
+
+#bump when the layout of the snapshot changes, older snapshots are then ignored
+SNAPSHOT_VERSION = 2
+
+#hash of the checking and compiling code, set on first use
+_sourceHash = None
+
+def sourceHash():
+    """hash of the source of parameterSetValidation and compiledParameterSet. It is part of the snapshot key,
+    so a snapshot is never reused after the checks or the compiled layout have changed"""
+    global _sourceHash
+    if _sourceHash is None:
+        digest = sha256()
+        for module in (parameterSetValidation, compiledParameterSet):
+            with open(module.__file__, 'rb') as sourceFile:
+                digest.update(sourceFile.read())
+        _sourceHash = digest.hexdigest()
+    return _sourceHash
 
 class ParameterSet:
     """Class to store a parameter set, currently the initializer reads from a JSON file 
@@ -8,6 +33,71 @@ class ParameterSet:
     def printPars(self): #troubleshooting routine to print contents of self.parameters
         print(self.parameters)
 
+    def compiled(self):
+        """the parameters flattened into typed arrays (see CompiledParameterSet), compiled on first use.
+        Call compile() again after changing self.parameters"""
+        if self.compiledParameters is None:
+            self.compile()
+        return self.compiledParameters
+
+    def compile(self):
+        """flatten self.parameters into typed arrays, used by the model objects when they are built"""
+        self.compiledParameters = CompiledParameterSet(self)
+        return self.compiledParameters
+
+    @classmethod
+    def load(cls, fileName, useCache=True):
+        """load a parameter set for a model run: the JSON is checked (parameterSetValidation) and compiled,
+        then a snapshot of the result is saved next to it as fileName + '.cache', keyed by a hash of the file
+        contents and of the checking and compiling code (sourceHash). Later loads of an unchanged file with
+        unchanged code read the snapshot and skip parsing, checking and compiling.
+        The snapshot is a pickle, only use it for files from a trusted directory"""
+        with open(fileName, 'rb') as parFile:
+            content = parFile.read()
+        key = sha256(content + sourceHash().encode()).hexdigest()
+        cacheFile = fileName + '.cache'
+
+        if useCache:
+            pars = cls.__new__(cls)
+            if pars.loadSnapshot(cacheFile, key):
+                pars.fileName = fileName
+                return pars
+
+        pars = cls.__new__(cls)
+        pars.fileName = fileName
+        pars.parameters = loads(content)
+        check_parameters(pars.parameters, fileName)
+        pars.compile()
+        if useCache:
+            pars.saveSnapshot(cacheFile, key)
+        return pars
+
+    def loadSnapshot(self, cacheFile, key):
+        """read a snapshot saved by saveSnapshot, returns False if it is missing, stale or unreadable"""
+        try:
+            with open(cacheFile, 'rb') as snapshotFile:
+                snapshot = pickle.load(snapshotFile)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, ValueError):
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('key') != key:
+            return False
+        self.parameters = snapshot['parameters']
+        self.compiledParameters = snapshot['compiled']
+        return True
+
+    def saveSnapshot(self, cacheFile, key):
+        """save the validated parameters and their compiled form, written to a temporary file first so that
+        a concurrent load never sees half a snapshot. A directory that cannot be written just means no cache"""
+        snapshot = {'version': SNAPSHOT_VERSION, 'key': key, 'parameters': self.parameters, 'compiled': self.compiled()}
+        temporaryFile = f"{cacheFile}.{os.getpid()}.tmp"
+        try:
+            with open(temporaryFile, 'wb') as snapshotFile:
+                pickle.dump(snapshot, snapshotFile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporaryFile, cacheFile)
+        except OSError:
+            if os.path.exists(temporaryFile):
+                os.remove(temporaryFile)
+
     def saveToJSON(self,jsonfile):
         with open(jsonfile, "w") as outfile:
             dump(self.parameters,outfile)
@@ -15,4 +105,5 @@ class ParameterSet:
     def __init__(self,fileName):
         with open(fileName,'r') as parFile:
             self.parameters = load(parFile)
-    
\ No newline at end of file
+        self.fileName = fileName
+        self.compiledParameters = None
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Parameter Set Validation
+
+Checks the structure of a parameter set before the model objects are built, so
+a malformed file fails with a list of what is wrong instead of a KeyError or
+IndexError deep inside Bucket or LandCoverType construction. The checks follow
+the layout the model reads (SimpleParSet.json): names in the general section of
+each part, and one value per land cover type, subcatchment or reach in every
+list. schemas/parameterSet.json is an example file rather than a JSON Schema and
+keeps the names in identifier sections, which the editors still use, so it is
+not used here. The fields checked are the ones CompiledParameterSet reads, and
+values the model divides by (time constants, relative areas, subcatchment areas,
+reach lengths and the Manning a and c coefficients) must be positive.
+
+Problems are reported as dotted paths, e.g.
+"landCover.bucket[2].hydrology.characteristicTimeConstant: expected 5 values, got 4".
+"""
+
+from numbers import Number
+
+from compiledParameterSet import CompiledParameterSet
+
+LAND_COVER_HYDROLOGY_FIELDS = ('rainfallMultiplier', 'snowfallMultiplier', 'snowfallTemperature',
+                               'snowmeltTemperature', 'snowmeltRate', 'snowDepth')
+SUBCATCHMENT_HYDROLOGY_FIELDS = ('rainfallMultiplier', 'snowfallMultiplier', 'snowfallTemperature',
+                                 'snowmeltTemperature')
+# Fields that must be greater than zero, the model divides by them
+POSITIVE_FIELDS = {
+    'bucket': ('characteristicTimeConstant', 'relativeAreaIndex'),
+    'subcatchment': ('area',),
+    'reach': ('length',),
+    'Manning': ('a', 'c'),
+}
+
+
+def _is_number(value):
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def _is_positive(value):
+    return _is_number(value) and value > 0
+
+
+def _kind(part, field):
+    """The check and its description for the values of a field."""
+    if field in POSITIVE_FIELDS[part]:
+        return _is_positive, "positive numbers"
+    return _is_number, "numbers"
+
+
+class _Checker:
+    """Collects problems while walking a parameter set."""
+
+    def __init__(self):
+        self.errors = []
+
+    def section(self, parent, key, path):
+        """Return parent[key] if it is a dictionary, otherwise record a problem and return None."""
+        if not isinstance(parent, dict) or not isinstance(parent.get(key), dict):
+            self.errors.append(f"{path}: missing section")
+            return None
+        return parent[key]
+
+    def names(self, section, path):
+        """Return the name list of a section, None if it is missing."""
+        if section is None:
+            return None
+        names = section.get('name')
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            self.errors.append(f"{path}.name: expected a list of names")
+            return None
+        if len(set(names)) != len(names):
+            self.errors.append(f"{path}.name: names are not unique")
+        return names
+
+    def values(self, section, key, path, count, kind=_is_number, description="numbers"):
+        """Check a list of count values, returning it or None. Lengths are not checked when count is None."""
+        if section is None:
+            return None
+        values = section.get(key)
+        if not isinstance(values, list):
+            expected = description if count is None else f"{count} {description}"
+            self.errors.append(f"{path}.{key}: expected a list of {expected}")
+            return None
+        if count is not None and len(values) != count:
+            self.errors.append(f"{path}.{key}: expected {count} values, got {len(values)}")
+            return None
+        if not all(kind(value) for value in values):
+            self.errors.append(f"{path}.{key}: expected {description}")
+            return None
+        return values
+
+    def value(self, section, key, path, kind=_is_number, description="a number"):
+        if section is not None and not kind(section.get(key)):
+            self.errors.append(f"{path}.{key}: expected {description}")
+
+
+def validate_parameters(parameters, tolerance=1.0e-6):
+    """
+    Check the structure of a parameter set.
+
+    Parameters:
+    parameters (dict): The parameters, as loaded from JSON
+    tolerance (float): Allowed deviation of a flow matrix row sum from one
+
+    Returns:
+    list: Descriptions of the problems found, empty for a valid parameter set
+    """
+    check = _Checker()
+    general = check.section(parameters, 'general', 'general')
+    check.value(general, 'timeStep', 'general', lambda v: _is_number(v) and v > 0, "a positive number")
+
+    bucketNames = check.names(check.section(check.section(parameters, 'bucket', 'bucket'), 'general',
+                                            'bucket.general'), 'bucket.general')
+
+    # Land cover types and their buckets
+    landCover = check.section(parameters, 'landCover', 'landCover')
+    landCoverNames = check.names(check.section(landCover, 'general', 'landCover.general'), 'landCover.general')
+    landCoverCount = len(landCoverNames) if landCoverNames is not None else None
+    hydrology = check.section(landCover, 'hydrology', 'landCover.hydrology')
+    for field in LAND_COVER_HYDROLOGY_FIELDS:
+        check.values(hydrology, field, 'landCover.hydrology', landCoverCount)
+
+    buckets = landCover.get('bucket') if landCover is not None else None
+    if not isinstance(buckets, list) or not buckets:
+        check.errors.append("landCover.bucket: expected a list of buckets")
+        buckets = []
+    if buckets and bucketNames is not None and len(buckets) != len(bucketNames):
+        check.errors.append(f"landCover.bucket: {len(buckets)} buckets but {len(bucketNames)} names "
+                            f"in bucket.general.name")
+    for b, bucket in enumerate(buckets):
+        path = f"landCover.bucket[{b}]"
+        bucketGeneral = check.section(bucket, 'general', f"{path}.general")
+        check.value(bucketGeneral, 'surficial', f"{path}.general", lambda v: isinstance(v, bool), "true or false")
+        check.value(bucketGeneral, 'initialSoilTemperature', f"{path}.general")
+        for field in CompiledParameterSet.BUCKET_GENERAL_FIELDS:
+            check.values(bucketGeneral, field, f"{path}.general", landCoverCount, *_kind('bucket', field))
+        bucketHydrology = check.section(bucket, 'hydrology', f"{path}.hydrology")
+        for field in CompiledParameterSet.BUCKET_HYDROLOGY_FIELDS:
+            check.values(bucketHydrology, field, f"{path}.hydrology", landCoverCount, *_kind('bucket', field))
+    if buckets and not any(isinstance(bucket, dict) and isinstance(bucket.get('general'), dict)
+                           and bucket['general'].get('surficial') is True for bucket in buckets):
+        check.errors.append("landCover.bucket: at least one bucket must be surficial")
+
+    matrices = check.values(hydrology, 'flowMatrix', 'landCover.hydrology', landCoverCount,
+                            lambda v: isinstance(v, list), "matrices")
+    for l, matrix in enumerate(matrices or []):
+        path = f"landCover.hydrology.flowMatrix[{l}]"
+        if len(matrix) != len(buckets) or not all(isinstance(row, list) and len(row) == len(buckets)
+                                                  for row in matrix):
+            check.errors.append(f"{path}: expected a {len(buckets)} x {len(buckets)} matrix")
+            continue
+        for i, row in enumerate(matrix):
+            if not all(_is_number(value) and value >= 0 for value in row):
+                check.errors.append(f"{path}[{i}]: expected non negative fractions")
+            elif abs(sum(row) - 1.0) > tolerance:
+                check.errors.append(f"{path}[{i}]: fractions sum to {sum(row)}, not 1")
+
+    # Subcatchments
+    subcatchment = check.section(parameters, 'subcatchment', 'subcatchment')
+    scGeneral = check.section(subcatchment, 'general', 'subcatchment.general')
+    subcatchmentNames = check.names(scGeneral, 'subcatchment.general')
+    subcatchmentCount = len(subcatchmentNames) if subcatchmentNames is not None else None
+    for field in CompiledParameterSet.SUBCATCHMENT_FIELDS:
+        check.values(scGeneral, field, 'subcatchment.general', subcatchmentCount, *_kind('subcatchment', field))
+    percent = check.values(scGeneral, 'landCoverPercent', 'subcatchment.general', subcatchmentCount,
+                           lambda v: isinstance(v, list), "lists")
+    for s, values in enumerate(percent or []):
+        if (landCoverCount is not None and len(values) != landCoverCount) or not all(_is_number(value) and value >= 0 for value in values):
+            check.errors.append(f"subcatchment.general.landCoverPercent[{s}]: expected {landCoverCount} "
+                                f"non negative numbers")
+    scHydrology = check.section(subcatchment, 'hydrology', 'subcatchment.hydrology')
+    for field in SUBCATCHMENT_HYDROLOGY_FIELDS:
+        check.values(scHydrology, field, 'subcatchment.hydrology', subcatchmentCount)
+
+    # Reaches, one per subcatchment
+    reach = check.section(parameters, 'reach', 'reach')
+    reachGeneral = check.section(reach, 'general', 'reach.general')
+    reachNames = check.names(reachGeneral, 'reach.general')
+    reachCount = len(reachNames) if reachNames is not None else None
+    if reachCount is not None and subcatchmentCount is not None and reachCount != subcatchmentCount:
+        check.errors.append(f"reach.general.name: {reachCount} reaches for {subcatchmentCount} subcatchments")
+    reachNames = reachNames or []
+    for field in CompiledParameterSet.REACH_FIELDS[:-1]:
+        check.values(reachGeneral, field, 'reach.general', reachCount, *_kind('reach', field))
+    check.values(reachGeneral, 'outflow', 'reach.general', reachCount,
+                 lambda v: v is None or v in reachNames or (isinstance(v, int) and not isinstance(v, bool)
+                                                            and 0 <= v < len(reachNames)),
+                 "reach indexes, names or null")
+    reachHydrology = check.section(reach, 'hydrology', 'reach.hydrology')
+    check.values(reachHydrology, 'initialFlow', 'reach.hydrology', reachCount,
+                 lambda v: _is_number(v) and v >= 0, "non negative numbers")
+    for field in ('hasAbstraction', 'hasEffluent'):
+        check.values(reachHydrology, field, 'reach.hydrology', reachCount, lambda v: isinstance(v, bool),
+                     "true or false")
+    manning = check.section(reachHydrology, 'Manning', 'reach.hydrology.Manning')
+    for field in CompiledParameterSet.MANNING_FIELDS:
+        check.values(manning, field, 'reach.hydrology.Manning', reachCount, *_kind('Manning', field))
+
+    return check.errors
+
+
+def check_parameters(parameters, source="parameter set"):
+    """
+    Check the structure of a parameter set, raising if there are problems.
+
+    Parameters:
+    parameters (dict): The parameters, as loaded from JSON
+    source (str): Name of the parameter set used in the error message, e.g. the file name
+
+    Raises:
+    ValueError: Listing every problem found
+    """
+    errors = validate_parameters(parameters)
+    if errors:
+        raise ValueError(f"Invalid {source}:\n  " + "\n  ".join(errors))
@@ -1,36 +1,62 @@
 #from parameter import Parameter, ScaledParameter
+from array import array
+
 from chemical import Chemical
 
+#lowest flow (m3/s) used to work out the velocity, avoids dividing by zero in a dry reach
+MINIMUM_FLOW = 1.0e-6
+
 class Reach:
     """First try at implementing the in-stream component of a subcatchment"""
 
+    def residenceTime(self, flow):
+        """time (s) for water to pass through the reach at a given flow, velocity = Q / (width * depth)
+        with width = a Q^b and depth = c Q^f"""
+        flow = max(flow, MINIMUM_FLOW)
+        velocity = flow ** (1.0 - self.Manning["b"] - self.Manning["f"]) / (self.Manning["a"] * self.Manning["c"])
+        return self.length / velocity
+
+    def solve(self, lateralInflow, upstreamOutflows, timeStep):
+        """route the lateral inflow and the outflows of the upstream reaches (m3/s, one value per time step)
+        through the reach, treated as a single store emptying over its residence time. Returns the outflow
+        at the end of each time step"""
+        outflow = array('d', bytes(8 * len(lateralInflow)))
+        volume = self.volume
+        for i, inflow in enumerate(lateralInflow):
+            for upstream in upstreamOutflows:
+                inflow += upstream[i]
+            residenceTime = self.residenceTime(self.Flow)
+            #implicit step, stable for any time step
+            volume = (volume + inflow * timeStep) / (1.0 + timeStep / residenceTime)
+            self.Flow = volume / residenceTime
+            outflow[i] = self.Flow
+        self.volume = volume
+        return outflow
+
     def __init__(self,pars,reachIndex):
-        self.name=pars.parameters["reach"]["general"]["name"][reachIndex]
+        #flat parameter arrays
+        compiled=pars.compiled()
+        self.name=compiled.reachNames[reachIndex]
         self.description="A stream reach"
 
-        self.length=pars.parameters["reach"]["general"]["length"][reachIndex]
-        self.widthAtBottom=pars.parameters["reach"]["general"]["widthAtBottom"][reachIndex]
-        self.slope=pars.parameters["reach"]["general"]["slope"][reachIndex]
+        self.length=compiled.reach["length"][reachIndex]
+        self.widthAtBottom=compiled.reach["widthAtBottom"][reachIndex]
+        self.slope=compiled.reach["slope"][reachIndex]
 
-        self.outflow = pars.parameters["reach"]["general"]["outflow"][reachIndex]
+        self.outflow = compiled.outflows[reachIndex]
 
-        self.inflows = []   #fix later
+        self.inflows = []   #indexes of the upstream reaches, set by Catchment from the reach network
 
         self.hasChemicals=False #flag variable to simplify decision making
         Chemical.addChemicals(self,pars)
 
-        self.Manning = {
-            "a" : pars.parameters["reach"]["hydrology"]["Manning"]["a"][reachIndex], 
-            "b" : pars.parameters["reach"]["hydrology"]["Manning"]["b"][reachIndex], 
-            "c" : pars.parameters["reach"]["hydrology"]["Manning"]["c"][reachIndex], 
-            "f" : pars.parameters["reach"]["hydrology"]["Manning"]["f"][reachIndex], 
-            "n" : pars.parameters["reach"]["hydrology"]["Manning"]["n"][reachIndex] 
-        }
+        self.Manning = {field: compiled.manning[field][reachIndex] for field in compiled.MANNING_FIELDS}
 
         #set flow to initial conditions
-        self.Flow=pars.parameters["reach"]["hydrology"]["initialFlow"][reachIndex]
+        self.Flow=compiled.reach["initialFlow"][reachIndex]
+        self.volume=self.Flow * self.residenceTime(self.Flow)
         
-        self.hasAbstraction=pars.parameters["reach"]["hydrology"]["hasAbstraction"][reachIndex]
-        self.hasEffluent=pars.parameters["reach"]["hydrology"]["hasEffluent"][reachIndex]
+        self.hasAbstraction=compiled.hasAbstraction[reachIndex]
+        self.hasEffluent=compiled.hasEffluent[reachIndex]
 
 
@@ -0,0 +1,164 @@
+"""
+Reach Network Scheduler
+
+The reaches of a catchment form a tree draining to one or more outlets: the
+outflow parameter of each reach names the reach it flows into (by index or by
+name, null for an outlet). ReachNetwork turns these into a directed acyclic
+graph with the upstream reaches of every reach, a topological order (every
+reach after all of its upstream reaches) and levels (0 for headwaters, one more
+than the highest upstream reach otherwise).
+
+solve_reach_network routes flow from upstream to downstream. A reach is handed
+to a worker as soon as all of its upstream reaches are done, together with
+their outflow series, so independent branches are solved at the same time
+without waiting for the rest of their level.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+
+class ReachNetwork:
+    """
+    Connectivity of the reaches of a catchment.
+
+    Attributes:
+    outflows (list): Index of the downstream reach of each reach, None for outlets
+    inflows (list): Indexes of the upstream reaches of each reach
+    order (list): Reach indexes in topological order, upstream first
+    levels (list): Level of each reach, 0 for headwater reaches
+    """
+
+    def __init__(self, outflows, names=None):
+        """
+        Build the network from the outflow of every reach.
+
+        Parameters:
+        outflows (list): Downstream reach of each reach as an index or a name, None for outlets
+        names (list, optional): Reach names, needed when outflows are given by name
+
+        Raises:
+        ValueError: If an outflow is not a reach or the reaches form a loop
+        """
+        count = len(outflows)
+        lookup = {name: i for i, name in enumerate(names)} if names is not None else {}
+        self.names = list(names) if names is not None else [str(i) for i in range(count)]
+        self.outflows = []
+        for i, outflow in enumerate(outflows):
+            if outflow is not None and not isinstance(outflow, int):
+                if outflow not in lookup:
+                    raise ValueError(f"Outflow '{outflow}' of reach '{self.names[i]}' is not a reach")
+                outflow = lookup[outflow]
+            if outflow is not None and not 0 <= outflow < count:
+                raise ValueError(f"Outflow {outflow} of reach '{self.names[i]}' is not a reach")
+            if outflow == i:
+                raise ValueError(f"Reach '{self.names[i]}' flows into itself")
+            self.outflows.append(outflow)
+
+        self.inflows = [[] for _ in range(count)]
+        for i, outflow in enumerate(self.outflows):
+            if outflow is not None:
+                self.inflows[outflow].append(i)
+
+        # Kahn's algorithm, headwaters first
+        remaining = [len(upstream) for upstream in self.inflows]
+        self.order = [i for i in range(count) if remaining[i] == 0]
+        self.levels = [0] * count
+        for i in self.order:
+            outflow = self.outflows[i]
+            if outflow is not None:
+                self.levels[outflow] = max(self.levels[outflow], self.levels[i] + 1)
+                remaining[outflow] -= 1
+                if remaining[outflow] == 0:
+                    self.order.append(outflow)
+        if len(self.order) != count:
+            looped = [self.names[i] for i in range(count) if remaining[i] > 0]
+            raise ValueError(f"The reach network has a loop through: {', '.join(looped)}")
+
+    @classmethod
+    def from_reaches(cls, reaches):
+        """
+        Build the network from Reach objects.
+
+        Parameters:
+        reaches (list): Reach objects with name and outflow attributes
+
+        Returns:
+        ReachNetwork: The network
+        """
+        return cls([reach.outflow for reach in reaches], [reach.name for reach in reaches])
+
+    @property
+    def outlets(self):
+        """Indexes of the reaches that do not flow into another reach."""
+        return [i for i, outflow in enumerate(self.outflows) if outflow is None]
+
+    def level_groups(self):
+        """
+        Group the reaches by level.
+
+        Returns:
+        list: One list of reach indexes per level, headwaters first. The reaches
+              of a level do not depend on each other
+        """
+        groups = [[] for _ in range(max(self.levels, default=-1) + 1)]
+        for i in self.order:
+            groups[self.levels[i]].append(i)
+        return groups
+
+
+def _solve_reach(task):
+    """Worker entry point, routes flow through one reach and returns its outflow and final state."""
+    reach, lateral_inflow, upstream_outflows, time_step = task
+    outflow = reach.solve(lateral_inflow, upstream_outflows, time_step)
+    return outflow, reach
+
+
+def solve_reach_network(reaches, lateral_inflows, time_step, network=None, workers=None,
+                        serial=False, use_threads=False):
+    """
+    Route flow through the reach network from upstream to downstream.
+
+    Parameters:
+    reaches (list): Reach objects
+    lateral_inflows (list): Lateral inflow series of each reach (m³/s per time step)
+    time_step (float): Time step in seconds
+    network (ReachNetwork, optional): Connectivity, built from the reaches if not given
+    workers (int, optional): Number of workers, defaults to the number of CPUs
+    serial (bool): Solve the reaches one after another in the calling process
+    use_threads (bool): Use threads instead of worker processes
+
+    Returns:
+    tuple: (outflows, reaches) where outflows holds the outflow series of each
+           reach and reaches the Reach objects carrying the state at the end of the run
+    """
+    if network is None:
+        network = ReachNetwork.from_reaches(reaches)
+    if len(lateral_inflows) != len(reaches):
+        raise ValueError(f"Expected {len(reaches)} lateral inflow series, got {len(lateral_inflows)}")
+    reaches = list(reaches)
+    outflows = [None] * len(reaches)
+
+    def task(i):
+        return reaches[i], lateral_inflows[i], [outflows[j] for j in network.inflows[i]], time_step
+
+    if serial or workers == 1 or len(reaches) < 2:
+        for i in network.order:
+            outflows[i], reaches[i] = _solve_reach(task(i))
+        return outflows, reaches
+
+    executor_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    remaining = [len(upstream) for upstream in network.inflows]
+    with executor_class(max_workers=workers) as executor:
+        pending = {executor.submit(_solve_reach, task(i)): i for i in network.order if remaining[i] == 0}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                outflows[i], reaches[i] = future.result()
+                # Pass the outflow on as soon as the downstream reach has all its inputs
+                downstream = network.outflows[i]
+                if downstream is not None:
+                    remaining[downstream] -= 1
+                    if remaining[downstream] == 0:
+                        pending[executor.submit(_solve_reach, task(downstream))] = downstream
+    return outflows, reaches
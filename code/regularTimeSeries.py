@@ -0,0 +1,606 @@
+"""
+Regular Interval TimeSeries
+
+Most driving data and all model outputs are strictly regular: DAT and block files
+have a fixed increment and the model writes one row per general.timeStep. Storing
+a timestamp per row is redundant for such series. RegularTimeSeries keeps only
+the start time, the step and the number of steps, and derives timestamps on
+demand, so finding the row of a timestamp is a division rather than a search and
+two series on the same grid line up by index.
+
+Storage layout:
+1. The time axis is (start, step_seconds, step_count), timestamps are never stored
+2. Locations are dictionary encoded as in ColumnarTimeSeries
+3. Every data column is an array('d') of step_count * location_count values laid
+   out time major: the value of step k at location code c is at offset
+   k * location_count + c. Missing values are NaN
+
+Every (step, location) cell exists, so adding rows fills cells of the grid rather
+than appending: writing to a cell that already holds a value replaces it, and
+cells that are never written stay missing. Timestamps that are not a whole number
+of steps from the start are rejected.
+
+Conversion from the irregular representation keeps every value, but it is not a
+round trip: to_timeseries() returns every cell of the grid, including the cells
+no row was written to, and to_timeseries(skip_missing_rows=True) leaves those out
+together with any original row whose data values were all missing. Rows given
+more than once for the same cell keep the last values.
+
+Appending time steps at the end extends the value buffers in place, and
+array('d') over-allocates when it grows, so a series built one step at a time
+takes amortised constant time per step. Adding a location or moving the start
+backwards re-lays out every buffer.
+"""
+
+import datetime
+from array import array
+
+from timeSeries import TimeSeries
+from columnarTimeSeries import ColumnarTimeSeries, MISSING, to_epoch_seconds, from_epoch_seconds
+
+
+def to_step_seconds(step):
+    """
+    Convert a time step given in seconds or as a timedelta to whole seconds.
+
+    Parameters:
+    step (int, float or timedelta): The time step
+
+    Returns:
+    int: The step in seconds
+
+    Raises:
+    ValueError: If the step is not a positive whole number of seconds
+    """
+    if isinstance(step, datetime.timedelta):
+        step = step.total_seconds()
+    if step <= 0 or step != int(step):
+        raise ValueError(f"step must be a positive whole number of seconds, got {step!r}")
+    return int(step)
+
+
+def infer_step_seconds(epoch_seconds):
+    """
+    Infer the step of a regular series from its timestamps.
+
+    Parameters:
+    epoch_seconds (iterable of int): Timestamps as seconds since the epoch, in any order
+
+    Returns:
+    int: The smallest positive difference between two timestamps
+
+    Raises:
+    ValueError: If there are fewer than two distinct timestamps
+    """
+    distinct = sorted(set(epoch_seconds))
+    if len(distinct) < 2:
+        raise ValueError("At least two distinct timestamps are needed to infer the step, pass step explicitly")
+    return min(later - earlier for earlier, later in zip(distinct, distinct[1:]))
+
+
+class RegularTimeSeries(ColumnarTimeSeries):
+    """
+    A ColumnarTimeSeries on a regular time axis with implicit timestamps.
+
+    The row based API of TimeSeries keeps working. Rows are ordered by time step,
+    then by location code, and every (time step, location) combination is a row.
+    index_of and row_offset find a timestamp in constant time.
+    """
+
+    def __init__(self, name=None, start=None, step=None):
+        """
+        Initialize an empty RegularTimeSeries object.
+
+        Parameters:
+        name (str, optional): Name of the TimeSeries object
+        start (datetime, optional): Timestamp of the first step, defaults to the
+                                    earliest timestamp added. Timestamps before the
+                                    start extend the axis backwards
+        step (int or timedelta, optional): Time step in seconds (e.g. general.timeStep),
+                                           inferred once two distinct timestamps have
+                                           been added if omitted
+        """
+        self._start = None if start is None else to_epoch_seconds(start)
+        self.step_seconds = None if step is None else to_step_seconds(step)
+        super().__init__(name)
+
+    def _clear_buffers(self):
+        """Reset the time axis, location and value buffers to empty, keeping start and step."""
+        self.step_count = 0
+        self._location_names = []
+        self._location_lookup = {}
+        self._values = {}
+
+    @property
+    def start(self):
+        """Timestamp of the first time step, None until the start is known."""
+        return None if self._start is None else from_epoch_seconds(self._start)
+
+    @property
+    def step(self):
+        """The time step as a timedelta, None until the step is known."""
+        return None if self.step_seconds is None else datetime.timedelta(seconds=self.step_seconds)
+
+    @property
+    def _grid_step(self):
+        """The step used for offsets. Until it is inferred the axis has one step and any step addresses it."""
+        return self.step_seconds or 1
+
+    @property
+    def end(self):
+        """Timestamp of the last time step, None for an empty time axis."""
+        if self.step_count == 0:
+            return None
+        return self.timestamp_at(self.step_count - 1)
+
+    def timestamp_at(self, index):
+        """
+        Get the timestamp of a time step.
+
+        Parameters:
+        index (int): Time step index, negative values count from the end
+
+        Returns:
+        datetime: The timestamp
+        """
+        if index < 0:
+            index += self.step_count
+        if not 0 <= index < self.step_count:
+            raise IndexError(f"Time step {index} out of range for {self.step_count} steps")
+        return from_epoch_seconds(self._start + index * self._grid_step)
+
+    def index_of(self, timestamp):
+        """
+        Get the time step index of a timestamp in constant time.
+
+        Parameters:
+        timestamp (datetime): A timestamp on the time axis
+
+        Returns:
+        int: The time step index
+
+        Raises:
+        ValueError: If the timestamp is not one of the time steps
+        """
+        if self.step_count == 0:
+            raise ValueError(f"{timestamp} is not on the time axis, the series is empty")
+        index, remainder = divmod(to_epoch_seconds(timestamp) - self._start, self._grid_step)
+        if remainder or not 0 <= index < self.step_count:
+            raise ValueError(f"{timestamp} is not on the time axis of {self.step_count} steps of "
+                             f"{self.step_seconds} s from {self.start}")
+        return index
+
+    def row_offset(self, timestamp, location):
+        """
+        Get the row offset of a (timestamp, location) cell in constant time.
+
+        Parameters:
+        timestamp (datetime): A timestamp on the time axis
+        location: The location identifier
+
+        Returns:
+        int: Offset into the value buffers
+
+        Raises:
+        ValueError: If the timestamp or the location is not in the series
+        """
+        code = self._location_lookup.get(location)
+        if code is None:
+            raise ValueError(f"Location '{location}' not found")
+        return self.index_of(timestamp) * len(self._location_names) + code
+
+    def _relayout(self, start, step_count, old_location_count):
+        """
+        Move the values into buffers for a new start, step count or number of locations.
+
+        start may only move backwards and step_count may only grow, so every
+        existing cell has a place in the new layout.
+        """
+        location_count = len(self._location_names)
+        shift = 0 if self._start is None else (self._start - start) // self._grid_step
+        old_step_count = self.step_count
+        for col_name, buffer in self._values.items():
+            if old_step_count == 0 or old_location_count == 0:
+                new_buffer = array('d', [MISSING]) * (step_count * location_count)
+            elif location_count == old_location_count and shift == 0:
+                # Steps appended at the end, extend in place so appends are amortised O(1)
+                buffer.extend(array('d', [MISSING]) * ((step_count - old_step_count) * location_count))
+                continue
+            elif location_count == old_location_count:
+                # Only the time axis changed, pad before and after
+                new_buffer = array('d', [MISSING]) * (shift * location_count)
+                new_buffer.extend(buffer)
+                new_buffer.extend(array('d', [MISSING]) * ((step_count - shift - old_step_count) * location_count))
+            else:
+                new_buffer = array('d', [MISSING]) * (step_count * location_count)
+                for code in range(old_location_count):
+                    first = shift * location_count + code
+                    new_buffer[first:first + old_step_count * location_count:location_count] = \
+                        buffer[code::old_location_count]
+            self._values[col_name] = new_buffer
+        self._start = start
+        self.step_count = step_count
+
+    def _place(self, epoch_seconds, locations):
+        """
+        Return the row offset of each (timestamp, location), growing the grid to cover them.
+
+        All timestamps are checked before anything changes, so a timestamp off the
+        grid leaves the series as it was.
+        """
+        if not epoch_seconds:
+            return array('q')
+        reference = self._start if self._start is not None else epoch_seconds[0]
+        step = self.step_seconds
+        if step is None and any(seconds != reference for seconds in epoch_seconds):
+            step = infer_step_seconds(list(epoch_seconds) + [reference])
+        if step is None:
+            # Only one distinct timestamp so far, the step is inferred once a second arrives
+            step = 1
+        else:
+            for seconds in epoch_seconds:
+                if (seconds - reference) % step:
+                    raise ValueError(f"Timestamp {from_epoch_seconds(seconds)} is not a whole number of "
+                                     f"{step} s steps from {from_epoch_seconds(reference)}")
+            self.step_seconds = step
+
+        first = min(epoch_seconds)
+        start = first if self._start is None else min(self._start, first)
+        step_count = (max(epoch_seconds) - start) // step + 1
+        if self._start is not None:
+            step_count = max(step_count, (self._start - start) // step + self.step_count)
+
+        old_location_count = len(self._location_names)
+        encode = self._encode_location
+        codes = [encode(location) for location in locations]
+        if (start != self._start or step_count != self.step_count
+                or len(self._location_names) != old_location_count):
+            self._relayout(start, step_count, old_location_count)
+
+        location_count = len(self._location_names)
+        return array('q', [(seconds - start) // step * location_count + code
+                           for seconds, code in zip(epoch_seconds, codes)])
+
+    def _write_block(self, epoch_seconds, locations, converted):
+        """Write converted column values into the cells of the given timestamps and locations."""
+        offsets = self._place(epoch_seconds, locations)
+        for col_name in converted.keys():
+            if col_name not in self.columns:
+                self.add_column(col_name)
+        for col_name, values in converted.items():
+            buffer = self._buffer(col_name)
+            for offset, value in zip(offsets, values):
+                buffer[offset] = value
+
+    def _buffer(self, column_name):
+        """
+        Return the value buffer for a data column.
+
+        A NaN filled buffer is created when the column has been added to
+        self.columns directly rather than through add_column.
+        """
+        buffer = self._values.get(column_name)
+        if buffer is None:
+            buffer = array('d', [MISSING]) * self.row_count()
+            self._values[column_name] = buffer
+        return buffer
+
+    @ColumnarTimeSeries.data.setter
+    def data(self, rows):
+        """Replace the stored data with a list of rows in the TimeSeries layout."""
+        self._clear_buffers()
+        self.invalidate_indexes()
+        columns = getattr(self, "columns", None)
+        if columns is None:
+            return
+        rows = list(rows)
+        if not rows:
+            return
+        values = {col_name: [row[i] if i < len(row) else None for row in rows]
+                  for i, col_name in enumerate(columns[2:], start=2)}
+        self.add_rows([row[0] for row in rows], [row[1] for row in rows], values)
+
+    def _iter_rows(self, offsets=None):
+        """
+        Build data rows from the column buffers.
+
+        Parameters:
+        offsets (iterable of int, optional): Row offsets to build, defaults to all rows
+        """
+        names = self._location_names
+        location_count = len(names)
+        buffers = [self._buffer(col) for col in self.columns[2:]]
+        if offsets is None:
+            offsets = range(self.row_count())
+        last_index = None
+        timestamp = None
+        for i in offsets:
+            index, code = divmod(i, location_count)
+            if index != last_index:
+                timestamp = from_epoch_seconds(self._start + index * self._grid_step)
+                last_index = index
+            row = [timestamp, names[code]]
+            for buffer in buffers:
+                value = buffer[i]
+                row.append(None if value != value else value)
+            yield row
+
+    def row_count(self):
+        """
+        Get the number of data rows, one per time step and location.
+
+        Returns:
+        int: The number of rows
+        """
+        return self.step_count * len(self._location_names)
+
+    def add_data(self, timestamp, location, values):
+        """
+        Set the values of one (timestamp, location) cell.
+
+        Parameters:
+        timestamp (datetime): A timestamp on (or extending) the time axis
+        location (str): The location identifier
+        values (list or dict): The numeric values to add
+        """
+        if not isinstance(timestamp, datetime.datetime):
+            raise TypeError("timestamp must be a datetime object")
+
+        if isinstance(values, list):
+            # Add new columns if needed, list values fill the data columns in order
+            for i in range(len(values)):
+                col_name = f"value{i+1}"
+                if col_name not in self.columns:
+                    self.add_column(col_name)
+            values = dict(zip(self.columns[2:], values))
+        elif not isinstance(values, dict):
+            raise TypeError("values must be a list or dictionary")
+
+        self.add_rows([timestamp], [location], {col_name: [value] for col_name, value in values.items()})
+
+    def add_rows(self, timestamps, locations, columns):
+        """
+        Set the values of a block of (timestamp, location) cells in one call.
+
+        The time axis is extended to cover the timestamps and new locations are
+        added to every time step. Cells given more than once keep the last value,
+        columns not in the mapping keep their current values.
+
+        Parameters:
+        timestamps (sequence of datetime): The timestamp of each row
+        locations: A single location identifier used for every row, or a
+                   sequence with one location identifier per row
+        columns (dict): Column name -> sequence of numeric values, one per row
+
+        Raises:
+        ValueError: If a timestamp is not a whole number of steps from the start
+        """
+        row_count, locations = self._validate_block(timestamps, locations, columns)
+        converted = {col_name: self._to_float_array(values) for col_name, values in columns.items()}
+        self._write_block([to_epoch_seconds(timestamp) for timestamp in timestamps], list(locations), converted)
+
+    def _key_getters(self):
+        """Return two callables mapping a row offset to its timestamp key and its location key."""
+        start = self._start
+        step = self._grid_step
+        location_count = len(self._location_names) or 1
+        return (lambda i: start + i // location_count * step), (lambda i: i % location_count)
+
+    def _iter_keys(self):
+        """Iterate over the (timestamp, location) key of every row."""
+        names = self._location_names
+        for index in range(self.step_count):
+            timestamp = from_epoch_seconds(self._start + index * self._grid_step)
+            for location in names:
+                yield timestamp, location
+
+    def _step_range(self, start_time, end_time):
+        """Return the range of time step indexes between two timestamps, inclusive."""
+        if self.step_count == 0:
+            return range(0)
+        step = self._grid_step
+        first = max(0, -(-(to_epoch_seconds(start_time) - self._start) // step))
+        last = min(self.step_count - 1, (to_epoch_seconds(end_time) - self._start) // step)
+        return range(first, max(first, last + 1))
+
+    def get_data_by_location(self, location):
+        """
+        Filter data by location.
+
+        Parameters:
+        location: The location identifier to filter by
+
+        Returns:
+        list: Data rows for the specified location, in timestamp order
+        """
+        return self._rows_at(self.get_sorted_offsets(location))
+
+    def get_data_by_timerange(self, start_time, end_time):
+        """
+        Filter data by time range, the rows are found without a search.
+
+        Parameters:
+        start_time (datetime): The start time of the range
+        end_time (datetime): The end time of the range
+
+        Returns:
+        list: Filtered data rows for the specified time range, in timestamp order
+        """
+        steps = self._step_range(start_time, end_time)
+        location_count = len(self._location_names)
+        return self._rows_at(range(steps.start * location_count, steps.stop * location_count))
+
+    def get_sorted_offsets(self, location=None):
+        """
+        Get row offsets in timestamp order, rows are stored in that order already.
+
+        Parameters:
+        location (optional): Only return offsets of rows for this location
+
+        Returns:
+        range: Row offsets into the value buffers
+        """
+        if location is None:
+            return range(self.row_count())
+        code = self._location_lookup.get(location)
+        if code is None:
+            return range(0)
+        return range(code, self.row_count(), len(self._location_names))
+
+    def get_timestamp_array(self):
+        """
+        Get the timestamp of every row.
+
+        Returns:
+        array: A new array('q') of seconds since the epoch
+        """
+        location_count = len(self._location_names)
+        times = array('q')
+        for index in range(self.step_count):
+            times.extend(array('q', [self._start + index * self._grid_step]) * location_count)
+        return times
+
+    def get_location_codes(self):
+        """
+        Get the dictionary encoded locations.
+
+        Returns:
+        tuple: (codes, locations) where codes is a new array('i') of per row codes
+               and locations is the list mapping a code to its location identifier
+        """
+        return array('i', range(len(self._location_names))) * self.step_count, self._location_names
+
+    def to_dict(self):
+        """
+        Convert the data to a dictionary format.
+
+        Returns:
+        dict: A dictionary where keys are column names and values are lists of column values
+        """
+        keys = list(self._iter_keys())
+        result = {
+            self.columns[0]: [key[0] for key in keys],
+            self.columns[1]: [key[1] for key in keys],
+        }
+        for col_name in self.columns[2:]:
+            result[col_name] = [None if v != v else v for v in self._buffer(col_name)]
+        return result
+
+    @classmethod
+    def from_arrays(cls, times, location_codes, locations, values, name=None, step=None):
+        """
+        Create a RegularTimeSeries from column buffers in the ColumnarTimeSeries layout.
+
+        Unlike ColumnarTimeSeries.from_arrays the values are copied onto the grid.
+
+        Parameters:
+        times (array): array('q') of seconds since the epoch, one per row
+        location_codes (array): array('i') of location codes, one per row
+        locations (list): Location identifier for each location code
+        values (dict): Column name -> array('d') with one value per row, NaN for missing
+        name (str, optional): Name of the TimeSeries object
+        step (int or timedelta, optional): Time step, inferred from times if omitted
+
+        Returns:
+        RegularTimeSeries: The new time series
+        """
+        row_count = len(times)
+        if len(location_codes) != row_count:
+            raise ValueError(f"Expected {row_count} location codes, got {len(location_codes)}")
+        for col_name, buffer in values.items():
+            if len(buffer) != row_count:
+                raise ValueError(f"Expected {row_count} values for column '{col_name}', got {len(buffer)}")
+
+        result = cls(name, step=step)
+        # Register the locations in their code order before placing any rows
+        for location in locations:
+            result._encode_location(location)
+        result._write_block(list(times), [locations[code] for code in location_codes], values)
+        return result
+
+    @classmethod
+    def from_timeseries(cls, ts, step=None, start=None):
+        """
+        Create a RegularTimeSeries holding the same data as a row based or columnar TimeSeries.
+
+        The name, UUID, column names and metadata are carried over unchanged.
+
+        Parameters:
+        ts (TimeSeries): The TimeSeries to convert
+        step (int or timedelta, optional): Time step, inferred from the timestamps if omitted
+        start (datetime, optional): First time step, defaults to the earliest timestamp
+
+        Returns:
+        RegularTimeSeries: The converted time series
+
+        Raises:
+        ValueError: If the timestamps do not lie on a regular grid
+        """
+        result = cls(ts.name, start=start, step=step)
+        result.uuid = ts.uuid
+        result.columns = list(ts.columns)
+        result.metadata = dict(ts.metadata)
+
+        keys = list(ts._iter_keys())
+        converted = {col_name: cls._to_float_array(ts._column_values(col_name)) for col_name in ts.columns[2:]}
+        result._write_block([to_epoch_seconds(key[0]) for key in keys], [key[1] for key in keys], converted)
+        return result
+
+    def to_timeseries(self, skip_missing_rows=False):
+        """
+        Convert to a row based TimeSeries.
+
+        The name, UUID, column names and metadata are carried over unchanged.
+
+        Parameters:
+        skip_missing_rows (bool): Leave out rows where every data value is missing,
+                                  i.e. cells of the grid that were never written
+
+        Returns:
+        TimeSeries: The converted time series
+        """
+        result = TimeSeries(self.name)
+        result.uuid = self.uuid
+        result.columns = list(self.columns)
+        result.metadata = dict(self.metadata)
+        rows = self._iter_rows()
+        if skip_missing_rows and len(self.columns) > 2:
+            rows = (row for row in rows if any(value is not None for value in row[2:]))
+        result.data = list(rows)
+        return result
+
+    def to_columnar(self, skip_missing_rows=False):
+        """
+        Convert to a ColumnarTimeSeries with explicit timestamps.
+
+        Parameters:
+        skip_missing_rows (bool): Leave out rows where every data value is missing
+
+        Returns:
+        ColumnarTimeSeries: The converted time series
+        """
+        times = self.get_timestamp_array()
+        codes, names = self.get_location_codes()
+        buffers = {col_name: array('d', self._buffer(col_name)) for col_name in self.columns[2:]}
+        if skip_missing_rows and buffers:
+            kept = [i for i in range(len(times))
+                    if any(buffer[i] == buffer[i] for buffer in buffers.values())]
+            times = array('q', [times[i] for i in kept])
+            codes = array('i', [codes[i] for i in kept])
+            buffers = {col_name: array('d', [buffer[i] for i in kept]) for col_name, buffer in buffers.items()}
+        result = ColumnarTimeSeries.from_arrays(times, codes, names, buffers, name=self.name)
+        result.uuid = self.uuid
+        result.columns[0] = self.columns[0]
+        result.metadata = dict(self.metadata)
+        return result
+
+
+# Example usage:
+if __name__ == "__main__":
+    ts = RegularTimeSeries("regular_example", step=3600)
+    start = datetime.datetime(2020, 1, 1)
+    ts.add_rows([start + datetime.timedelta(hours=h) for h in range(48)], "reach_1",
+                {"flow": [h * 0.5 for h in range(48)]})
+    print(ts)
+    print("Step of 2020-01-02 06:00:", ts.index_of(datetime.datetime(2020, 1, 2, 6)))
+    print(ts.get_data_by_timerange(datetime.datetime(2020, 1, 1, 22), datetime.datetime(2020, 1, 2, 1)))
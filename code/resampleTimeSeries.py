@@ -0,0 +1,325 @@
+"""
+TimeSeries Resampling
+
+Brings a TimeSeries onto a regular time step, e.g. hourly observations onto the
+model's general.timeStep of 86400 s, or daily data onto an hourly step.
+
+Each location is handled in a single pass over its rows in timestamp order. Rows
+are assigned to bins [t, t + step) aligned to an origin (by default midnight
+1970-01-01, so daily bins start at midnight) and every data column is aggregated
+within the bin:
+- 'sum', 'mean', 'min', 'max': over the non-missing values of the bin
+- 'last': the last non-missing value of the bin
+A bin whose values are all missing gives a missing value.
+
+Bins between two bins holding rows are empty when the new step is shorter than
+the spacing of the data. They are filled according to fill:
+- None: left missing
+- 'ffill': the value of the previous bin holding rows
+- 'linear': interpolated in time between the neighbouring bins holding rows
+Bins that hold rows but only missing values are gaps, not empty bins, and are
+left for fill_gaps to deal with.
+
+When upsampling, the output of a location runs on to the end of the period of its
+last row, i.e. its last timestamp plus the step of the input minus one new step,
+so three daily values become 72 hourly rows. Those final bins are filled like
+empty bins, with 'linear' holding the last value as there is nothing to
+interpolate towards. The step of the input is that of a RegularTimeSeries, the
+"time_step" metadata entry or else the smallest spacing of the location's rows.
+
+Each output timestamp is the start of its bin.
+"""
+
+import datetime
+from array import array
+
+from timeSeries import TimeSeries
+from columnarTimeSeries import ColumnarTimeSeries, MISSING, to_epoch_seconds, from_epoch_seconds
+from regularTimeSeries import RegularTimeSeries, infer_step_seconds, to_step_seconds
+
+# NumPy is optional, resampling falls back to the standard library without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AGGREGATIONS = ("sum", "mean", "min", "max", "last")
+FILL_METHODS = (None, "ffill", "linear")
+
+
+def _column_methods(columns, how):
+    """Return the aggregation of each data column from a single name or a {column: name} dict."""
+    if isinstance(how, dict):
+        for col_name in how:
+            if col_name not in columns:
+                raise ValueError(f"Column '{col_name}' not found")
+        methods = [how.get(col_name, "mean") for col_name in columns]
+    else:
+        methods = [how] * len(columns)
+    for method in methods:
+        if method not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{method}'. Valid options are: {', '.join(AGGREGATIONS)}")
+    return methods
+
+
+def _aggregate_bins(bins, columns, methods):
+    """
+    Aggregate the rows of one location in a single pass.
+
+    Parameters:
+    bins (sequence of int): Bin number of each row, non-decreasing
+    columns (list): Per data column, the row values (None or NaN for missing)
+    methods (list): Aggregation name per data column
+
+    Returns:
+    tuple: (bin numbers holding rows as array('q'), list of array('d') with one value per bin)
+    """
+    column_count = len(columns)
+    bin_numbers = array('q')
+    outputs = [array('d') for _ in range(column_count)]
+    totals = [0.0] * column_count
+    counts = [0] * column_count
+    current = None
+    for i, bin_number in enumerate(bins):
+        if bin_number != current:
+            if current is not None:
+                bin_numbers.append(current)
+                for j in range(column_count):
+                    if counts[j] == 0:
+                        outputs[j].append(MISSING)
+                    elif methods[j] == "mean":
+                        outputs[j].append(totals[j] / counts[j])
+                    else:
+                        outputs[j].append(totals[j])
+            current = bin_number
+            totals = [0.0] * column_count
+            counts = [0] * column_count
+        for j in range(column_count):
+            value = columns[j][i]
+            # x != x is True for NaN
+            if value is None or value != value:
+                continue
+            method = methods[j]
+            if method == "sum" or method == "mean":
+                totals[j] += value
+            elif method == "last":
+                totals[j] = value
+            elif counts[j] == 0 or (value < totals[j] if method == "min" else value > totals[j]):
+                totals[j] = value
+            counts[j] += 1
+    if current is not None:
+        bin_numbers.append(current)
+        for j in range(column_count):
+            if counts[j] == 0:
+                outputs[j].append(MISSING)
+            elif methods[j] == "mean":
+                outputs[j].append(totals[j] / counts[j])
+            else:
+                outputs[j].append(totals[j])
+    return bin_numbers, outputs
+
+
+def _fill_bins(bin_numbers, values, fill):
+    """
+    Spread the values of the bins holding rows over every bin from the first to the last.
+
+    Parameters:
+    bin_numbers (array): Bin numbers holding rows, increasing
+    values (array): One value per bin number
+    fill (str or None): How the empty bins in between are filled
+
+    Returns:
+    array: array('d') with one value per bin from bin_numbers[0] to bin_numbers[-1]
+    """
+    first = bin_numbers[0]
+    filled = array('d', [MISSING]) * (bin_numbers[-1] - first + 1)
+    previous_bin = None
+    previous_value = MISSING
+    for bin_number, value in zip(bin_numbers, values):
+        position = bin_number - first
+        filled[position] = value
+        if previous_bin is not None and bin_number - previous_bin > 1:
+            if fill == "ffill":
+                for k in range(previous_bin - first + 1, position):
+                    filled[k] = previous_value
+            elif fill == "linear":
+                slope = (value - previous_value) / (bin_number - previous_bin)
+                for k in range(1, bin_number - previous_bin):
+                    filled[previous_bin - first + k] = previous_value + slope * k
+        previous_bin = bin_number
+        previous_value = value
+    return filled
+
+
+def _source_step(ts, times, offsets):
+    """Step of the input rows of one location in seconds, None for a single timestamp."""
+    if isinstance(ts, RegularTimeSeries) and ts.step_seconds:
+        return ts.step_seconds
+    if ts.metadata.get("time_step"):
+        return int(ts.metadata["time_step"])
+    try:
+        return infer_step_seconds(times[i] for i in offsets)
+    except ValueError:
+        return None
+
+
+def _resample_location_numpy(bins, columns, methods, fill):
+    """NumPy version of _aggregate_bins followed by _fill_bins."""
+    bins = np.asarray(bins, dtype=np.int64)
+    bin_numbers, starts = np.unique(bins, return_index=True)
+    positions = bin_numbers - bin_numbers[0]
+    bin_count = int(positions[-1]) + 1
+    row_numbers = np.arange(len(bins))
+
+    observed = np.zeros(bin_count, dtype=bool)
+    observed[positions] = True
+    if fill is not None:
+        steps = np.arange(bin_count)
+        previous = np.maximum.accumulate(np.where(observed, steps, 0))
+        following = np.minimum.accumulate(np.where(observed, steps, bin_count)[::-1])[::-1]
+
+    outputs = []
+    for values, method in zip(columns, methods):
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        if method == "sum" or method == "mean":
+            aggregated = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            if method == "mean":
+                aggregated = aggregated / np.maximum(counts, 1)
+        elif method == "min":
+            aggregated = np.fmin.reduceat(values, starts)
+        elif method == "max":
+            aggregated = np.fmax.reduceat(values, starts)
+        else:
+            last_valid = np.maximum.reduceat(np.where(valid, row_numbers, 0), starts)
+            aggregated = values[last_valid]
+        aggregated = np.where(counts > 0, aggregated, np.nan)
+
+        filled = np.full(bin_count, np.nan)
+        filled[positions] = aggregated
+        if fill == "ffill":
+            filled = filled[previous]
+        elif fill == "linear":
+            span = np.maximum(following - previous, 1)
+            filled = np.where(observed, filled,
+                              filled[previous] + (filled[following] - filled[previous])
+                              * (steps - previous) / span)
+        outputs.append(array('d', filled.tolist()))
+    return int(bin_numbers[0]), bin_count, outputs
+
+
+def resample_timeseries(ts, step, how="mean", fill=None, origin=None, output_name=None,
+                        use_numpy=None, timeseries_class=RegularTimeSeries):
+    """
+    Resample a TimeSeries onto a regular time step.
+
+    Parameters:
+    ts (TimeSeries): The TimeSeries to resample, row based, columnar or regular
+    step (int or timedelta): New time step in seconds, e.g. general.timeStep
+    how (str or dict): Aggregation for all data columns, or a {column: aggregation}
+                       dict where columns not listed use 'mean'. One of 'sum',
+                       'mean', 'min', 'max', 'last'
+    fill (str, optional): How bins without rows are filled: None, 'ffill' or 'linear'
+    origin (datetime, optional): A bin boundary, defaults to 1970-01-01 00:00:00
+    output_name (str, optional): Name of the output (defaults to the input name
+                                 with "_resampled" appended)
+    use_numpy (bool, optional): Use NumPy, defaults to True when NumPy is installed
+    timeseries_class (type): TimeSeries class of the output, RegularTimeSeries by default
+
+    Returns:
+    TimeSeries: One row per bin and location from the first bin holding rows of that
+                location to the end of the period of its last row, with the
+                aggregation and fill stored in metadata
+
+    Raises:
+    ValueError: If an aggregation or fill method is unknown
+    """
+    step_seconds = to_step_seconds(step)
+    if fill not in FILL_METHODS:
+        raise ValueError(f"Unknown fill method '{fill}'. Valid options are: None, 'ffill', 'linear'")
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise ImportError("use_numpy=True needs NumPy, which is not installed")
+
+    data_columns = ts.columns[2:]
+    methods = _column_methods(data_columns, how)
+    origin_seconds = 0 if origin is None else to_epoch_seconds(origin)
+
+    if isinstance(ts, ColumnarTimeSeries):
+        times = ts.get_timestamp_array()
+    else:
+        times = array('q', [to_epoch_seconds(key[0]) for key in ts._iter_keys()])
+    column_values = [ts._column_values(col_name) for col_name in data_columns]
+
+    out_times = array('q')
+    out_codes = array('i')
+    out_values = [array('d') for _ in data_columns]
+    location_names = ts.get_locations()
+    for location_code, location in enumerate(location_names):
+        offsets = ts.get_sorted_offsets(location)
+        if not len(offsets):
+            continue
+        bins = [(times[i] - origin_seconds) // step_seconds for i in offsets]
+        columns = [[values[i] for i in offsets] for values in column_values]
+        if use_numpy:
+            first_bin, bin_count, filled = _resample_location_numpy(bins, columns, methods, fill)
+        else:
+            bin_numbers, aggregated = _aggregate_bins(bins, columns, methods)
+            first_bin = bin_numbers[0]
+            bin_count = bin_numbers[-1] - first_bin + 1
+            filled = [_fill_bins(bin_numbers, values, fill) for values in aggregated]
+
+        # Upsampling: carry on to the end of the last input period
+        source_step = _source_step(ts, times, offsets)
+        if source_step is not None:
+            period_end = times[offsets[-1]] + source_step - step_seconds
+            extra = (period_end - origin_seconds) // step_seconds - (first_bin + bin_count - 1)
+            if extra > 0:
+                for values in filled:
+                    values.extend(array('d', [MISSING if fill is None else values[-1]]) * extra)
+                bin_count += extra
+
+        first_time = origin_seconds + first_bin * step_seconds
+        out_times.extend(range(first_time, first_time + bin_count * step_seconds, step_seconds))
+        out_codes.extend(array('i', [location_code]) * bin_count)
+        for output, values in zip(out_values, filled):
+            output.extend(values)
+
+    if output_name is None:
+        output_name = f"{ts.name}_resampled" if ts.name else "resampled"
+
+    values = dict(zip(data_columns, out_values))
+    if issubclass(timeseries_class, RegularTimeSeries):
+        result = timeseries_class.from_arrays(out_times, out_codes, location_names, values,
+                                              name=output_name, step=step_seconds)
+    elif issubclass(timeseries_class, ColumnarTimeSeries):
+        result = timeseries_class.from_arrays(out_times, out_codes, location_names, values, name=output_name)
+    else:
+        result = timeseries_class(output_name)
+        result.add_rows([from_epoch_seconds(t) for t in out_times],
+                        [location_names[code] for code in out_codes],
+                        {col_name: [None if v != v else v for v in buffer] for col_name, buffer in values.items()})
+
+    for key, value in ts.metadata.items():
+        if key != "uuid":
+            result.add_metadata(key, value)
+    result.add_metadata('source_timeseries', ts.name if ts.name else 'unnamed')
+    result.add_metadata('time_step', step_seconds)
+    result.add_metadata('aggregation', dict(zip(data_columns, methods)))
+    result.add_metadata('fill_method', fill)
+    result.add_metadata('creation_datetime', datetime.datetime.now().isoformat())
+    return result
+
+
+# Example usage:
+if __name__ == "__main__":
+    hourly = TimeSeries("hourly_example")
+    start = datetime.datetime(2020, 1, 1)
+    hourly.add_rows([start + datetime.timedelta(hours=h) for h in range(72)], "reach_1",
+                    {"precipitation": [0.1 * (h % 5) for h in range(72)],
+                     "air_temperature": [h % 24 - 5.0 for h in range(72)]})
+    daily = resample_timeseries(hourly, 86400, how={"precipitation": "sum", "air_temperature": "mean"})
+    for row in daily.data:
+        print(row)
@@ -0,0 +1,156 @@
+"""
+Shared Memory Arrays
+
+Worker processes receive their arguments pickled, so handing driving data to a
+process pool copies it into every worker, and a long hourly series then
+dominates both run time and memory. SharedArrays copies a set of flat arrays
+(array('d'), array('q'), ...) once into a single multiprocessing.shared_memory
+block owned by the parent. Workers get a small picklable handle (the block name
+and the type code, offset and size of each array) and attach memoryviews onto the
+block, without copying. A memoryview supports the indexing, len and iteration
+the solvers use on arrays.
+
+Cleanup: the parent unlinks the block when the SharedArrays is released, as a
+context manager on normal exit or when an exception (including a broken worker
+pool) leaves the with block, and from an atexit hook if it was never released.
+If the parent itself is killed, the multiprocessing resource tracker unlinks
+the block when the parent's processes have gone. A worker's mapping goes away
+with the worker.
+
+The driving data slices of subcatchmentSolver have their own pair of helpers,
+share_slices and attach_slices. Slices shared by several subcatchments (a
+single driving data location) are stored once.
+"""
+
+import atexit
+from multiprocessing import shared_memory, util
+
+ALIGNMENT = 8
+
+
+class SharedArrays:
+    """Flat arrays copied into one shared memory block, owned by the creating process."""
+
+    def __init__(self, arrays):
+        """
+        Copy arrays into a new shared memory block.
+
+        Parameters:
+        arrays (dict): {key: array}, any array.array type code supported by memoryview.cast
+        """
+        layout = {}
+        size = 0
+        for key, values in arrays.items():
+            nbytes = len(values) * values.itemsize
+            layout[key] = (values.typecode, size, nbytes)
+            size += -(-nbytes // ALIGNMENT) * ALIGNMENT
+        # A block cannot be empty
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, ALIGNMENT))
+        self.handle = (self.memory.name, layout)
+        atexit.register(self.release)
+        try:
+            for key, values in arrays.items():
+                _, offset, nbytes = layout[key]
+                self.memory.buf[offset:offset + nbytes] = memoryview(values).cast('B')
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        """Close and unlink the block, safe to call more than once."""
+        if self.memory is None:
+            return
+        atexit.unregister(self.release)
+        memory, self.memory = self.memory, None
+        try:
+            memory.close()
+        finally:
+            memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+# Blocks attached by this process, kept open while their views are in use
+_attached = {}
+
+
+def attach(handle):
+    """
+    Attach zero copy views of the arrays of a SharedArrays.
+
+    Parameters:
+    handle (tuple): The handle attribute of the SharedArrays
+
+    Returns:
+    dict: {key: memoryview} with the type codes of the original arrays. The views
+          are read-only by convention, writing to them changes every process's data
+    """
+    name, layout = handle
+    if name not in _attached:
+        memory = shared_memory.SharedMemory(name=name)
+        _attached[name] = [memory, None]
+        # Worker processes exit without running atexit hooks, multiprocessing finalizers do run
+        util.Finalize(None, _detach, args=(name,), exitpriority=10)
+        buffer = memory.buf
+        _attached[name][1] = {key: buffer[offset:offset + nbytes].cast(typecode)
+                              for key, (typecode, offset, nbytes) in layout.items()}
+    return _attached[name][1]
+
+
+def _detach(name):
+    """Release the views and close an attached block."""
+    memory, views = _attached.pop(name, (None, None))
+    if memory is None:
+        return
+    for view in (views or {}).values():
+        view.release()
+    try:
+        memory.close()
+    except BufferError:
+        # Views are still referenced elsewhere, the mapping goes away with the process
+        pass
+
+
+def share_slices(slices):
+    """
+    Put driving data slices into shared memory.
+
+    Parameters:
+    slices (list): One {column: array('d')} per subcatchment, see driving_data_slices
+
+    Returns:
+    tuple: (shared, handle) where shared is the SharedArrays to release when the
+           workers are done and handle is what attach_slices needs
+    """
+    unique = {}
+    slice_keys = []
+    arrays = {}
+    for data in slices:
+        if id(data) not in unique:
+            unique[id(data)] = len(unique)
+            for column, values in data.items():
+                arrays[f"{unique[id(data)]}/{column}"] = values
+        slice_keys.append(unique[id(data)])
+    columns = [list(data) for data in slices]
+    shared = SharedArrays(arrays)
+    return shared, (shared.handle, slice_keys, columns)
+
+
+def attach_slices(handle):
+    """
+    Attach the driving data slices shared by share_slices.
+
+    Parameters:
+    handle (tuple): Handle returned by share_slices
+
+    Returns:
+    list: One {column: memoryview} per subcatchment
+    """
+    arrays_handle, slice_keys, columns = handle
+    views = attach(arrays_handle)
+    return [{column: views[f"{key}/{column}"] for column in slice_columns}
+            for key, slice_columns in zip(slice_keys, columns)]
@@ -0,0 +1,186 @@
+"""
+Solar Geometry Cache
+
+Declination, sunset hour angle, extraterrestrial radiation and the solar elevation
+terms depend only on the latitude, the day of the year and the time of day, yet
+they used to be recomputed with sin/cos/acos for every row of every time series.
+SolarGeometry computes them once per site: the daily terms for all 366 days when
+the site is created, and the hour angle term the first time each time of day (to
+the second) is seen. get_solar_geometry returns the same SolarGeometry to every
+caller asking for the same site, so calculate_pet and compute_radiation_series
+share one table.
+
+Two sets of daily terms are kept, matching the two formulations used in the code:
+1. The FAO-56 terms of calculate_pet (radians): declination, sunset hour angle and
+   extraterrestrial radiation in MJ/m²/day
+2. The terms of the hourly solar radiation model in solar_radiation.py (degrees):
+   declination and extraterrestrial irradiance in W/m²
+"""
+
+import datetime
+import math
+
+# Solar constant (W/m²) and clear sky transmittance of the hourly radiation model
+SOLAR_CONSTANT = 1367
+TRANSMITTANCE = 0.75
+
+
+# Ordinal of 1 January of each year seen so far
+_year_starts = {}
+
+
+def day_of_year(dt):
+    """
+    Day of the year of a date or datetime, 1-366 (same as dt.timetuple().tm_yday).
+
+    Parameters:
+    dt (date or datetime): The date
+
+    Returns:
+    int: Day of the year
+    """
+    year_start = _year_starts.get(dt.year)
+    if year_start is None:
+        year_start = datetime.date(dt.year, 1, 1).toordinal()
+        _year_starts[dt.year] = year_start
+    return dt.toordinal() - year_start + 1
+
+
+class SolarGeometry:
+    """
+    Solar geometry tables for one site.
+
+    Daily values are indexed by day of year (1-366), hour angle terms are cached by
+    second of the day.
+    """
+
+    def __init__(self, latitude, longitude=0.0, timezone_offset=0.0):
+        """
+        Build the daily tables for a site.
+
+        Parameters:
+        latitude (float): Latitude in degrees
+        longitude (float): Longitude in degrees
+        timezone_offset (float): Timezone offset from UTC in hours
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone_offset = timezone_offset
+
+        lat_rad = math.radians(latitude)
+        sin_lat = math.sin(lat_rad)
+        cos_lat = math.cos(lat_rad)
+        days = range(367)
+
+        # FAO-56 daily terms as used by calculate_pet (index 0 is unused)
+        self.declination = [0.409 * math.sin(2 * math.pi * doy / 365 - 1.39) for doy in days]
+        self.sunset_angle = [
+            # Clamped so that polar day and polar night do not fail in acos
+            math.acos(max(-1.0, min(1.0, -math.tan(lat_rad) * math.tan(decl))))
+            for decl in self.declination
+        ]
+        self.extraterrestrial_radiation = []
+        for doy, decl, ws in zip(days, self.declination, self.sunset_angle):
+            dr = 1 + 0.033 * math.cos(2 * math.pi * doy / 365)  # inverse relative distance Earth-Sun
+            self.extraterrestrial_radiation.append(24 * 60 / math.pi * 0.0820 * dr * (
+                ws * sin_lat * math.sin(decl) + cos_lat * math.cos(decl) * math.sin(ws)
+            ))
+
+        # Hourly radiation model terms: sin(elevation) = a + b * cos(hour angle)
+        self._irradiance = []
+        self._elevation_a = []
+        self._elevation_b = []
+        for doy in days:
+            decl_rad = math.radians(23.45 * math.sin(math.radians(360 * (284 + doy) / 365)))
+            self._irradiance.append(
+                SOLAR_CONSTANT * (1 + 0.033 * math.cos(math.radians(360 * doy / 365))) * TRANSMITTANCE)
+            self._elevation_a.append(sin_lat * math.sin(decl_rad))
+            self._elevation_b.append(cos_lat * math.cos(decl_rad))
+
+        self._cos_hour_angle = {}
+
+    def cos_hour_angle(self, second_of_day):
+        """
+        Cosine of the solar hour angle at a local clock time.
+
+        Parameters:
+        second_of_day (float): Seconds since local midnight
+
+        Returns:
+        float: Cosine of the hour angle
+        """
+        value = self._cos_hour_angle.get(second_of_day)
+        if value is None:
+            solar_time = second_of_day / 3600 + (self.longitude / 15) - self.timezone_offset
+            value = math.cos(math.radians(15 * (solar_time - 12)))
+            self._cos_hour_angle[second_of_day] = value
+        return value
+
+    def daily_radiation_terms(self):
+        """
+        Daily terms of the hourly radiation model, indexed by day of year (index 0 is unused).
+
+        Returns:
+        tuple: (irradiance, a, b) lists, the radiation is irradiance * (a + b * cos(hour angle))
+               when that is positive and zero otherwise
+        """
+        return self._irradiance, self._elevation_a, self._elevation_b
+
+    def radiation(self, day_of_year, second_of_day):
+        """
+        Clear sky solar radiation of the hourly model (W/m²), zero when the sun is down.
+
+        Parameters:
+        day_of_year (int): Day of the year, 1-366
+        second_of_day (float): Seconds since local midnight
+
+        Returns:
+        float: Solar radiation in W/m²
+        """
+        sin_elevation = (self._elevation_a[day_of_year]
+                         + self._elevation_b[day_of_year] * self.cos_hour_angle(second_of_day))
+        if sin_elevation <= 0:
+            return 0
+        return self._irradiance[day_of_year] * sin_elevation
+
+    def radiation_at(self, dt):
+        """
+        Clear sky solar radiation of the hourly model at a timestamp.
+
+        Parameters:
+        dt (datetime): Local time
+
+        Returns:
+        float: Solar radiation in W/m²
+        """
+        second_of_day = dt.hour * 3600 + dt.minute * 60 + dt.second
+        return self.radiation(day_of_year(dt), second_of_day)
+
+
+# One SolarGeometry per site, shared by every caller
+_sites = {}
+
+
+def get_solar_geometry(latitude, longitude=0.0, timezone_offset=0.0):
+    """
+    Get the shared SolarGeometry of a site, building it on first use.
+
+    Parameters:
+    latitude (float): Latitude in degrees
+    longitude (float): Longitude in degrees
+    timezone_offset (float): Timezone offset from UTC in hours
+
+    Returns:
+    SolarGeometry: The cached tables for the site
+    """
+    key = (float(latitude), float(longitude), float(timezone_offset))
+    geometry = _sites.get(key)
+    if geometry is None:
+        geometry = SolarGeometry(*key)
+        _sites[key] = geometry
+    return geometry
+
+
+def clear_solar_geometry_cache():
+    """Drop all cached sites, e.g. to free memory after a long multi-site run."""
+    _sites.clear()
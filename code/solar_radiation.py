@@ -1,6 +1,16 @@
 import math
+from array import array
 from datetime import datetime, timedelta
 from timeSeries import TimeSeries
+from columnarTimeSeries import ColumnarTimeSeries, to_epoch_seconds
+from regularTimeSeries import to_step_seconds
+from solarGeometry import get_solar_geometry, day_of_year
+
+# NumPy is optional, compute_radiation_sites falls back to the standard library without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def solar_declination(day_of_year):
     return 23.45 * math.sin(math.radians(360 * (284 + day_of_year) / 365))
@@ -25,31 +35,16 @@ def extraterrestrial_radiation(day_of_year):
     return G_sc * (1 + 0.033 * math.cos(math.radians(360 * day_of_year / 365)))
 
 def solar_radiation(dt, lat, longitude=0, timezone_offset=0):
-    day_of_year = dt.timetuple().tm_yday
-    hour = dt.hour + dt.minute / 60 + dt.second / 3600
-
-    decl = solar_declination(day_of_year)
-    ha = solar_hour_angle(hour, longitude, timezone_offset)
-    elev = solar_elevation_angle(lat, decl, ha)
-
-    if elev <= 0:
-        return 0
-
-    I_0 = extraterrestrial_radiation(day_of_year)
-    transmittance = 0.75
-    radiation = I_0 * transmittance * math.sin(math.radians(elev))
-    return radiation
+    # Declination, irradiance and hour angle come from the site's shared tables
+    return get_solar_geometry(lat, longitude, timezone_offset).radiation_at(dt)
 
 def compute_radiation_series(start_time, end_time, step_seconds, latitude, longitude, timezone_offset):
-    current_time = start_time
-    times = []
-    radiation = []
-
-    while current_time <= end_time:
-        rad = solar_radiation(current_time, latitude, longitude, timezone_offset)
-        times.append(current_time)
-        radiation.append(rad)
-        current_time += timedelta(seconds=step_seconds)
+    # The site's solar geometry is computed once and shared with other callers
+    geometry = get_solar_geometry(latitude, longitude, timezone_offset)
+    step = timedelta(seconds=step_seconds)
+    count = int((end_time - start_time) // step) + 1 if end_time >= start_time else 0
+    times = [start_time + i * step for i in range(count)]
+    radiation = [geometry.radiation_at(t) for t in times]
 
     return times, radiation
 
@@ -82,12 +77,135 @@ def compute_radiation_timeseries(start_time, end_time, step_seconds, latitude, l
     ts.add_metadata("source", "Python solar radiation model (solar_radiation.py)")
     ts.add_metadata("generation_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     
-    # Add column for solar radiation
-    ts.add_column("solar_radiation")
+    # Add data to TimeSeries in one block
+    ts.add_rows(times, location_id, {"solar_radiation": radiation_values})
+    
+    return ts
+
+def subcatchment_sites(parameters):
+    """
+    Get the outflow coordinates of every subcatchment from a parameter set
+    
+    Args:
+        parameters: ParameterSet or dict with subcatchment/general/name,
+                    latitudeAtOutflow and longitudeAtOutflow lists
+        
+    Returns:
+        tuple of (names, latitudes, longitudes) lists
+    """
+    parameters = getattr(parameters, 'parameters', parameters)
+    general = parameters['subcatchment']['general']
+    return list(general['name']), list(general['latitudeAtOutflow']), list(general['longitudeAtOutflow'])
+
+def _time_axis(start_time, step_seconds, count):
+    """
+    Day of year and second of day of every step of a regular time axis
+    
+    Steps are counted in whole seconds from the start, so no datetime is created
+    per step.
+    """
+    start_second = start_time.hour * 3600 + start_time.minute * 60 + start_time.second
+    start_ordinal = start_time.toordinal()
+    day_of_year_by_day = {}
+    doys = array('i')
+    seconds = []
+    for k in range(count):
+        elapsed = start_second + k * step_seconds
+        day = int(elapsed // 86400)
+        doy = day_of_year_by_day.get(day)
+        if doy is None:
+            doy = day_of_year(datetime.fromordinal(start_ordinal + day))
+            day_of_year_by_day[day] = doy
+        doys.append(doy)
+        seconds.append(elapsed - day * 86400)
+    return doys, seconds
+
+def compute_radiation_sites(start_time, end_time, step_seconds, latitudes, longitudes, timezone_offset=0,
+                            location_ids=None, use_numpy=None, timeseries_class=TimeSeries):
+    """
+    Compute solar radiation for many sites over a shared time axis in one pass
+    
+    The time axis is built once as whole second offsets from start_time and shared
+    by all sites. Each site uses its shared solarGeometry tables, with NumPy the
+    daily terms and hour angles are combined for all steps in one array operation.
     
-    # Add data to TimeSeries
-    for i in range(len(times)):
-        ts.add_data(times[i], location_id, [radiation_values[i]])
+    Args:
+        start_time: datetime object, start of the computation period
+        end_time: datetime object, end of the computation period
+        step_seconds: int, time step in whole seconds
+        latitudes: list of float, latitude of each site in degrees
+        longitudes: list of float, longitude of each site in degrees
+        timezone_offset: float, timezone offset from UTC in hours, shared by all sites
+        location_ids: list of str, identifier of each site (default site_1, site_2, ...)
+        use_numpy: bool, use NumPy, defaults to True when NumPy is installed
+        timeseries_class: class of the returned TimeSeries, e.g. ColumnarTimeSeries
+        
+    Returns:
+        TimeSeries object with a solar_radiation column and one location per site
+        
+    Raises:
+        ValueError: if the step is not a positive whole number of seconds or a
+                    location id is used for more than one site
+    """
+    step_seconds = to_step_seconds(step_seconds)
+    if len(latitudes) != len(longitudes):
+        raise ValueError(f"Got {len(latitudes)} latitudes but {len(longitudes)} longitudes")
+    if location_ids is None:
+        location_ids = [f"site_{i + 1}" for i in range(len(latitudes))]
+    if len(location_ids) != len(latitudes):
+        raise ValueError(f"Got {len(location_ids)} location ids for {len(latitudes)} sites")
+    if len(set(location_ids)) != len(location_ids):
+        duplicates = sorted({str(location_id) for location_id in location_ids if location_ids.count(location_id) > 1})
+        raise ValueError(f"Location ids must be unique, got duplicates: {', '.join(duplicates)}")
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise ImportError("use_numpy=True needs NumPy, which is not installed")
+    
+    step = timedelta(seconds=step_seconds)
+    count = int((end_time - start_time) // step) + 1 if end_time >= start_time else 0
+    doys, seconds = _time_axis(start_time, step_seconds, count)
+    
+    # Radiation of every site, one array per site
+    site_values = []
+    if use_numpy:
+        doy = np.asarray(doys, dtype=np.intp)
+        # Each distinct time of day needs one hour angle per site
+        times_of_day, time_of_day_index = np.unique(np.asarray(seconds), return_inverse=True)
+        times_of_day = times_of_day.tolist()
+    for latitude, longitude in zip(latitudes, longitudes):
+        geometry = get_solar_geometry(latitude, longitude, timezone_offset)
+        if use_numpy:
+            irradiance, a, b = (np.asarray(terms)[doy] for terms in geometry.daily_radiation_terms())
+            cos_hour_angle = np.array([geometry.cos_hour_angle(s) for s in times_of_day])[time_of_day_index]
+            sin_elevation = a + b * cos_hour_angle
+            values = np.where(sin_elevation > 0, irradiance * sin_elevation, 0.0)
+            site_values.append(array('d', values.tobytes()))
+        else:
+            site_values.append(array('d', map(geometry.radiation, doys, seconds)))
+    
+    # Build one multi-location TimeSeries, the time axis is shared by all sites
+    if issubclass(timeseries_class, ColumnarTimeSeries):
+        first = to_epoch_seconds(start_time)
+        times = array('q', range(first, first + count * step_seconds, step_seconds))
+        codes = array('i')
+        radiation = array('d')
+        for code, values in enumerate(site_values):
+            codes.extend(array('i', [code]) * count)
+            radiation.extend(values)
+        ts = timeseries_class.from_arrays(times * len(site_values), codes, location_ids,
+                                         {"solar_radiation": radiation})
+    else:
+        ts = timeseries_class()
+        times = [start_time + k * step for k in range(count)]
+        for location_id, values in zip(location_ids, site_values):
+            ts.add_rows(times, location_id, {"solar_radiation": values})
+    
+    # Add metadata
+    ts.add_metadata("latitude", {location_id: latitude for location_id, latitude in zip(location_ids, latitudes)})
+    ts.add_metadata("longitude", {location_id: longitude for location_id, longitude in zip(location_ids, longitudes)})
+    ts.add_metadata("source", "Python solar radiation model (solar_radiation.py)")
+    ts.add_metadata("generation_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     
     return ts
 
@@ -0,0 +1,115 @@
+"""
+Square Matrix
+
+A small dense square matrix stored row by row in a flat array('d'), used for the
+landCover.hydrology.flowMatrix parameter. In a flow matrix row i describes where
+the water draining from bucket i goes: element [i][j] is the fraction going to
+bucket j and the diagonal element [i][i] the fraction going to the stream.
+"""
+
+from array import array
+
+
+class SquareMatrix:
+    """A dense square matrix of floats."""
+
+    __slots__ = ('size', 'values')
+
+    def __init__(self, size, rows=None):
+        """
+        Create a matrix, zero filled unless rows are given.
+
+        Parameters:
+        size (int): Number of rows and columns
+        rows (list, optional): size lists of size values
+
+        Raises:
+        ValueError: If rows does not have the given size
+        """
+        self.size = size
+        self.values = array('d', bytes(8 * size * size))
+        if rows is not None:
+            if len(rows) != size or any(len(row) != size for row in rows):
+                raise ValueError(f"Expected a {size} x {size} matrix")
+            for i, row in enumerate(rows):
+                self.values[i * size:(i + 1) * size] = array('d', row)
+
+    @classmethod
+    def fromRows(cls, rows):
+        """
+        Create a matrix from nested lists, e.g. a flowMatrix entry of a parameter set.
+
+        Parameters:
+        rows (list): Lists of values, one per row
+
+        Returns:
+        SquareMatrix: The matrix
+        """
+        return cls(len(rows), rows)
+
+    def __getitem__(self, index):
+        i, j = index
+        return self.values[i * self.size + j]
+
+    def __setitem__(self, index, value):
+        i, j = index
+        self.values[i * self.size + j] = value
+
+    def __eq__(self, other):
+        return isinstance(other, SquareMatrix) and self.size == other.size and self.values == other.values
+
+    def __repr__(self):
+        return f"SquareMatrix({self.size}, {self.toRows()})"
+
+    def row(self, i):
+        """Values of row i as an array('d')."""
+        return self.values[i * self.size:(i + 1) * self.size]
+
+    def toRows(self):
+        """The matrix as nested lists."""
+        return [list(self.row(i)) for i in range(self.size)]
+
+    def rowSums(self):
+        """Sum of each row."""
+        return [sum(self.row(i)) for i in range(self.size)]
+
+    def multiplyVector(self, vector):
+        """
+        Multiply a vector by the matrix from the left (vector times matrix).
+
+        For a flow matrix this takes the water leaving each bucket to the water
+        arriving in each bucket, with the diagonal giving the water reaching the stream.
+
+        Parameters:
+        vector (sequence of float): One value per row
+
+        Returns:
+        array: array('d') with one value per column
+        """
+        size = self.size
+        result = array('d', bytes(8 * size))
+        for i in range(size):
+            value = vector[i]
+            if value:
+                offset = i * size
+                for j in range(size):
+                    result[j] += value * self.values[offset + j]
+        return result
+
+    def validateFlowMatrix(self, tolerance=1.0e-6):
+        """
+        Check that the matrix is a valid flow matrix: no negative fractions and
+        every row summing to one, so routing conserves water.
+
+        Parameters:
+        tolerance (float): Allowed deviation of a row sum from one
+
+        Raises:
+        ValueError: If a fraction is negative or a row does not sum to one
+        """
+        for i in range(self.size):
+            row = self.row(i)
+            if min(row) < 0:
+                raise ValueError(f"Flow matrix row {i} has a negative fraction: {list(row)}")
+            if abs(sum(row) - 1.0) > tolerance:
+                raise ValueError(f"Flow matrix row {i} sums to {sum(row)}, not 1: {list(row)}")
@@ -1,40 +1,70 @@
-from concurrent.futures import ProcessPoolExecutor
+from array import array
 
 from landCoverType import LandCoverType
+from bucketState import BucketState
+from bucketRouting import BucketRouting
 from chemical import Chemical
-from timeSeries import TimeSeries
 
 class Subcatchment:
     """First try at writing code for subcatchment / reach pools and processes in INCA / PERSiST"""
 
-    def solve(self):
-        """Code stub to solve hydrochemical transformation and fluxes in a subcatchment"""
-        results = TimeSeries 
+    def solve(self, drivingData):
+        """Solve the land cover types of the subcatchment over its driving data, a dictionary of
+        'precipitation' and 'air_temperature' arrays in time order. Returns a dictionary of output
+        arrays with one value per time step: the land cover weighted water input (rainfall plus
+        snow melt) and runoff (water draining from the buckets to the stream, mm per step), and the
+        snow depth of each land cover type"""
+        precipitation = drivingData['precipitation']
+        temperature = drivingData['air_temperature']
+        #missing values would silently break the snowpack, x != x is True for NaN
+        for values in (precipitation, temperature):
+            if any(value != value for value in values):
+                raise ValueError(f"Driving data for subcatchment {self.name} has missing values, fill them first (timeSeriesGaps.fill_gaps)")
 
-        #put the system under load
-        print("Loading subcatchment ", self.name)        
+        results = {}
+        stepCount = len(precipitation)
+        waterInput = array('d', bytes(8 * stepCount))
+        runoff = array('d', bytes(8 * stepCount))
+        landCoverInputs = []
+        for landCover in self.landCoverTypes:
+            outputs = landCover.solve(precipitation, temperature)
+            landCoverInputs.append(outputs['waterInput'])
+            results['snowDepth_' + landCover.name] = outputs['snowDepth']
+
+        #the snowpack does not depend on the buckets, route the water input of all land cover types at once
+        toStream = self.bucketRouting.route(landCoverInputs)
+        for landCover, inputs, streamInputs in zip(self.landCoverTypes, landCoverInputs, toStream):
+            fraction = landCover.percentCover / 100.0
+            for i in range(stepCount):
+                waterInput[i] += fraction * inputs[i]
+                runoff[i] += fraction * streamInputs[i]
+        results['waterInput'] = waterInput
+        results['runoff'] = runoff
         return results
-    
-    def solveLandCoverTypes(self,landCoverIndex):
-         with ProcessPoolExecutor() as executor:
-            executor.map(self.catchment.sub)
 
     
     def __init__(self, pars,subCatchmentIndex):#geographical coordinates of the outflow
-        self.latitude=pars.parameters["subcatchment"]["general"]["latitudeAtOutflow"][subCatchmentIndex]
-        self.longitude=pars.parameters["subcatchment"]["general"]["longitudeAtOutflow"][subCatchmentIndex]
+        compiled=pars.compiled()    #flat parameter arrays
+        self.latitude=compiled.subcatchment["latitudeAtOutflow"][subCatchmentIndex]
+        self.longitude=compiled.subcatchment["longitudeAtOutflow"][subCatchmentIndex]
 
-        landCoverCount=pars.parameters['landCover'].__len__()
+        landCoverCount=compiled.landCoverCount
         
-        self.name = pars.parameters['subcatchment']['general']['name'][subCatchmentIndex]
+        self.name = compiled.subcatchmentNames[subCatchmentIndex]
 
         self.description="The terrestrial and aquatic parts of a subcatchment / reach system"
 
-        self.area=pars.parameters['subcatchment']['general']['area'][subCatchmentIndex]    #total subcatchment area
+        self.area=compiled.subcatchment['area'][subCatchmentIndex]    #total subcatchment area
         
+        #parameters and state of all buckets of all land cover types, copied from the compiled arrays
+        self.bucketState = BucketState.fromParameters(pars)
+
         self.landCoverTypes = []
         for i in range(landCoverCount):
-            self.landCoverTypes.append(LandCoverType(pars,subCatchmentIndex,i))
+            self.landCoverTypes.append(LandCoverType(pars,subCatchmentIndex,i,self.bucketState))
+
+        #transfer operator of the flow matrices of all land cover types over the shared bucket state
+        self.bucketRouting = BucketRouting(self.bucketState, [landCover.flowMatrix for landCover in self.landCoverTypes])
 
         self.hasChemicals=False #flag variable to simplify decision making
         Chemical.addChemicals(self,pars)
\ No newline at end of file
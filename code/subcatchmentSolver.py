@@ -0,0 +1,146 @@
+"""
+Parallel Subcatchment Solver
+
+Subcatchments do not depend on each other, so they are solved in worker
+processes. Each task carries only what one subcatchment needs:
+1. The Subcatchment object, holding its own land cover and bucket parameters
+   and state, but not the rest of the catchment
+2. Its slice of the driving data as a {column: array('d')} dictionary, or with
+   shared_memory=True only the slice's index: the slices are then copied once
+   into a shared memory block (sharedArrays) and every worker attaches zero
+   copy views of them when it starts
+A worker returns the subcatchment's output buffers together with the
+subcatchment itself, so the parent picks up the state at the end of the run
+(snow depths, ...). Results are collected in subcatchment order.
+
+The module level functions are used as the worker entry point so that nothing
+bound to the Model or the Catchment is pickled, which also keeps the solver
+working where worker processes are spawned rather than forked (Windows, macOS).
+Run with serial=True (or workers=1) to solve everything in the calling process,
+e.g. when debugging.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from columnarTimeSeries import ColumnarTimeSeries, to_epoch_seconds
+from sharedArrays import attach_slices, share_slices
+
+# Driving data columns used by Subcatchment.solve
+DRIVING_COLUMNS = ("precipitation", "air_temperature")
+
+
+def driving_data_slices(driving_data, locations, columns=DRIVING_COLUMNS):
+    """
+    Cut the driving data into one slice per subcatchment.
+
+    Each subcatchment reads the rows of the location with its name. When the
+    driving data holds a single location, that location drives every subcatchment.
+
+    Parameters:
+    driving_data (TimeSeries): Driving data, row based or columnar
+    locations (list): Subcatchment names, in subcatchment order
+    columns (tuple): Driving data columns to pass on
+
+    Returns:
+    tuple: (times, slices) where times is the array('q') of epoch seconds of the
+           first slice and slices is a list with one {column: array('d')} per subcatchment
+
+    Raises:
+    ValueError: If a column or a subcatchment's location is missing, or the
+                slices do not share one time axis
+    """
+    for col_name in columns:
+        if col_name not in driving_data.columns[2:]:
+            raise ValueError(f"Driving data must contain '{col_name}' column")
+
+    available = driving_data.get_locations()
+    if isinstance(driving_data, ColumnarTimeSeries):
+        epoch_times = driving_data.get_timestamp_array()
+    else:
+        epoch_times = None
+        keys = list(driving_data._iter_keys())
+    column_values = {col_name: driving_data._column_values(col_name) for col_name in columns}
+
+    cache = {}
+    times = None
+    slices = []
+    for location in locations:
+        if location not in available:
+            if len(available) != 1:
+                raise ValueError(f"No driving data for subcatchment '{location}'")
+            location = available[0]
+        if location not in cache:
+            offsets = driving_data.get_sorted_offsets(location)
+            if epoch_times is not None:
+                location_times = array('q', [epoch_times[i] for i in offsets])
+            else:
+                location_times = array('q', [to_epoch_seconds(keys[i][0]) for i in offsets])
+            if times is None:
+                times = location_times
+            elif location_times != times:
+                raise ValueError(f"Driving data for '{location}' is not on the same time axis as the other subcatchments")
+            cache[location] = {col_name: ColumnarTimeSeries._to_float_array([values[i] for i in offsets])
+                               for col_name, values in column_values.items()}
+        slices.append(cache[location])
+    return (times if times is not None else array('q')), slices
+
+
+def _solve_subcatchment(task):
+    """Worker entry point, solves one subcatchment and returns its outputs and final state."""
+    subcatchment, driving_data = task
+    outputs = subcatchment.solve(driving_data)
+    return outputs, subcatchment
+
+
+# Driving data slices attached by a worker process, see _attach_driving_data
+_worker_slices = []
+
+
+def _attach_driving_data(handle):
+    """Worker initializer, attaches the driving data slices in shared memory."""
+    _worker_slices[:] = attach_slices(handle)
+
+
+def _solve_shared_subcatchment(task):
+    """Worker entry point for driving data in shared memory, the task holds the slice index."""
+    subcatchment, index = task
+    return _solve_subcatchment((subcatchment, _worker_slices[index]))
+
+
+def solve_subcatchments(subcatchments, slices, workers=None, serial=False, shared_memory=True):
+    """
+    Solve subcatchments in worker processes and collect the outputs in order.
+
+    Parameters:
+    subcatchments (list): Subcatchment objects
+    slices (list): Driving data slice of each subcatchment, see driving_data_slices
+    workers (int, optional): Number of worker processes, defaults to the number of CPUs
+    serial (bool): Solve in the calling process instead
+    shared_memory (bool): Hand the driving data to the workers in shared memory
+                          instead of pickling each slice into its task
+
+    Returns:
+    tuple: (outputs, subcatchments) where outputs holds the {column: array('d')}
+           output buffers of each subcatchment, and subcatchments the subcatchment
+           objects carrying the state at the end of the run
+    """
+    if len(subcatchments) != len(slices):
+        raise ValueError(f"Expected {len(subcatchments)} driving data slices, got {len(slices)}")
+    tasks = list(zip(subcatchments, slices))
+
+    if serial or workers == 1 or len(tasks) < 2:
+        results = [_solve_subcatchment(task) for task in tasks]
+    elif shared_memory:
+        shared, handle = share_slices(slices)
+        # released whether the pool finishes or breaks
+        with shared, ProcessPoolExecutor(max_workers=workers, initializer=_attach_driving_data,
+                                         initargs=(handle,)) as executor:
+            results = list(executor.map(_solve_shared_subcatchment,
+                                        [(subcatchment, i) for i, subcatchment in enumerate(subcatchments)]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map returns the results in task order
+            results = list(executor.map(_solve_subcatchment, tasks))
+
+    return [result[0] for result in results], [result[1] for result in results]
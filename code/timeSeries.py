@@ -2,7 +2,11 @@ import datetime
 import csv
 import json
 import uuid
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from collections.abc import Sequence
+from itertools import repeat
 
 class TimeSeries:
     """
@@ -14,6 +18,11 @@ class TimeSeries:
        - Second column: Location identifier
        - Third+ columns: Numeric data values
     2. A dictionary for storing metadata about the time series
+    
+    A sorted timestamp index and a per-location row index are kept alongside the
+    data table. Both are extended incrementally by add_data and rebuilt lazily when
+    the table has changed in other ways. Code that edits rows in place (rather than
+    adding or replacing them) should call invalidate_indexes() afterwards.
     """
     
     def __init__(self, name=None):
@@ -36,6 +45,17 @@ class TimeSeries:
         # Set the name of the TimeSeries object
         self.name = name
     
+    @property
+    def data(self):
+        """The data table as a list of rows [timestamp, location, value1, value2, ...]"""
+        return self._data
+    
+    @data.setter
+    def data(self, rows):
+        """Replace the data table, the indexes are rebuilt on next use."""
+        self._data = rows
+        self.invalidate_indexes()
+    
     def add_column(self, column_name):
         """
         Add a new column to the data structure.
@@ -99,6 +119,80 @@ class TimeSeries:
         
         # Append the new row to the data
         self.data.append(new_row)
+        
+        # Keep the indexes current if they were current before this row
+        offset = len(self.data) - 1
+        if self._indexed_rows == offset:
+            self._index_row(offset, timestamp, location)
+    
+    def _validate_block(self, timestamps, locations, columns):
+        """
+        Check a block of rows passed to add_rows once, up front.
+        
+        Returns:
+        tuple: (row_count, locations) with a single location expanded to a repeating iterable
+        """
+        row_count = len(timestamps)
+        if not all(isinstance(timestamp, datetime.datetime) for timestamp in timestamps):
+            raise TypeError("timestamps must be datetime objects")
+        
+        if isinstance(locations, str) or not isinstance(locations, Sequence):
+            locations = repeat(locations, row_count)
+        elif len(locations) != row_count:
+            raise ValueError(f"Expected {row_count} locations, got {len(locations)}")
+        
+        for col_name, values in columns.items():
+            if len(values) != row_count:
+                raise ValueError(f"Expected {row_count} values for column '{col_name}', got {len(values)}")
+        
+        return row_count, locations
+    
+    def add_rows(self, timestamps, locations, columns):
+        """
+        Add a block of rows to the time series in one call.
+        
+        The block is validated once rather than row by row, which makes this much
+        faster than calling add_data for every row when loading large files.
+        
+        Parameters:
+        timestamps (sequence of datetime): The timestamp of each row
+        locations: A single location identifier used for every row, or a
+                   sequence with one location identifier per row
+        columns (dict): Column name -> sequence of values, one per row. Columns
+                        that do not exist yet are added, existing columns not
+                        in the mapping are filled with None
+        """
+        row_count, locations = self._validate_block(timestamps, locations, columns)
+        
+        for col_name in columns.keys():
+            if col_name not in self.columns:
+                self.add_column(col_name)
+        
+        # The indexes pick up the new rows lazily on the next query
+        sources = [columns.get(col_name, repeat(None, row_count)) for col_name in self.columns[2:]]
+        self.data.extend(map(list, zip(timestamps, locations, *sources)))
+    
+    def extend_columns(self, columns):
+        """
+        Set whole data columns for the rows already in the time series.
+        
+        Parameters:
+        columns (dict): Column name -> sequence of values with one value per
+                        existing row. Columns that do not exist yet are added,
+                        existing columns are overwritten
+        """
+        row_count = self.row_count()
+        for col_name, values in columns.items():
+            if len(values) != row_count:
+                raise ValueError(f"Expected {row_count} values for column '{col_name}', got {len(values)}")
+        
+        for col_name, values in columns.items():
+            self.add_column(col_name)
+            col_index = self.columns.index(col_name)
+            for row, value in zip(self.data, values):
+                if len(row) <= col_index:
+                    row.extend([None] * (col_index + 1 - len(row)))
+                row[col_index] = value
     
     def add_metadata(self, key, value):
         """
@@ -110,6 +204,110 @@ class TimeSeries:
         """
         self.metadata[key] = value
     
+    def invalidate_indexes(self):
+        """
+        Discard the timestamp and location indexes, they are rebuilt on next use.
+        
+        Only needed after rows have been modified in place, adding rows or
+        replacing the data table is detected automatically.
+        """
+        self._indexed_rows = 0
+        self._location_index = {}
+        self._time_keys = self._new_index_buffer()
+        self._time_order = self._new_index_buffer()
+        self._time_index_sorted = True
+    
+    def _new_index_buffer(self):
+        """Return an empty container for index keys or row offsets."""
+        return []
+    
+    def _key_getters(self):
+        """Return two callables mapping a row offset to its timestamp key and its location key."""
+        data = self.data
+        return (lambda i: data[i][0]), (lambda i: data[i][1])
+    
+    def _time_key(self, timestamp):
+        """Convert a timestamp to the key used in the timestamp index."""
+        return timestamp
+    
+    def _location_key(self, location):
+        """Convert a location to the key used in the location index."""
+        return location
+    
+    def _rows_at(self, offsets):
+        """Return the data rows at the given row offsets."""
+        data = self.data
+        return [data[i] for i in offsets]
+    
+    def _index_row(self, offset, time_key, location_key):
+        """Add a single row to the indexes, offset must be the next unindexed row."""
+        offsets = self._location_index.get(location_key)
+        if offsets is None:
+            offsets = self._new_index_buffer()
+            self._location_index[location_key] = offsets
+        offsets.append(offset)
+        
+        # Rows arriving in time order extend the timestamp index, anything else
+        # marks it for a rebuild on next use
+        if self._time_index_sorted:
+            if self._time_keys and time_key < self._time_keys[-1]:
+                self._time_index_sorted = False
+            else:
+                self._time_keys.append(time_key)
+                self._time_order.append(offset)
+        
+        self._indexed_rows = offset + 1
+    
+    def _index_block(self, first_offset, end_offset, time_key_at, location_key_at):
+        """Add the rows first_offset..end_offset-1 to the indexes in one pass."""
+        location_index = self._location_index
+        for offset in range(first_offset, end_offset):
+            location_key = location_key_at(offset)
+            offsets = location_index.get(location_key)
+            if offsets is None:
+                offsets = self._new_index_buffer()
+                location_index[location_key] = offsets
+            offsets.append(offset)
+        
+        if self._time_index_sorted:
+            new_keys = [time_key_at(offset) for offset in range(first_offset, end_offset)]
+            ordered = list(self._time_keys[-1:]) + new_keys
+            if all(earlier <= later for earlier, later in zip(ordered, ordered[1:])):
+                self._time_keys.extend(new_keys)
+                self._time_order.extend(range(first_offset, end_offset))
+            else:
+                self._time_index_sorted = False
+        
+        self._indexed_rows = end_offset
+    
+    def _ensure_indexes(self):
+        """Bring the timestamp and location indexes up to date with the data table."""
+        row_count = self.row_count()
+        if row_count < self._indexed_rows:
+            self.invalidate_indexes()
+        
+        time_key_at, location_key_at = self._key_getters()
+        if row_count > self._indexed_rows:
+            self._index_block(self._indexed_rows, row_count, time_key_at, location_key_at)
+        
+        if not self._time_index_sorted:
+            # Stable sort, rows with equal timestamps keep their insertion order
+            self._time_order = self._new_index_buffer()
+            self._time_order.extend(sorted(range(row_count), key=time_key_at))
+            self._time_keys = self._new_index_buffer()
+            self._time_keys.extend(time_key_at(i) for i in self._time_order)
+            self._time_index_sorted = True
+    
+    def get_locations(self):
+        """
+        Get the distinct location identifiers in order of first appearance.
+        
+        Returns:
+        list: The location identifiers
+        """
+        self._ensure_indexes()
+        return list(self._location_index.keys())
+    
     def get_data_by_location(self, location):
         """
         Filter data by location.
@@ -118,10 +316,13 @@ class TimeSeries:
         location: The location identifier to filter by
         
         Returns:
-        list: Filtered data rows for the specified location
+        list: Filtered data rows for the specified location, in insertion order
         """
-        location_idx = self.columns.index("location")
-        return [row for row in self.data if row[location_idx] == location]
+        self._ensure_indexes()
+        offsets = self._location_index.get(self._location_key(location))
+        if offsets is None:
+            return []
+        return self._rows_at(offsets)
     
     def get_data_by_timerange(self, start_time, end_time):
         """
@@ -132,11 +333,69 @@ class TimeSeries:
         end_time (datetime): The end time of the range
         
         Returns:
-        list: Filtered data rows for the specified time range
+        list: Filtered data rows for the specified time range, in timestamp order
+        """
+        self._ensure_indexes()
+        lower = bisect_left(self._time_keys, self._time_key(start_time))
+        upper = bisect_right(self._time_keys, self._time_key(end_time))
+        return self._rows_at(self._time_order[lower:upper])
+    
+    def get_sorted_offsets(self, location=None):
+        """
+        Get row offsets in timestamp order, rows with equal timestamps keep their insertion order.
+        
+        Parameters:
+        location (optional): Only return offsets of rows for this location
+        
+        Returns:
+        sequence: Row offsets into the data table, a new buffer the caller may change
+        """
+        self._ensure_indexes()
+        if location is None:
+            # A copy, the index itself must not be changed by the caller
+            return self._time_order[:]
+        offsets = self._location_index.get(self._location_key(location))
+        if offsets is None:
+            return self._new_index_buffer()
+        time_key_at, _ = self._key_getters()
+        sorted_offsets = self._new_index_buffer()
+        sorted_offsets.extend(sorted(offsets, key=time_key_at))
+        return sorted_offsets
+    
+    def get_sorted_data(self, location=None):
+        """
+        Get the data rows sorted by timestamp without re-sorting the whole table.
+        
+        Gives the same result as sorted(self.data, key=lambda row: row[0]).
+        
+        Parameters:
+        location (optional): Only return rows for this location
+        
+        Returns:
+        list: Data rows in timestamp order
         """
-        timestamp_idx = 0  # First column is always timestamp
-        return [row for row in self.data 
-                if start_time <= row[timestamp_idx] <= end_time]
+        if location is None:
+            self._ensure_indexes()
+            return self._rows_at(self._time_order)
+        return self._rows_at(self.get_sorted_offsets(location))
+    
+    def resample(self, step, how="mean", fill=None, **options):
+        """
+        Resample onto a regular time step, see resampleTimeSeries.resample_timeseries.
+        
+        Parameters:
+        step (int or timedelta): New time step in seconds, e.g. general.timeStep
+        how (str or dict): 'sum', 'mean', 'min', 'max' or 'last', for all data
+                           columns or as a {column: aggregation} dict
+        fill (str, optional): How empty bins are filled when upsampling: None, 'ffill' or 'linear'
+        **options: Further resample_timeseries arguments (origin, output_name, ...)
+        
+        Returns:
+        TimeSeries: The resampled time series, a RegularTimeSeries by default
+        """
+        # Imported here as resampleTimeSeries builds on this module
+        from resampleTimeSeries import resample_timeseries
+        return resample_timeseries(self, step, how=how, fill=fill, **options)
     
     def get_column_index(self, column_name):
         """
@@ -153,6 +412,19 @@ class TimeSeries:
         except ValueError:
             raise ValueError(f"Column '{column_name}' not found")
     
+    def row_count(self):
+        """
+        Get the number of data rows in the time series.
+        
+        Returns:
+        int: The number of rows
+        """
+        return len(self.data)
+    
+    def _iter_rows(self):
+        """Iterate over the data rows without building an intermediate list."""
+        return iter(self.data)
+    
     def to_dict(self):
         """
         Convert the data to a dictionary format.
@@ -162,7 +434,7 @@ class TimeSeries:
         """
         result = defaultdict(list)
         
-        for row in self.data:
+        for row in self._iter_rows():
             for i, col_name in enumerate(self.columns):
                 if i < len(row):
                     result[col_name].append(row[i])
@@ -200,7 +472,7 @@ class TimeSeries:
             # Write header
             writer.writerow(self.columns)
             # Write data rows with datetime objects converted to ISO format strings
-            for row in self.data:
+            for row in self._iter_rows():
                 formatted_row = []
                 for i, value in enumerate(row):
                     if i == 0 and isinstance(value, datetime.datetime):  # Convert timestamp
@@ -218,23 +490,35 @@ class TimeSeries:
     def __str__(self):
         """Return a string representation of the TimeSeries object."""
         name_info = f"TimeSeries '{self.name}'" if self.name else "Unnamed TimeSeries"
-        data_info = f"with {len(self.data)} rows and {len(self.columns)} columns"
+        data_info = f"with {self.row_count()} rows and {len(self.columns)} columns"
         meta_info = f"Metadata: {len(self.metadata)} entries"
         column_info = f"Columns: {', '.join(self.columns)}"
         return f"{name_info} {data_info}\n{column_info}\n{meta_info}"
     
+    def _iter_keys(self):
+        """Iterate over the (timestamp, location) key of every row."""
+        for row in self._iter_rows():
+            yield row[0], row[1]
+    
+    def _column_values(self, column_name):
+        """Return an indexable sequence of the values of one data column, in row order."""
+        col_index = self.columns.index(column_name)
+        return [row[col_index] if col_index < len(row) else None for row in self._iter_rows()]
+    
     @staticmethod
-    def merge(ts1, ts2, name=None):
+    def merge(ts1, ts2, name=None, how="outer"):
         """
         Merge two TimeSeries objects into a new one.
         
         This function creates a "backbone" of all timestamp/location combinations
         from both input TimeSeries, and merges their data columns and metadata.
+        See merge_many for the details.
         
         Parameters:
         ts1 (TimeSeries): First TimeSeries object
         ts2 (TimeSeries): Second TimeSeries object
         name (str, optional): Name for the merged TimeSeries
+        how (str): Join mode - 'outer' (default), 'inner' or 'left'
         
         Returns:
         TimeSeries: A new TimeSeries object containing merged data
@@ -242,77 +526,145 @@ class TimeSeries:
         if not isinstance(ts1, TimeSeries) or not isinstance(ts2, TimeSeries):
             raise TypeError("Both arguments must be TimeSeries objects")
         
-        # Create a new TimeSeries object (with a new UUID)
-        merged_ts = TimeSeries(name)
-        
-        # Store original UUIDs in metadata with source prefix keys
-        if "uuid" in ts1.metadata:
-            merged_ts.add_metadata("source_uuid_1", ts1.metadata["uuid"])
-        if "uuid" in ts2.metadata:
-            merged_ts.add_metadata("source_uuid_2", ts2.metadata["uuid"])
-        
-        # Merge metadata (skip "uuid" keys from original datasets as they're already stored)
-        for key, value in ts1.metadata.items():
-            if key != "uuid":
-                merged_ts.add_metadata(key, value)
-        for key, value in ts2.metadata.items():
-            if key != "uuid":
-                merged_ts.add_metadata(key, value)
-        
-        # Create a set of all column names (excluding timestamp and location)
-        data_columns = set()
-        for col in ts1.columns[2:]:  # Skip timestamp and location
-            data_columns.add(col)
-        for col in ts2.columns[2:]:  # Skip timestamp and location
-            data_columns.add(col)
-        
-        # Add all columns to the merged TimeSeries
-        for col in data_columns:
-            merged_ts.add_column(col)
-        
-        # Create a dictionary to store data points by (timestamp, location) tuple
-        data_points = {}
-        
-        # Process data from ts1
-        timestamp_idx1 = 0  # First column is always timestamp
-        location_idx1 = ts1.columns.index("location")
-        
-        for row in ts1.data:
-            timestamp = row[timestamp_idx1]
-            location = row[location_idx1]
-            key = (timestamp, location)
-            
-            # Create a dictionary to hold the values for this row
-            if key not in data_points:
-                data_points[key] = {col: None for col in data_columns}
-            
-            # Add values from this row to the data_points dictionary
-            for i, col_name in enumerate(ts1.columns):
-                if i > 1:  # Skip timestamp and location
-                    if i < len(row):
-                        data_points[key][col_name] = row[i]
-        
-        # Process data from ts2 (similarly)
-        timestamp_idx2 = 0  # First column is always timestamp
-        location_idx2 = ts2.columns.index("location")
-        
-        for row in ts2.data:
-            timestamp = row[timestamp_idx2]
-            location = row[location_idx2]
-            key = (timestamp, location)
-            
-            # Create or update the dictionary for this timestamp-location pair
-            if key not in data_points:
-                data_points[key] = {col: None for col in data_columns}
-            
-            # Add values from this row to the data_points dictionary
-            for i, col_name in enumerate(ts2.columns):
-                if i > 1:  # Skip timestamp and location
-                    if i < len(row) and row[i] is not None:
-                        data_points[key][col_name] = row[i]
+        return TimeSeries.merge_many([ts1, ts2], name=name, how=how)
+    
+    @classmethod
+    def merge_many(cls, series, name=None, how="outer"):
+        """
+        Merge any number of TimeSeries objects into a new one in a single pass.
+        
+        Rows are matched on their (timestamp, location) key with a hash join.
+        The join mode decides which keys appear in the result:
+        - 'outer': keys found in any of the inputs
+        - 'inner': keys found in all of the inputs
+        - 'left': keys found in the first input
+        
+        Keys appear in the order they are first seen. Data columns are the union of
+        the input columns in order of first appearance, each one is filled directly
+        in a preallocated buffer of the result class (_merge_buffer), typed arrays
+        for a ColumnarTimeSeries, which the result then holds without copying
+        (_from_merged). Where several inputs hold a value for the same
+        key and column the last non-missing value wins. The UUIDs of the inputs
+        are stored in metadata as source_uuid_1, source_uuid_2, ... and the
+        remaining metadata is merged in input order.
         
-        # Add all the data points to the merged TimeSeries
-        for (timestamp, location), values in data_points.items():
-            merged_ts.add_data(timestamp, location, values)
+        Parameters:
+        series (list): The TimeSeries objects to merge
+        name (str, optional): Name for the merged TimeSeries
+        how (str): Join mode - 'outer' (default), 'inner' or 'left'
         
-        return merged_ts
\ No newline at end of file
+        Returns:
+        TimeSeries: A new object of the class merge_many was called on
+        """
+        series = list(series)
+        if not series:
+            raise ValueError("At least one TimeSeries is required")
+        for ts in series:
+            if not isinstance(ts, TimeSeries):
+                raise TypeError("All arguments must be TimeSeries objects")
+        valid_modes = ["outer", "inner", "left"]
+        if how not in valid_modes:
+            raise ValueError(f"Invalid join mode '{how}'. Valid options are: {', '.join(valid_modes)}")
+        
+        # Union of the data columns (excluding timestamp and location)
+        data_columns = []
+        for ts in series:
+            for col in ts.columns[2:]:
+                if col not in data_columns:
+                    data_columns.append(col)
+        
+        # Build side of the hash join: map every key to a slot, recording the
+        # slot of each input row (-1 where the row does not take part)
+        slot_lookup = {}
+        keys = []
+        hit_count = array('q')
+        last_hit = array('q')
+        row_slots = []
+        for series_index, ts in enumerate(series):
+            adds_keys = how == "outer" or series_index == 0
+            slots = array('q')
+            for key in ts._iter_keys():
+                slot = slot_lookup.get(key)
+                if slot is None:
+                    if not adds_keys:
+                        slots.append(-1)
+                        continue
+                    slot = len(keys)
+                    slot_lookup[key] = slot
+                    keys.append(key)
+                    hit_count.append(0)
+                    last_hit.append(-1)
+                if last_hit[slot] != series_index:
+                    last_hit[slot] = series_index
+                    hit_count[slot] += 1
+                slots.append(slot)
+            row_slots.append(slots)
+        slot_lookup = None
+        
+        # Map slots to output rows, an inner join drops keys missing from any input
+        if how == "inner":
+            output_position = array('q', [-1]) * len(keys)
+            kept = 0
+            for slot in range(len(keys)):
+                if hit_count[slot] == len(series):
+                    output_position[slot] = kept
+                    kept += 1
+            keys = [key for slot, key in enumerate(keys) if output_position[slot] >= 0]
+        else:
+            output_position = array('q', range(len(keys)))
+        
+        # Probe side: scatter every input column straight into its output buffer
+        buffers = {col: cls._merge_buffer(len(keys)) for col in data_columns}
+        for ts, slots in zip(series, row_slots):
+            for col in ts.columns[2:]:
+                values = ts._column_values(col)
+                buffer = buffers[col]
+                for row_index, slot in enumerate(slots):
+                    if slot < 0:
+                        continue
+                    position = output_position[slot]
+                    value = values[row_index]
+                    # None and NaN both mark a missing value
+                    if position >= 0 and value is not None and value == value:
+                        try:
+                            buffer[position] = value
+                        except TypeError:
+                            raise TypeError(f"{cls.__name__} can only store numeric values, got {value!r}") from None
+        row_slots = None
+        
+        # Assemble the merged table, a new object with a new UUID
+        merged_ts = cls._from_merged(name, keys, buffers)
+        
+        # Store original UUIDs in metadata with source prefix keys, then the
+        # remaining metadata (skipping the "uuid" keys already stored)
+        for i, ts in enumerate(series):
+            if "uuid" in ts.metadata:
+                merged_ts.add_metadata(f"source_uuid_{i + 1}", ts.metadata["uuid"])
+        for ts in series:
+            for key, value in ts.metadata.items():
+                if key != "uuid":
+                    merged_ts.add_metadata(key, value)
+        
+        return merged_ts
+    
+    @classmethod
+    def _merge_buffer(cls, row_count):
+        """Return a buffer of row_count missing values for merge_many to fill."""
+        return [None] * row_count
+    
+    @classmethod
+    def _from_merged(cls, name, keys, buffers):
+        """
+        Create the result of merge_many.
+        
+        Parameters:
+        name (str): Name of the new TimeSeries
+        keys (list): (timestamp, location) key of every row
+        buffers (dict): Column name -> buffer from _merge_buffer, one value per row
+        
+        Returns:
+        TimeSeries: A new object of this class holding the rows
+        """
+        merged_ts = cls(name)
+        merged_ts.add_rows([key[0] for key in keys], [key[1] for key in keys], buffers)
+        return merged_ts
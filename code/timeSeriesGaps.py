@@ -0,0 +1,308 @@
+"""
+TimeSeries Gap Detection and Filling
+
+The time series schema (schemas/demoTimeSeries.json) has an allowGaps flag. The
+calculators skip rows with missing values, which silently breaks their state
+recurrences (the snowpack carries on as if the missing steps had never
+happened), so gaps should be found and dealt with before a series is used as
+driving data.
+
+Two kinds of gap are found, per location, in one sweep over the rows in
+timestamp order:
+1. Missing steps: consecutive rows further apart than the time step
+2. Missing values: runs of rows where a data column is None (or NaN)
+
+find_gaps returns a report and stores it in the "gap_report" metadata entry.
+check_allow_gaps raises when a series with allowGaps set to false has gaps.
+fill_gaps fills missing values in place, in the column buffers of a
+ColumnarTimeSeries or the rows of a TimeSeries. Missing steps have no row to
+write into, convert the series with RegularTimeSeries.from_timeseries first to
+turn them into missing values that can be filled.
+
+Fill methods:
+- 'linear': interpolated in time between the values either side of the run
+- 'persistence': the last value before the run is carried forward
+- 'climatology': the mean of the location's values at the same day of year and
+  time of day in other years (values of the run's own year are not used)
+Values that cannot be filled (e.g. a run at the start of the series for
+'linear' and 'persistence') are left missing and counted as unfilled.
+"""
+
+from array import array
+
+from columnarTimeSeries import ColumnarTimeSeries, to_epoch_seconds, from_epoch_seconds
+from regularTimeSeries import RegularTimeSeries, infer_step_seconds
+from solarGeometry import day_of_year
+
+FILL_METHODS = ("linear", "persistence", "climatology")
+
+
+def _epoch_times(ts):
+    """Return the timestamp of every row as seconds since the epoch."""
+    if isinstance(ts, ColumnarTimeSeries):
+        return ts.get_timestamp_array()
+    return array('q', [to_epoch_seconds(key[0]) for key in ts._iter_keys()])
+
+
+def _data_columns(ts, columns):
+    """Return the data columns to work on, checking that they exist."""
+    if columns is None:
+        return list(ts.columns[2:])
+    for col_name in columns:
+        if col_name not in ts.columns[2:]:
+            raise ValueError(f"Column '{col_name}' not found")
+    return list(columns)
+
+
+def _time_step(ts, times, step):
+    """Return the time step in seconds, from the argument, the series or the timestamps."""
+    if step is not None:
+        return step
+    if isinstance(ts, RegularTimeSeries):
+        return ts.step_seconds
+    if ts.metadata.get("time_step"):
+        return ts.metadata["time_step"]
+    try:
+        return infer_step_seconds(times)
+    except ValueError:
+        # A single timestamp has no step and no missing steps
+        return None
+
+
+def _gap_entry(start, end, count):
+    return {"start": from_epoch_seconds(start).isoformat(), "end": from_epoch_seconds(end).isoformat(),
+            "count": count}
+
+
+def find_gaps(ts, columns=None, step=None):
+    """
+    Find missing steps and runs of missing values, per location.
+
+    Parameters:
+    ts (TimeSeries): The TimeSeries to analyse
+    columns (list, optional): Data columns to check, defaults to all
+    step (int, optional): Time step in seconds. Defaults to the step of a
+                          RegularTimeSeries, the "time_step" metadata entry or the
+                          smallest spacing between timestamps
+
+    Returns:
+    dict: The gap report, also stored in the "gap_report" metadata entry:
+          {"time_step": seconds,
+           "missing_steps": total, "missing_values": {column: total},
+           "locations": {location: {"missing_steps": [gap, ...],
+                                    "missing_values": {column: [gap, ...]}}}}
+          where each gap is {"start": ISO timestamp, "end": ISO timestamp, "count": n}
+    """
+    columns = _data_columns(ts, columns)
+    times = _epoch_times(ts)
+    step = _time_step(ts, times, step)
+    column_values = [ts._column_values(col_name) for col_name in columns]
+
+    report = {
+        "time_step": step,
+        "missing_steps": 0,
+        "missing_values": {col_name: 0 for col_name in columns},
+        "locations": {},
+    }
+    for location in ts.get_locations():
+        missing_steps = []
+        missing_values = {col_name: [] for col_name in columns}
+        run_starts = [None] * len(columns)
+        run_ends = [None] * len(columns)
+        run_counts = [0] * len(columns)
+        previous_time = None
+
+        for i in ts.get_sorted_offsets(location):
+            time = times[i]
+            if step and previous_time is not None and time - previous_time > step:
+                count = -(-(time - previous_time) // step) - 1
+                missing_steps.append(_gap_entry(previous_time + step, time - step, count))
+                report["missing_steps"] += count
+            previous_time = time
+
+            for j, values in enumerate(column_values):
+                value = values[i]
+                # x != x is True for NaN
+                if value is None or value != value:
+                    if run_starts[j] is None:
+                        run_starts[j] = time
+                        run_counts[j] = 0
+                    run_ends[j] = time
+                    run_counts[j] += 1
+                elif run_starts[j] is not None:
+                    missing_values[columns[j]].append(_gap_entry(run_starts[j], run_ends[j], run_counts[j]))
+                    report["missing_values"][columns[j]] += run_counts[j]
+                    run_starts[j] = None
+
+        for j, col_name in enumerate(columns):
+            if run_starts[j] is not None:
+                missing_values[col_name].append(_gap_entry(run_starts[j], run_ends[j], run_counts[j]))
+                report["missing_values"][col_name] += run_counts[j]
+
+        report["locations"][location] = {"missing_steps": missing_steps, "missing_values": missing_values}
+
+    ts.add_metadata("gap_report", report)
+    return report
+
+
+def check_allow_gaps(ts, report=None):
+    """
+    Check a TimeSeries against its allowGaps flag.
+
+    Series without an allowGaps metadata entry are allowed to have gaps.
+
+    Parameters:
+    ts (TimeSeries): The TimeSeries to check
+    report (dict, optional): Report from find_gaps, computed if not given
+
+    Returns:
+    dict: The gap report
+
+    Raises:
+    ValueError: If allowGaps is false and the series has missing steps or values
+    """
+    if report is None:
+        report = find_gaps(ts)
+    if ts.metadata.get("allowGaps", True) is False:
+        missing_values = sum(report["missing_values"].values())
+        if report["missing_steps"] or missing_values:
+            raise ValueError(f"TimeSeries '{ts.name}' does not allow gaps but has {report['missing_steps']} "
+                             f"missing steps and {missing_values} missing values")
+    return report
+
+
+def _column_setter(ts, col_name):
+    """Return a callable writing one value of a data column in place."""
+    if isinstance(ts, ColumnarTimeSeries):
+        return ts._buffer(col_name).__setitem__
+    rows = ts.data
+    col_index = ts.columns.index(col_name)
+
+    def set_value(i, value):
+        row = rows[i]
+        if len(row) <= col_index:
+            row.extend([None] * (col_index + 1 - len(row)))
+        row[col_index] = value
+    return set_value
+
+
+def _climatology_key(seconds):
+    """Day of year and second of day of a timestamp."""
+    timestamp = from_epoch_seconds(seconds)
+    return day_of_year(timestamp), timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second
+
+
+def fill_gaps(ts, method="linear", columns=None, max_gap=None):
+    """
+    Fill runs of missing values in place.
+
+    Parameters:
+    ts (TimeSeries): The TimeSeries to fill, row based, columnar or regular
+    method (str): 'linear', 'persistence' or 'climatology'
+    columns (list, optional): Data columns to fill, defaults to all
+    max_gap (int, optional): Only fill runs of at most this many missing values
+
+    Returns:
+    dict: Summary {"method": method, "max_gap": max_gap, "filled": {column: n},
+          "unfilled": {column: n}}, also stored in the "gap_fill" metadata entry
+
+    Raises:
+    ValueError: If the method is unknown
+    """
+    if method not in FILL_METHODS:
+        raise ValueError(f"Unknown fill method '{method}'. Valid options are: {', '.join(FILL_METHODS)}")
+    columns = _data_columns(ts, columns)
+    times = _epoch_times(ts)
+    summary = {
+        "method": method,
+        "max_gap": max_gap,
+        "filled": {col_name: 0 for col_name in columns},
+        "unfilled": {col_name: 0 for col_name in columns},
+    }
+
+    for col_name in columns:
+        values = ts._column_values(col_name)
+        set_value = _column_setter(ts, col_name)
+        for location in ts.get_locations():
+            offsets = ts.get_sorted_offsets(location)
+            row_count = len(offsets)
+
+            if method == "climatology":
+                # Totals over all years and per year, so a year's own values can be left out
+                totals = {}
+                counts = {}
+                year_totals = {}
+                year_counts = {}
+                for i in offsets:
+                    value = values[i]
+                    if value is not None and value == value:
+                        key = _climatology_key(times[i])
+                        year_key = (key, from_epoch_seconds(times[i]).year)
+                        totals[key] = totals.get(key, 0.0) + value
+                        counts[key] = counts.get(key, 0) + 1
+                        year_totals[year_key] = year_totals.get(year_key, 0.0) + value
+                        year_counts[year_key] = year_counts.get(year_key, 0) + 1
+
+                def climatology(seconds):
+                    key = _climatology_key(seconds)
+                    year_key = (key, from_epoch_seconds(seconds).year)
+                    count = counts.get(key, 0) - year_counts.get(year_key, 0)
+                    if count == 0:
+                        return None
+                    return (totals[key] - year_totals.get(year_key, 0.0)) / count
+
+            k = 0
+            while k < row_count:
+                value = values[offsets[k]]
+                if value is not None and value == value:
+                    k += 1
+                    continue
+                run_start = k
+                while k < row_count and (values[offsets[k]] is None or values[offsets[k]] != values[offsets[k]]):
+                    k += 1
+                if max_gap is not None and k - run_start > max_gap:
+                    summary["unfilled"][col_name] += k - run_start
+                    continue
+
+                before = offsets[run_start - 1] if run_start > 0 else None
+                after = offsets[k] if k < row_count else None
+                for position in range(run_start, k):
+                    i = offsets[position]
+                    if method == "climatology":
+                        fill_value = climatology(times[i])
+                    elif before is None:
+                        fill_value = None
+                    elif method == "persistence":
+                        fill_value = values[before]
+                    elif after is None:
+                        fill_value = None
+                    elif times[after] == times[before]:
+                        # Duplicate timestamps either side of the run, no time to interpolate over
+                        fill_value = values[before]
+                    else:
+                        fill_value = values[before] + (values[after] - values[before]) * \
+                            (times[i] - times[before]) / (times[after] - times[before])
+                    if fill_value is None:
+                        summary["unfilled"][col_name] += 1
+                    else:
+                        set_value(i, fill_value)
+                        summary["filled"][col_name] += 1
+
+    ts.add_metadata("gap_fill", summary)
+    return summary
+
+
+# Example usage:
+if __name__ == "__main__":
+    import datetime
+
+    ts = RegularTimeSeries("gap_example", step=86400)
+    start = datetime.datetime(2020, 1, 1)
+    ts.add_rows([start + datetime.timedelta(days=d) for d in range(10) if d not in (3, 4, 7)], "reach_1",
+                {"flow": [float(d) for d in range(10) if d not in (3, 4, 7)]})
+    ts.add_metadata("allowGaps", False)
+    report = find_gaps(ts)
+    print("Missing values:", report["missing_values"])
+    print(fill_gaps(ts, method="linear"))
+    check_allow_gaps(ts)
+    print([row[2] for row in ts.data])
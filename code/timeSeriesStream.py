@@ -0,0 +1,388 @@
+"""
+Streaming TimeSeries Reader
+
+This module reads driving data files in bounded memory. Instead of loading a whole
+file into one TimeSeries, each reader is a generator that yields a sequence of
+TimeSeries chunks, cut either every chunk_rows rows, at the edges of fixed time
+windows of length chunk_period, or at whichever of the two comes first.
+
+Supported inputs are TimeSeries CSV files, DAT files, block-structured files and
+OBS files. Every chunk has the same columns, name and metadata, plus a
+"chunk_index" metadata entry, so chunks can be fed one at a time through the
+calculators or a model run:
+
+    for chunk in iter_csv_chunks("driving_data.csv", chunk_period=timedelta(days=365)):
+        output = simulate_soil_temperature(chunk, parameters)
+        ...
+
+Time windows are aligned to window_origin (by default the first timestamp in the
+file). A row outside the current window always starts a new chunk, so files that
+are not in time order give more, smaller chunks rather than wrong ones.
+"""
+
+import csv
+import datetime
+import os
+import re
+from itertools import islice
+
+from timeSeries import TimeSeries
+from loadTimeSeriesFromcsv import _build_timestamp_parser, _name_data_columns, _convert_csv_rows
+from dat_to_timeseries_processor import iter_dat_values
+from block_data_to_timeseries import iter_block_rows
+from obs_to_timeseries_converter import iter_obs_records, list_obs_parameters
+
+# Number of rows read and converted together when no smaller chunk is asked for
+DEFAULT_BATCH_ROWS = 10000
+
+
+def _check_chunking(chunk_rows, chunk_period):
+    """Raise a ValueError unless at least one valid chunk size is given."""
+    if chunk_rows is None and chunk_period is None:
+        raise ValueError("Either chunk_rows or chunk_period must be given")
+    if chunk_rows is not None and chunk_rows < 1:
+        raise ValueError("chunk_rows must be at least 1")
+    if chunk_period is not None and chunk_period <= datetime.timedelta(0):
+        raise ValueError("chunk_period must be a positive timedelta")
+
+
+def _batch_size(chunk_rows):
+    """Number of rows to read per batch, never more than one chunk."""
+    return min(chunk_rows, DEFAULT_BATCH_ROWS) if chunk_rows else DEFAULT_BATCH_ROWS
+
+
+def _split_into_chunks(blocks, data_columns, make_chunk, chunk_rows=None,
+                       chunk_period=None, window_origin=None):
+    """
+    Re-cut a stream of row blocks into chunks of rows or time windows.
+
+    Parameters:
+    blocks (iterable): (timestamps, locations, values_by_column) tuples, each holding
+                       lists of equal length
+    data_columns (list): Names of the data columns in values_by_column
+    make_chunk (callable): Function taking (chunk_index, timestamps, locations,
+                           values_by_column) and returning a TimeSeries
+    chunk_rows (int, optional): Maximum number of rows per chunk
+    chunk_period (timedelta, optional): Length of the time window of each chunk
+    window_origin (datetime, optional): Start of the first time window
+
+    Yields:
+    TimeSeries: One chunk at a time
+    """
+    pending_times = []
+    pending_locations = []
+    pending_values = {col_name: [] for col_name in data_columns}
+    chunk_index = 0
+    window_start = window_end = None
+
+    def set_window(timestamp):
+        nonlocal window_origin, window_start, window_end
+        if window_origin is None:
+            window_origin = timestamp
+        window_start = window_origin + ((timestamp - window_origin) // chunk_period) * chunk_period
+        window_end = window_start + chunk_period
+
+    for times, locations, values in blocks:
+        i = 0
+        while i < len(times):
+            end = len(times)
+            if chunk_rows is not None:
+                end = min(end, i + chunk_rows - len(pending_times))
+
+            # Stop at the first row outside the current time window
+            boundary = False
+            if chunk_period is not None:
+                if window_start is None:
+                    set_window(times[i])
+                j = i
+                while j < end and window_start <= times[j] < window_end:
+                    j += 1
+                if j < end:
+                    boundary = True
+                    end = j
+
+            pending_times.extend(times[i:end])
+            pending_locations.extend(locations[i:end])
+            for col_name in data_columns:
+                pending_values[col_name].extend(values[col_name][i:end])
+            i = end
+
+            if boundary or len(pending_times) == chunk_rows:
+                if pending_times:
+                    yield make_chunk(chunk_index, pending_times, pending_locations, pending_values)
+                    chunk_index += 1
+                pending_times = []
+                pending_locations = []
+                pending_values = {col_name: [] for col_name in data_columns}
+                if boundary:
+                    set_window(times[i])
+
+    if pending_times:
+        yield make_chunk(chunk_index, pending_times, pending_locations, pending_values)
+
+
+def _chunk_factory(name, columns, metadata, timeseries_class):
+    """
+    Build the make_chunk function used by _split_into_chunks.
+
+    Parameters:
+    name (str): Name given to every chunk
+    columns (list): Timestamp and location column names, or None for the defaults
+    metadata (dict): Metadata copied into every chunk
+    timeseries_class (type): TimeSeries class to populate
+
+    Returns:
+    callable: Function creating one chunk
+    """
+    def make_chunk(chunk_index, timestamps, locations, values_by_column):
+        ts = timeseries_class(name=name)
+        if columns is not None:
+            ts.columns = list(columns)
+        for key, value in metadata.items():
+            ts.add_metadata(key, value)
+        ts.add_metadata("chunk_index", chunk_index)
+        ts.add_rows(timestamps, locations, values_by_column)
+        return ts
+
+    return make_chunk
+
+
+def iter_csv_chunks(csv_filename, chunk_rows=None, chunk_period=None, window_origin=None,
+                    timestamp_format="%Y-%m-%d %H:%M:%S", timestamp_col=0, location_col=1,
+                    header=True, metadata_rows=0, timeseries_class=TimeSeries,
+                    sample_rows=100, logger=None):
+    """
+    Read a TimeSeries CSV file as a sequence of chunks.
+
+    Rows are read and converted in batches exactly as load_timeseries_from_csv_fast
+    does, so at most one chunk plus one batch of rows is held in memory. Rows with
+    too few fields or an unparseable timestamp are skipped and reported once when
+    the file is finished.
+
+    Parameters:
+    csv_filename (str): Path to the CSV file
+    chunk_rows (int, optional): Maximum number of rows per chunk
+    chunk_period (timedelta, optional): Length of the time window of each chunk
+    window_origin (datetime, optional): Start of the first time window
+    timestamp_format (str): Format string for non-ISO timestamps with a time part
+    timestamp_col (int): Index of the timestamp column (default is 0)
+    location_col (int): Index of the location column (default is 1)
+    header (bool): Whether the CSV file has a header row
+    metadata_rows (int): Number of "key,value" metadata rows at the start of the file
+    timeseries_class (type): TimeSeries class to populate (default is TimeSeries)
+    sample_rows (int): Number of rows used to detect the timestamp format
+    logger (callable, optional): Function to log messages, they are printed if not given
+
+    Yields:
+    TimeSeries: One chunk at a time
+    """
+    def log(message):
+        if logger:
+            logger(message)
+        else:
+            print(message)
+
+    _check_chunking(chunk_rows, chunk_period)
+    batch_rows = _batch_size(chunk_rows)
+    skipped = {"short": 0, "bad": 0}
+
+    with open(csv_filename, 'r', newline='') as csv_file:
+        metadata = {"source_file": csv_filename}
+        for _ in range(metadata_rows):
+            line = csv_file.readline().strip()
+            if ',' in line:
+                key, value = line.split(',', 1)
+                metadata[key.strip()] = value.strip()
+
+        csv_reader = csv.reader(csv_file)
+
+        columns = []
+        if header:
+            try:
+                columns = next(csv_reader)
+            except StopIteration:
+                raise ValueError("CSV file is empty or contains only metadata")
+            if len(columns) <= max(timestamp_col, location_col):
+                raise ValueError("CSV header does not have enough columns for timestamp and location")
+
+        # The first batch fixes the timestamp parser and the data columns
+        first_batch = list(islice(csv_reader, batch_rows))
+        min_length = max(timestamp_col, location_col) + 1
+        samples = [row[timestamp_col].strip() for row in first_batch[:sample_rows] if len(row) >= min_length]
+        parse, swapped = _build_timestamp_parser(samples, timestamp_format)
+        width = max((len(row) for row in first_batch), default=0)
+        data_columns = _name_data_columns(columns, width, timestamp_col, location_col)
+
+        def blocks():
+            rows = first_batch
+            while rows:
+                timestamps, locations, values_by_column, short_count, bad_count = _convert_csv_rows(
+                    rows, parse, data_columns, timestamp_col, location_col, swapped)
+                skipped["short"] += short_count
+                skipped["bad"] += bad_count
+                yield timestamps, locations, values_by_column
+                rows = list(islice(csv_reader, batch_rows))
+
+        make_chunk = _chunk_factory(
+            os.path.splitext(os.path.basename(csv_filename))[0],
+            ["timestamp", "location"] if header else None,
+            metadata,
+            timeseries_class
+        )
+        yield from _split_into_chunks(blocks(), [col_name for _, col_name in data_columns],
+                                      make_chunk, chunk_rows, chunk_period, window_origin)
+
+    if skipped["short"] or skipped["bad"]:
+        log(f"Skipped {skipped['short'] + skipped['bad']} rows: {skipped['short']} with too few fields, "
+            f"{skipped['bad']} with invalid timestamps")
+
+
+def _batched_records(records, batch_rows, data_columns):
+    """
+    Turn (timestamp, location, values) records into column blocks.
+
+    Parameters:
+    records (iterable): (timestamp, location, values) tuples, values is a list in
+                        data_columns order, missing trailing values become None
+    batch_rows (int): Number of records per block
+    data_columns (list): Names of the data columns
+
+    Yields:
+    tuple: (timestamps, locations, values_by_column)
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_rows))
+        if not batch:
+            return
+        values_by_column = {}
+        for i, col_name in enumerate(data_columns):
+            values_by_column[col_name] = [values[i] if i < len(values) else None for _, _, values in batch]
+        yield [timestamp for timestamp, _, _ in batch], [location for _, location, _ in batch], values_by_column
+
+
+def iter_dat_chunks(input_file, start_datetime, timestep_seconds, column_names, chunk_rows=None,
+                    chunk_period=None, window_origin=None, location_id="default",
+                    timeseries_class=TimeSeries):
+    """
+    Read a DAT file as a sequence of TimeSeries chunks.
+
+    Parameters:
+    input_file (str): Path to the DAT file
+    start_datetime (datetime): Timestamp of the first data line
+    timestep_seconds (float): Time step in seconds between data lines
+    column_names (list): Names of the data columns
+    chunk_rows (int, optional): Maximum number of rows per chunk
+    chunk_period (timedelta, optional): Length of the time window of each chunk
+    window_origin (datetime, optional): Start of the first time window
+    location_id (str): Location identifier for every row (default: "default")
+    timeseries_class (type): TimeSeries class to populate (default is TimeSeries)
+
+    Yields:
+    TimeSeries: One chunk at a time
+    """
+    _check_chunking(chunk_rows, chunk_period)
+    step = datetime.timedelta(seconds=timestep_seconds)
+    records = ((start_datetime + i * step, location_id, values)
+               for i, values in enumerate(iter_dat_values(input_file)))
+    metadata = {
+        "source_file": input_file,
+        "start_date": start_datetime.isoformat(),
+        "time_increment_seconds": timestep_seconds,
+    }
+    make_chunk = _chunk_factory(os.path.splitext(os.path.basename(input_file))[0], None,
+                                metadata, timeseries_class)
+    yield from _split_into_chunks(_batched_records(records, _batch_size(chunk_rows), column_names),
+                                  column_names, make_chunk, chunk_rows, chunk_period, window_origin)
+
+
+def iter_block_chunks(input_file, start_datetime, timestep_seconds, column_names, chunk_rows=None,
+                      chunk_period=None, window_origin=None, timeseries_class=TimeSeries,
+                      logger=None):
+    """
+    Read a block-structured file as a sequence of TimeSeries chunks.
+
+    As in convert_blocks_to_timeseries, time runs on across blocks and the block ID
+    is used as the location.
+
+    Parameters:
+    input_file (str): Path to the block-structured file
+    start_datetime (datetime): Timestamp of the first data row
+    timestep_seconds (float): Time step in seconds between data rows
+    column_names (list): Names of the data columns
+    chunk_rows (int, optional): Maximum number of rows per chunk
+    chunk_period (timedelta, optional): Length of the time window of each chunk
+    window_origin (datetime, optional): Start of the first time window
+    timeseries_class (type): TimeSeries class to populate (default is TimeSeries)
+    logger (callable, optional): Function to log messages
+
+    Yields:
+    TimeSeries: One chunk at a time
+    """
+    _check_chunking(chunk_rows, chunk_period)
+    step = datetime.timedelta(seconds=timestep_seconds)
+    records = ((start_datetime + i * step, block_id, data_row)
+               for i, (block_id, data_row) in enumerate(iter_block_rows(input_file, logger)))
+    metadata = {
+        "source_file": input_file,
+        "start_datetime": start_datetime.isoformat(),
+        "timestep_seconds": timestep_seconds,
+    }
+    make_chunk = _chunk_factory(os.path.splitext(os.path.basename(input_file))[0], None,
+                                metadata, timeseries_class)
+    yield from _split_into_chunks(_batched_records(records, _batch_size(chunk_rows), column_names),
+                                  column_names, make_chunk, chunk_rows, chunk_period, window_origin)
+
+
+def iter_obs_chunks(input_file, chunk_rows=None, chunk_period=None, window_origin=None,
+                    timeseries_class=TimeSeries, logger=None):
+    """
+    Read an OBS file as a sequence of TimeSeries chunks.
+
+    The chunks have one column per parameter, like get_merged_timeseries, and each
+    row holds the value of a single observation. The parameters are found with a
+    quick scan of the header lines before the data is read. OBS files are ordered
+    by location and parameter, so time windows restart for each section.
+
+    Parameters:
+    input_file (str): Path to the OBS file
+    chunk_rows (int, optional): Maximum number of rows per chunk
+    chunk_period (timedelta, optional): Length of the time window of each chunk
+    window_origin (datetime, optional): Start of the first time window
+    timeseries_class (type): TimeSeries class to populate (default is TimeSeries)
+    logger (callable, optional): Function to log messages
+
+    Yields:
+    TimeSeries: One chunk at a time
+    """
+    _check_chunking(chunk_rows, chunk_period)
+    parameters = list_obs_parameters(input_file)
+    column_names = [re.sub(r'[^a-zA-Z0-9_-]', '_', parameter) for parameter in parameters]
+    position = {parameter: i for i, parameter in enumerate(parameters)}
+
+    def records():
+        for location, parameter, date_obj, value in iter_obs_records(input_file, logger):
+            values = [None] * len(parameters)
+            values[position[parameter]] = value
+            yield date_obj, location, values
+
+    metadata = {"source_file": input_file, "source_type": "OBS File"}
+    for parameter, col_name in zip(parameters, column_names):
+        metadata[f"parameter_{col_name}"] = parameter
+    make_chunk = _chunk_factory(os.path.splitext(os.path.basename(input_file))[0], None,
+                                metadata, timeseries_class)
+    yield from _split_into_chunks(_batched_records(records(), _batch_size(chunk_rows), column_names),
+                                  column_names, make_chunk, chunk_rows, chunk_period, window_origin)
+
+
+# Example usage:
+if __name__ == "__main__":
+    with open("stream_example.csv", "w", newline="") as f:
+        f.write("timestamp,location,air_temperature\n")
+        start = datetime.datetime(2020, 1, 1)
+        for i in range(24 * 10):
+            f.write(f"{(start + datetime.timedelta(hours=i)).isoformat()},site_1,{i % 24}\n")
+
+    # One chunk per day
+    for chunk in iter_csv_chunks("stream_example.csv", chunk_period=datetime.timedelta(days=1)):
+        print(chunk.metadata["chunk_index"], chunk.row_count(), chunk.data[0][0], chunk.data[-1][0])
@@ -0,0 +1,371 @@
+"""
+Streaming TimeSeries Writer
+
+TimeSeriesWriter writes model and calculator outputs as they are produced instead
+of collecting them in one TimeSeries and calling save_to_files at the end. The
+output files are opened once, rows are buffered in memory and written out
+whenever the row budget (flush_rows) or the time budget (flush_seconds) is used
+up, so a long run holds at most one buffer of rows. Every flush is fsynced.
+
+Two output formats are supported:
+1. "csv": the same CSV and JSON pair written by TimeSeries.save_to_files. The JSON
+   metadata is rewritten on every flush with "complete": false and finalised with
+   the row count, time range and "complete": true on close. A crash only loses the
+   rows written since the last flush.
+2. "binary": a binaryTimeSeries container. Rows are spooled to one temporary file
+   per column (<base_name>.tsb.<column index>.part) while writing and assembled into the
+   container on close. Until then there is no readable container: after a crash
+   the flushed rows are only in the raw spool files.
+
+When a with block is left by an exception the output is finalised with
+"complete": false instead of true (abort), so a reader can tell a partial
+output from a finished one.
+"""
+
+import csv
+import datetime
+import json
+import os
+import shutil
+import time
+import uuid
+from array import array
+
+from timeSeries import TimeSeries
+from columnarTimeSeries import MISSING, to_epoch_seconds
+from binaryTimeSeries import _padding, _write_header
+
+
+class TimeSeriesWriter:
+    """
+    Incremental writer for TimeSeries outputs.
+
+    Rows can be written one at a time (write_row), as column blocks (write_rows)
+    or as whole TimeSeries chunks (write_timeseries), for example the outputs of a
+    calculator applied to the chunks of timeSeriesStream. The columns are fixed
+    when the writer is created. Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, base_name, columns, metadata=None, name=None, file_format="csv",
+                 flush_rows=1000, flush_seconds=None):
+        """
+        Open the output files and write the CSV header.
+
+        Parameters:
+        base_name (str): Base name for the output files (without extension)
+        columns (list): All column names, timestamp and location column first
+        metadata (dict, optional): Metadata written to the JSON file or binary header
+        name (str, optional): Name stored in the binary header (default is base_name)
+        file_format (str): "csv" for a CSV and JSON pair, "binary" for a binary container
+        flush_rows (int): Write the buffered rows out once this many have been added
+        flush_seconds (float, optional): Also write them out once this many seconds
+                                         have passed since the last flush
+
+        Raises:
+        ValueError: If the file format is unknown, there are too few columns or
+                    flush_rows is not a positive integer
+        """
+        if file_format not in ("csv", "binary"):
+            raise ValueError(f"Unknown file format '{file_format}', use 'csv' or 'binary'")
+        if len(columns) < 2:
+            raise ValueError("columns must include the timestamp and location columns")
+        if not isinstance(flush_rows, int) or isinstance(flush_rows, bool) or flush_rows < 1:
+            raise ValueError(f"flush_rows must be a positive integer, got {flush_rows!r}")
+
+        self.base_name = base_name
+        self.name = name or base_name
+        self.columns = list(columns)
+        self.metadata = dict(metadata or {})
+        self.file_format = file_format
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        self.row_count = 0
+        self.start_time = None
+        self.end_time = None
+        self.closed = False
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._column_positions = {col_name: i for i, col_name in enumerate(self.columns[2:])}
+
+        if file_format == "csv":
+            self.csv_filename = f"{base_name}.csv"
+            self.json_filename = f"{base_name}.json"
+            self._csv_file = open(self.csv_filename, 'w', newline='')
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow(self.columns)
+        else:
+            self.binary_filename = f"{base_name}.tsb"
+            self._locations = []
+            self._location_lookup = {}
+            self._time_sorted = True
+            self._last_epoch = None
+            self._spool_names = [f"{self.binary_filename}.{i}.part" for i in range(len(self.columns))]
+            self._spools = [open(spool_name, 'wb') for spool_name in self._spool_names]
+
+    @classmethod
+    def for_timeseries(cls, ts, base_name=None, **options):
+        """
+        Create a writer with the columns, name and metadata of an existing TimeSeries.
+
+        Parameters:
+        ts (TimeSeries): Template TimeSeries, its rows are not written
+        base_name (str, optional): Base name for the output files (default is ts.name)
+        **options: Further TimeSeriesWriter arguments (file_format, flush_rows, ...)
+
+        Returns:
+        TimeSeriesWriter: The new writer
+        """
+        base_name = base_name or ts.name
+        if not base_name:
+            raise ValueError("No name provided for output files and TimeSeries object has no name")
+        return cls(base_name, ts.columns, metadata=ts.metadata, name=ts.name, **options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_metadata(self, key, value):
+        """
+        Add or update a metadata entry, written out on the next flush or on close.
+
+        Parameters:
+        key (str): The metadata key
+        value: The metadata value
+        """
+        self.metadata[key] = value
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError("TimeSeriesWriter is closed")
+
+    def _row_values(self, values):
+        """Order one row's values by column, accepting a list or a {column: value} dict."""
+        if isinstance(values, dict):
+            row_values = [None] * (len(self.columns) - 2)
+            for col_name, value in values.items():
+                if col_name not in self._column_positions:
+                    raise ValueError(f"Column '{col_name}' is not one of the writer's columns")
+                row_values[self._column_positions[col_name]] = value
+            return row_values
+        if len(values) > len(self.columns) - 2:
+            raise ValueError(f"Expected at most {len(self.columns) - 2} values, got {len(values)}")
+        return list(values) + [None] * (len(self.columns) - 2 - len(values))
+
+    def write_row(self, timestamp, location, values):
+        """
+        Write one row.
+
+        Parameters:
+        timestamp (datetime): The timestamp of the row
+        location (str): Location identifier
+        values (list or dict): Data values in column order, or a {column: value} dict
+
+        Raises:
+        TypeError: If the timestamp is not a datetime
+        """
+        self._check_open()
+        if not isinstance(timestamp, datetime.datetime):
+            raise TypeError("Timestamp must be a datetime object")
+        self._buffer.append([timestamp, location] + self._row_values(values))
+        self._maybe_flush()
+
+    def write_rows(self, timestamps, locations, columns):
+        """
+        Write a block of rows, taking the same arguments as TimeSeries.add_rows.
+
+        Parameters:
+        timestamps (list): The timestamps of the new rows
+        locations (str or list): One location for all rows, or one per row
+        columns (dict): Column name -> list of values, columns not given are None
+        """
+        self._check_open()
+        for col_name in columns:
+            if col_name not in self._column_positions:
+                raise ValueError(f"Column '{col_name}' is not one of the writer's columns")
+        block = TimeSeries()
+        block.add_rows(timestamps, locations, columns)
+        positions = [block.columns.index(col_name) if col_name in block.columns else None
+                     for col_name in self.columns[2:]]
+        for row in block.data:
+            self._buffer.append(row[:2] + [row[i] if i is not None else None for i in positions])
+            if len(self._buffer) >= self.flush_rows:
+                self.flush()
+        self._maybe_flush()
+
+    def write_timeseries(self, ts):
+        """
+        Write all rows of a TimeSeries, matching its data columns by name.
+
+        Parameters:
+        ts (TimeSeries): The TimeSeries to append, for example one output chunk
+        """
+        self._check_open()
+        positions = []
+        for col_name in self.columns[2:]:
+            positions.append(ts.columns.index(col_name) if col_name in ts.columns[2:] else None)
+        for col_name in ts.columns[2:]:
+            if col_name not in self._column_positions:
+                raise ValueError(f"Column '{col_name}' is not one of the writer's columns")
+        for row in ts._iter_rows():
+            self._buffer.append(row[:2] + [row[i] if i is not None and i < len(row) else None
+                                           for i in positions])
+            if len(self._buffer) >= self.flush_rows:
+                self.flush()
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        """Flush when the row or time budget is used up."""
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+        elif self.flush_seconds is not None and time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows to disk and update the metadata file.
+
+        The row count and time range only change once the rows have been written,
+        so rows that cannot be written (e.g. a non-numeric value in a binary
+        output) are dropped with the error and leave the output consistent.
+
+        Raises:
+        ValueError: If a binary output row has a value that is not a number
+        """
+        self._check_open()
+        rows = self._buffer
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+        if self.file_format == "csv":
+            self._csv_writer.writerows([row[0].isoformat()] + row[1:] for row in rows)
+            self._csv_file.flush()
+            os.fsync(self._csv_file.fileno())
+        else:
+            self._spool_rows(rows)
+
+        for row in rows:
+            timestamp = row[0]
+            if self.start_time is None or timestamp < self.start_time:
+                self.start_time = timestamp
+            if self.end_time is None or timestamp > self.end_time:
+                self.end_time = timestamp
+        self.row_count += len(rows)
+        if self.file_format == "csv":
+            self._write_json(complete=False)
+
+    def _spool_rows(self, rows):
+        """Append rows to the per-column spool files of a binary output."""
+        # Convert everything before writing, so all spools always hold the same number of rows
+        blocks = []
+        for col_index in range(2, len(self.columns)):
+            try:
+                blocks.append(array('d', [MISSING if row[col_index] is None else float(row[col_index])
+                                          for row in rows]))
+            except (TypeError, ValueError):
+                raise ValueError(f"Column '{self.columns[col_index]}' has a value that is not a number, "
+                                 f"{len(rows)} buffered rows were not written") from None
+        times = array('q', [to_epoch_seconds(row[0]) for row in rows])
+        locations = list(self._locations)
+        location_lookup = dict(self._location_lookup)
+        codes = array('i')
+        for row in rows:
+            location = row[1]
+            if location not in location_lookup:
+                location_lookup[location] = len(locations)
+                locations.append(location)
+            codes.append(location_lookup[location])
+
+        times.tofile(self._spools[0])
+        codes.tofile(self._spools[1])
+        for col_index, block in enumerate(blocks, start=2):
+            block.tofile(self._spools[col_index])
+        for spool in self._spools:
+            spool.flush()
+            os.fsync(spool.fileno())
+
+        self._locations = locations
+        self._location_lookup = location_lookup
+        if self._time_sorted and len(times):
+            previous = [self._last_epoch] if self._last_epoch is not None else []
+            ordered = previous + list(times)
+            self._time_sorted = all(ordered[i] <= ordered[i + 1] for i in range(len(ordered) - 1))
+            self._last_epoch = times[-1]
+
+    def _final_metadata(self, complete):
+        metadata = dict(self.metadata)
+        metadata["row_count"] = self.row_count
+        metadata["start_time"] = self.start_time.isoformat() if self.start_time else None
+        metadata["end_time"] = self.end_time.isoformat() if self.end_time else None
+        metadata["complete"] = complete
+        return metadata
+
+    def _write_json(self, complete):
+        """Replace the JSON metadata file in one step so it is never half written."""
+        temporary_name = f"{self.json_filename}.tmp"
+        with open(temporary_name, 'w') as jsonfile:
+            json.dump(self._final_metadata(complete), jsonfile, indent=4)
+        os.replace(temporary_name, self.json_filename)
+
+    def close(self):
+        """
+        Flush the remaining rows and finalise the output.
+
+        Returns:
+        tuple or str: Paths to the CSV and JSON files, or the path to the binary file
+        """
+        return self._finish(complete=True)
+
+    def abort(self):
+        """
+        Flush the rows written so far and finalise the output marked "complete": false.
+
+        Returns:
+        tuple or str: Paths to the CSV and JSON files, or the path to the binary file
+        """
+        return self._finish(complete=False)
+
+    def _finish(self, complete):
+        if self.closed:
+            return self._outputs()
+        self.flush()
+        self.closed = True
+
+        if self.file_format == "csv":
+            self._csv_file.close()
+            self._write_json(complete=complete)
+        else:
+            for spool in self._spools:
+                spool.close()
+            with open(self.binary_filename, 'wb') as binary_file:
+                _write_header(binary_file, self.name, self.metadata.get("uuid") or str(uuid.uuid4()), self.columns,
+                              self._final_metadata(complete), self._locations, self.row_count,
+                              self._time_sorted)
+                for col_index, spool_name in enumerate(self._spool_names):
+                    with open(spool_name, 'rb') as spool:
+                        shutil.copyfileobj(spool, binary_file)
+                    if col_index == 1:
+                        binary_file.write(b"\0" * _padding(4 * self.row_count))
+            for spool_name in self._spool_names:
+                os.remove(spool_name)
+
+        return self._outputs()
+
+    def _outputs(self):
+        if self.file_format == "csv":
+            return self.csv_filename, self.json_filename
+        return self.binary_filename
+
+
+# Example usage:
+if __name__ == "__main__":
+    start = datetime.datetime(2020, 1, 1)
+    with TimeSeriesWriter("writer_example", ["timestamp", "location", "flow"], flush_rows=24) as writer:
+        for hour in range(72):
+            writer.write_row(start + datetime.timedelta(hours=hour), "reach_1", [hour * 0.5])
+    print(writer.row_count, "rows written to", writer.close())